@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from backend.network_builder import count_selected_messages, index_chat_file
+from backend.worker_pool import ANALYSIS_WORKERS, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+# "graph" builds the network, computes its metrics and stores it as a NetworkAnalysis
+JOB_STAGES = ("parse", "graph", "communities")
+MAX_RETAINED_JOBS = int(os.getenv("ANALYSIS_MAX_RETAINED_JOBS", 500))
+
+# Parameters that select messages by time; the rest are content and user filters
+SELECTION_PARAMS = ("start_date", "start_time", "end_date", "end_time", "limit", "limit_type")
+
+
+class AnalysisJob:
+    """State of one background analysis, as reported by GET /analyze/jobs/{id}"""
+
+    def __init__(self, file_path, parameters, build_network, find_communities=None, algorithm=None):
+        self.id = uuid.uuid4()
+        self.file_path = file_path
+        self.parameters = parameters
+        self.build_network = build_network
+        self.find_communities = find_communities
+        self.algorithm = algorithm
+        self.status = "queued"
+        self.stages = {
+            stage: "pending" if stage != "communities" or find_communities else "skipped"
+            for stage in JOB_STAGES
+        }
+        self.details = {}
+        self.error = None
+        self.analysis_id = None
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.task = None
+
+    @property
+    def progress(self):
+        """Fraction of the job's stages that have finished"""
+        active = [state for state in self.stages.values() if state != "skipped"]
+        return sum(state == "done" for state in active) / max(len(active), 1)
+
+    def to_dict(self):
+        return {
+            "id": str(self.id),
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "stages": self.stages,
+            "details": self.details,
+            "error": self.error,
+            "analysis_id": str(self.analysis_id) if self.analysis_id else None,
+            "algorithm": self.algorithm,
+            "parameters": self.parameters,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+_jobs = OrderedDict()
+_job_slots = None
+
+
+def _get_job_slots():
+    # Created lazily so the semaphore binds to the running event loop
+    global _job_slots
+    if _job_slots is None:
+        _job_slots = asyncio.Semaphore(ANALYSIS_WORKERS)
+    return _job_slots
+
+
+def _forget_old_jobs():
+    """Keep the registry bounded by dropping the oldest finished jobs"""
+    for job_id in list(_jobs):
+        if len(_jobs) <= MAX_RETAINED_JOBS:
+            break
+        if _jobs[job_id].finished_at is not None:
+            del _jobs[job_id]
+
+
+async def _run_stage(job, stage, coroutine):
+    job.stages[stage] = "running"
+    result = await coroutine
+    job.stages[stage] = "done"
+    return result
+
+
+async def _parse(job):
+    """Index the chat (once per upload) and count the messages the parameters select"""
+    selection = {key: value for key, value in job.parameters.items() if key in SELECTION_PARAMS}
+    job.details["messages"] = await run_in_pool(index_chat_file, job.file_path)
+    job.details["selected_messages"] = await run_in_pool(count_selected_messages, job.file_path, **selection)
+
+
+async def _run_job(job):
+    try:
+        async with _get_job_slots():
+            job.status = "running"
+            await _run_stage(job, "parse", _parse(job))
+
+            network_data = await _run_stage(job, "graph", job.build_network())
+            job.analysis_id = network_data["analysis_id"]
+            job.details["nodes"] = len(network_data["nodes"])
+            job.details["links"] = len(network_data["links"])
+            job.details["centrality"] = network_data["centrality"]
+
+            if job.find_communities:
+                detection = await _run_stage(job, "communities", job.find_communities(network_data))
+                job.details["communities"] = len(detection["communities"])
+                job.details["community_algorithm"] = detection["algorithm"]
+
+            job.status = "completed"
+    except asyncio.CancelledError:
+        # Work shared with coalesced requests carries on; the job stops waiting for it
+        job.status = "cancelled"
+    except Exception as e:
+        logger.exception(f"Error in analysis job {job.id}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        if job.status != "completed":
+            for stage, state in job.stages.items():
+                if state in ("pending", "running"):
+                    job.stages[stage] = job.status
+        job.finished_at = datetime.now()
+
+
+def submit_job(file_path, parameters, build_network, find_communities=None, algorithm=None):
+    """
+    Queue an analysis and return its job without waiting for it. `build_network()`
+    and `find_communities(network_data)` return the coroutines that produce the
+    stored network and its communities; passing the API's own cached, coalesced
+    entry points means jobs and requests share results.
+    """
+    job = AnalysisJob(file_path, parameters, build_network, find_communities, algorithm)
+    _jobs[job.id] = job
+    _forget_old_jobs()
+    job.task = asyncio.create_task(_run_job(job))
+    return job
+
+
+def get_job(job_id):
+    """Look up a job by id, or None if it is unknown or has been forgotten"""
+    return _jobs.get(job_id)
+
+
+def cancel_job(job_id):
+    """Cancel a queued or running job; returns False if it had already finished"""
+    job = _jobs.get(job_id)
+    if job is None or job.finished_at is not None:
+        return False
+    job.task.cancel()
+    return True
@@ -0,0 +1,159 @@
+"""
+EXPLAIN ANALYZE timings of the hot lookup queries before and after the lookup
+index migration, on a seeded PostgreSQL database.
+
+    BENCHMARK_DATABASE_URL=postgresql+asyncpg://... python -m backend.benchmark_lookups
+
+The database named by BENCHMARK_DATABASE_URL is wiped and reseeded, so point it
+at a scratch database, never at the application's.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from backend.bulk_writer import bulk_insert
+from backend.database import Base
+from backend.migrations import lookup_indexes, migrate, version_metadata
+from backend.models import Community, NetworkAnalysis, Research, UploadedFile
+
+LOOKUP_INDEXES = ("ix_uploaded_files_filename", "ix_network_analysis_research_id", "ix_communities_analysis_id")
+
+# The lookups made by analyze_network/delete_file, get_research_analyses/delete_research
+# and get_analysis_communities
+QUERIES = {
+    "uploaded_files.filename": "SELECT * FROM uploaded_files WHERE filename = :value",
+    "network_analysis.research_id": "SELECT * FROM network_analysis WHERE research_id = :value",
+    "communities.analysis_id": "SELECT * FROM communities WHERE analysis_id = :value",
+}
+
+
+async def seed(engine, files, research, analyses, communities):
+    """Fill the tables and return one lookup value per query"""
+    research_ids = [uuid.uuid4() for _ in range(research)]
+    async with AsyncSession(engine) as db:
+        await bulk_insert(db, Research, [{"id": research_id, "name": f"research-{i}"}
+                                         for i, research_id in enumerate(research_ids)])
+        file_rows = await bulk_insert(db, UploadedFile, [
+            {
+                "filename": f"{i}_chat.txt",
+                "original_filename": "chat.txt",
+                "file_path": f"uploads/{i}_chat.txt",
+                "file_type": "text/plain",
+                "research_id": research_ids[i % research]
+            }
+            for i in range(files)
+        ])
+        analysis_rows = await bulk_insert(db, NetworkAnalysis, [
+            {
+                "research_id": research_ids[i % research],
+                "file_id": file_rows[i % files]["id"],
+                "nodes": [{"id": "a"}, {"id": "b"}],
+                "links": [{"source": "a", "target": "b", "weight": 1}],
+                "parameters": {},
+                "node_count": 2,
+                "edge_count": 1
+            }
+            for i in range(analyses)
+        ])
+        await bulk_insert(db, Community, [
+            {
+                "analysis_id": analysis_rows[i % analyses]["id"],
+                "community_index": i // analyses,
+                "size": 2,
+                "nodes": ["a", "b"]
+            }
+            for i in range(communities)
+        ])
+        await db.commit()
+
+    return {
+        "uploaded_files.filename": file_rows[files // 2]["filename"],
+        "network_analysis.research_id": research_ids[research // 2],
+        "communities.analysis_id": analysis_rows[analyses // 2]["id"],
+    }
+
+
+async def explain(engine, lookup_values, repeats):
+    """Median execution time and top plan node of every query"""
+    timings = {}
+    async with engine.connect() as connection:
+        await connection.execute(text("ANALYZE"))
+        for name, query in QUERIES.items():
+            plans = []
+            for _ in range(repeats):
+                result = await connection.execute(
+                    text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}"), {"value": lookup_values[name]}
+                )
+                plan = result.scalar()
+                plans.append((json.loads(plan) if isinstance(plan, str) else plan)[0])
+            timings[name] = {
+                "execution_ms": statistics.median(plan["Execution Time"] for plan in plans),
+                "plan": plans[0]["Plan"]["Node Type"]
+            }
+    return timings
+
+
+async def run(database_url, files, research, analyses, communities, repeats):
+    engine = create_async_engine(database_url)
+    try:
+        async with engine.begin() as connection:
+            await connection.run_sync(version_metadata.drop_all)
+            await connection.run_sync(Base.metadata.drop_all)
+
+        # The current schema without the lookup indexes
+        await migrate(engine)
+        async with engine.begin() as connection:
+            for index in LOOKUP_INDEXES:
+                await connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+        lookup_values = await seed(engine, files, research, analyses, communities)
+        before = await explain(engine, lookup_values, repeats)
+        async with engine.begin() as connection:
+            await connection.run_sync(lookup_indexes)
+        after = await explain(engine, lookup_values, repeats)
+    finally:
+        await engine.dispose()
+
+    return {
+        "rows": {"files": files, "research": research, "analyses": analyses, "communities": communities},
+        "queries": {name: {"before": before[name], "after": after[name]} for name in QUERIES}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--research", type=int, default=1000)
+    parser.add_argument("--analyses", type=int, default=20000)
+    parser.add_argument("--communities", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    database_url = os.getenv("BENCHMARK_DATABASE_URL")
+    if not database_url:
+        parser.error("Set BENCHMARK_DATABASE_URL to a scratch PostgreSQL database")
+
+    results = asyncio.run(run(
+        database_url, args.files, args.research, args.analyses, args.communities, args.repeats
+    ))
+
+    print(f"{'query':32} {'before':>29} {'after':>29}")
+    for name, timing in results["queries"].items():
+        before, after = timing["before"], timing["after"]
+        print(f"{name:32} {before['execution_ms']:9.3f} ms {before['plan']:>16} "
+              f"{after['execution_ms']:9.3f} ms {after['plan']:>16}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
+
+from backend.database import async_session
+from backend.models import AnalysisEdge, AnalysisNode, NetworkAnalysis
+from backend.network_comparison import IndexedNetwork
+
+logger = logging.getLogger(__name__)
+
+# Background writes of normalized graph rows, by analysis id
+_pending_graphs = {}
+
+
+def _with_defaults(table, rows):
+    """Fill in Python-side column defaults (ids, timestamps) that COPY would skip"""
+    filled = []
+    for row in rows:
+        row = dict(row)
+        for column in table.columns:
+            if row.get(column.name) is None and column.default is not None:
+                default = column.default
+                row[column.name] = default.arg(None) if default.is_callable else default.arg
+        filled.append(row)
+    return filled
+
+
+async def bulk_insert(db, model, rows):
+    """
+    Insert many rows of `model` in one round trip: a binary COPY through asyncpg's
+    copy_records_to_table on PostgreSQL, a multi-row INSERT on other backends
+    (e.g. SQLite in tests). Runs inside the session's current transaction.
+    Returns the rows with their defaults (such as generated ids) filled in.
+    """
+    table = model.__table__
+    rows = _with_defaults(table, rows)
+    if not rows:
+        return rows
+
+    if db.bind.dialect.driver == "asyncpg":
+        columns = [column for column in table.columns if column.name in rows[0]]
+        json_columns = {column.name for column in columns if isinstance(column.type, JSONB)}
+        records = [
+            tuple(
+                json.dumps(row[column.name]) if column.name in json_columns and row[column.name] is not None
+                else row[column.name]
+                for column in columns
+            )
+            for row in rows
+        ]
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name, records=records, columns=[column.name for column in columns]
+        )
+    else:
+        await db.execute(insert(table), rows)
+
+    return rows
+
+
+def community_rows(analysis_id, communities):
+    """Community table rows for detected communities of one analysis"""
+    return [
+        {
+            "analysis_id": analysis_id,
+            "community_index": community["id"],
+            "size": community["size"],
+            "nodes": community["nodes"],
+            "avg_betweenness": community["avg_betweenness"],
+            "avg_pagerank": community["avg_pagerank"],
+            "internal_weight": community["internal_weight"],
+            "external_weight": community["external_weight"],
+            "conductance": community["conductance"],
+            "density": community["density"],
+            "top_members": community["top_members"]
+        }
+        for community in communities
+    ]
+
+
+def graph_rows(analysis_id, nodes, links):
+    """
+    AnalysisNode and AnalysisEdge rows for one analysis's graph. Edges refer to
+    nodes by position; links to ids missing from `nodes` are left out.
+    """
+    network = IndexedNetwork({"nodes": nodes, "links": links})
+    node_rows = [
+        {"analysis_id": analysis_id, "node_index": index, "node_id": str(node["id"]), "data": node}
+        for index, node in enumerate(nodes)
+    ]
+    edge_rows = [
+        {
+            "analysis_id": analysis_id,
+            "edge_index": index,
+            "source_index": source,
+            "target_index": target,
+            "weight": weight
+        }
+        for index, (source, target, weight) in enumerate(zip(
+            network.sources.tolist(), network.targets.tolist(), network.weights.tolist()
+        ))
+        if source >= 0 and target >= 0
+    ]
+    return node_rows, edge_rows
+
+
+async def bulk_insert_graph(db, analysis_id, nodes, links):
+    """Store an analysis's nodes and links in the normalized graph tables"""
+    node_rows, edge_rows = graph_rows(analysis_id, nodes, links)
+    await bulk_insert(db, AnalysisNode, node_rows)
+    await bulk_insert(db, AnalysisEdge, edge_rows)
+
+
+async def _write_graph(analysis_id, nodes, links):
+    try:
+        async with async_session() as db:
+            await bulk_insert_graph(db, analysis_id, nodes, links)
+            await db.commit()
+    except IntegrityError:
+        pass  # Another process wrote them first
+    except Exception:
+        logger.exception(f"Error writing graph rows of analysis {analysis_id}")
+        raise
+
+
+def _forget_graph_write(analysis_id, task):
+    _pending_graphs.pop(analysis_id, None)
+    if not task.cancelled():
+        task.exception()  # Logged in _write_graph; readers that need the rows backfill them
+
+
+def schedule_graph_insert(analysis_id, nodes, links):
+    """
+    Write an analysis's normalized graph rows in the background, off the request
+    path. Call after the NetworkAnalysis row is committed; its JSONB graph stays
+    the copy that full reads use. Returns the task.
+    """
+    task = _pending_graphs.get(analysis_id)
+    if task is None:
+        task = asyncio.create_task(_write_graph(analysis_id, nodes, links))
+        _pending_graphs[analysis_id] = task
+        task.add_done_callback(lambda done: _forget_graph_write(analysis_id, done))
+    return task
+
+
+async def ensure_graph_rows(db, analysis_id):
+    """
+    Make sure an analysis's normalized graph rows exist before they are queried:
+    wait for a pending background write, then backfill them from the JSONB graph
+    if they are still missing (the write failed, or belongs to another process).
+    Raises if the backfill fails, rather than letting readers see an empty graph.
+    """
+    task = _pending_graphs.get(analysis_id)
+    if task is not None:
+        try:
+            # Shielded, so a cancelled reader does not abort the write
+            await asyncio.shield(task)
+        except Exception:
+            pass  # Already logged; the rows are backfilled below
+
+    stored = await db.execute(
+        select(AnalysisNode.node_index).where(AnalysisNode.analysis_id == analysis_id).limit(1)
+    )
+    if stored.first() is not None:
+        return
+    result = await db.execute(
+        select(NetworkAnalysis.nodes, NetworkAnalysis.links).where(NetworkAnalysis.id == analysis_id)
+    )
+    row = result.first()
+    if row is None or not row.nodes:
+        return
+    await asyncio.shield(schedule_graph_insert(analysis_id, row.nodes, row.links or []))
@@ -0,0 +1,243 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from backend.network_comparison import get_node_id
+from backend.worker_pool import ANALYSIS_WORKERS, run_in_pool
+
+PAGERANK_ALPHA = 0.85
+PAGERANK_TOLERANCE = 1e-6
+PAGERANK_MAX_ITERATIONS = 100
+
+# Betweenness and closeness are exact up to this many nodes, sampled above it
+CENTRALITY_EXACT_MAX_NODES = int(os.getenv("CENTRALITY_EXACT_MAX_NODES", 5000))
+CENTRALITY_SAMPLES = int(os.getenv("CENTRALITY_SAMPLES", 1000))
+
+# Analysis parameters that control the centrality stage rather than the message selection
+CENTRALITY_PARAMS = ("betweenness_samples", "betweenness_seconds", "betweenness_seed")
+
+# Sources searched together, bounded so the (nodes x sources) dense blocks stay small
+PIVOT_BLOCK = 64
+BFS_BLOCK_ELEMENTS = 4 * 1024 * 1024
+
+
+def adjacency_matrix(nodes, links):
+    """
+    Symmetric weighted adjacency of the undirected network as a CSR matrix, rows
+    in node order. Links in both directions are merged by adding their weights;
+    links to unknown nodes and self-loops are ignored.
+    """
+    position = {node["id"]: i for i, node in enumerate(nodes)}
+    sources, targets, weights = [], [], []
+    for link in links:
+        source = position.get(get_node_id(link["source"]))
+        target = position.get(get_node_id(link["target"]))
+        if source is None or target is None or source == target:
+            continue
+        sources.append(source)
+        targets.append(target)
+        weights.append(link.get("weight", 1))
+
+    size = len(nodes)
+    directed = sparse.csr_matrix(
+        (np.asarray(weights, dtype=np.float64), (sources, targets)), shape=(size, size)
+    )
+    return (directed + directed.T).tocsr()
+
+
+def pagerank(adjacency, alpha=PAGERANK_ALPHA, tolerance=PAGERANK_TOLERANCE,
+             max_iterations=PAGERANK_MAX_ITERATIONS):
+    """
+    Weighted PageRank by power iteration over the CSR adjacency. Dangling nodes
+    spread their rank uniformly, as networkx does.
+    """
+    size = adjacency.shape[0]
+    if size == 0:
+        return np.zeros(0)
+
+    strength = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = strength == 0
+    inverse_strength = np.divide(1.0, strength, out=np.zeros(size), where=~dangling)
+    # Row-stochastic transition matrix, transposed so each step is one sparse product
+    transition = (sparse.diags(inverse_strength) @ adjacency).T.tocsr()
+
+    rank = np.full(size, 1.0 / size)
+    for _ in range(max_iterations):
+        previous = rank
+        rank = alpha * (transition @ previous + previous[dangling].sum() / size) + (1 - alpha) / size
+        if np.abs(rank - previous).sum() < size * tolerance:
+            break
+    return rank / rank.sum()
+
+
+def choose_pivots(size, samples=None, seed=None):
+    """
+    Sources for the shortest-path searches in random order: every node, or a
+    uniform sample of `samples` nodes. The same seed gives the same pivots.
+    """
+    order = np.random.default_rng(seed).permutation(size)
+    if samples and samples < size:
+        return order[:samples]
+    return order
+
+
+def shortest_path_partials(adjacency, sources, deadline=None, block=None):
+    """
+    Per-node sums over the breadth-first searches from `sources`, run for blocks
+    of sources at once as sparse matrix products (Brandes' algorithm in matrix
+    form) on hop distances. Stops between blocks once `deadline` (a time.time()
+    value) has passed; the sources actually searched are returned with the sums.
+    """
+    size = adjacency.shape[0]
+    links = (adjacency > 0).astype(np.float64).tocsr()
+    if block is None:
+        block = max(1, min(PIVOT_BLOCK, BFS_BLOCK_ELEMENTS // max(size, 1)))
+
+    partials = {
+        "sources": [],
+        "dependency": np.zeros(size),
+        "dependency_squares": np.zeros(size),
+        "reached": np.zeros(size),
+        "distance": np.zeros(size)
+    }
+
+    for start in range(0, len(sources), block):
+        if deadline is not None and start > 0 and time.time() > deadline:
+            break
+        block_sources = np.asarray(sources[start:start + block])
+        columns = np.arange(len(block_sources))
+
+        # Forward pass: hop distance and number of shortest paths from each source
+        distance = np.full((size, len(block_sources)), -1, dtype=np.int32)
+        paths = np.zeros((size, len(block_sources)))
+        distance[block_sources, columns] = 0
+        paths[block_sources, columns] = 1
+
+        frontier = paths.copy()
+        depth = 0
+        while True:
+            reached = links @ frontier
+            new = (reached > 0) & (distance < 0)
+            if not new.any():
+                break
+            depth += 1
+            distance[new] = depth
+            paths[new] = reached[new]
+            frontier = np.where(new, paths, 0)
+
+        # Backward pass: accumulate dependencies from the deepest level up
+        dependency = np.zeros_like(paths)
+        for level in range(depth, 0, -1):
+            at_level = distance == level
+            share = np.where(at_level, (1 + dependency) / np.where(at_level, paths, 1), 0)
+            dependency += np.where(distance == level - 1, paths * (links @ share), 0)
+        dependency[block_sources, columns] = 0
+
+        partials["sources"].extend(block_sources.tolist())
+        partials["dependency"] += dependency.sum(axis=1)
+        partials["dependency_squares"] += (dependency ** 2).sum(axis=1)
+        # Distances are symmetric, so each search also measures every node's distance to the source
+        partials["reached"] += (distance > 0).sum(axis=1)
+        partials["distance"] += np.where(distance > 0, distance, 0).sum(axis=1)
+
+    return partials
+
+
+def combine_partials(size, partials):
+    """
+    Betweenness and closeness from the searches of one or more workers.
+
+    With every node searched both are exact. With a sample of k sources,
+    betweenness is scaled up by n / k, and its standard error is estimated from
+    the spread of the per-source contributions. Closeness then uses each node's
+    distances to the sampled sources. Returns (betweenness, closeness, info).
+    """
+    sources = np.array([source for part in partials for source in part["sources"]], dtype=np.int64)
+    count = len(sources)
+    dependency = sum(part["dependency"] for part in partials)
+    squares = sum(part["dependency_squares"] for part in partials)
+    reached = sum(part["reached"] for part in partials)
+    distance = sum(part["distance"] for part in partials)
+
+    info = {"method": "exact" if count == size else "sampled", "sources": count, "nodes": size}
+    if count == 0:
+        return np.zeros(size), np.zeros(size), {**info, "max_error": 0.0, "mean_error": 0.0}
+
+    others = count - np.isin(np.arange(size), sources)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Wasserman-Faust scaling for graphs that are not connected, as networkx does
+        closeness = np.where(distance > 0, reached / distance * reached / np.maximum(others, 1), 0.0)
+
+    if size < 3:
+        return np.zeros(size), closeness, {**info, "max_error": 0.0, "mean_error": 0.0}
+
+    # Each undirected pair is counted from both ends
+    normalization = (size - 1) * (size - 2)
+    mean = dependency / count
+    variance = np.maximum(squares / count - mean ** 2, 0)
+    # Sampling without replacement: the error vanishes as the sample covers every node
+    correction = (size - count) / (size - 1)
+    betweenness = mean * size / normalization
+    error = size * np.sqrt(variance / count * correction) / normalization
+
+    info["max_error"] = float(error.max())
+    info["mean_error"] = float(error.mean())
+    return betweenness, closeness, info
+
+
+def centrality_partials(nodes, links, sources, deadline=None):
+    """Shortest-path sums for one worker's share of the pivots"""
+    return shortest_path_partials(adjacency_matrix(nodes, links), sources, deadline)
+
+
+def attach_centrality(nodes, links, partials):
+    """
+    Return copies of the nodes with degree, strength (weighted degree), weighted
+    PageRank, betweenness and closeness attached, plus a description of how
+    betweenness was computed.
+    """
+    adjacency = adjacency_matrix(nodes, links)
+    degree = np.diff(adjacency.indptr)
+    strength = np.asarray(adjacency.sum(axis=1)).ravel()
+    ranks = pagerank(adjacency)
+    betweenness, closeness, info = combine_partials(len(nodes), partials)
+
+    nodes_with_metrics = [
+        {
+            **node,
+            "degree": int(degree[i]),
+            "strength": float(strength[i]),
+            "pagerank": float(ranks[i]),
+            "betweenness": float(betweenness[i]),
+            "closeness": float(closeness[i])
+        }
+        for i, node in enumerate(nodes)
+    ]
+    return nodes_with_metrics, info
+
+
+async def compute_centrality(nodes, links, samples=None, seed=None, max_seconds=None):
+    """
+    Attach centrality metrics to the nodes in the analysis worker pool.
+
+    Betweenness and closeness are exact for networks of up to
+    CENTRALITY_EXACT_MAX_NODES nodes. Larger ones, or any request with `samples`
+    or `max_seconds`, use a sample of source nodes. The sample is CENTRALITY_SAMPLES
+    unless `samples` is given, and it is cut short once `max_seconds` have passed.
+    The pivots are split across the workers. Returns (nodes, info).
+    """
+    size = len(nodes)
+    if not samples and not max_seconds and size > CENTRALITY_EXACT_MAX_NODES:
+        samples = CENTRALITY_SAMPLES
+    pivots = choose_pivots(size, samples, seed)
+    deadline = time.time() + max_seconds if max_seconds else None
+
+    chunks = np.array_split(pivots, max(1, min(ANALYSIS_WORKERS, len(pivots) // PIVOT_BLOCK)))
+    partials = await asyncio.gather(*(
+        run_in_pool(centrality_partials, nodes, links, chunk, deadline) for chunk in chunks
+    ))
+    nodes_with_metrics, info = await run_in_pool(attach_centrality, nodes, links, partials)
+    return nodes_with_metrics, {**info, "seed": seed, "max_seconds": max_seconds}
@@ -0,0 +1,266 @@
+import calendar
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+# Bump when the sidecar layout changes so stale indexes get rebuilt
+INDEX_VERSION = 1
+INDEX_FOLDER_NAME = ".index"
+MAX_CACHED_INDEXES = 8
+
+# WhatsApp export timestamp, e.g. "7.10.2023, 19:43:25"
+TIMESTAMP_PATTERN = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4}), (\d{1,2}):(\d{1,2}):(\d{1,2})")
+MEDIA_OMITTED_MARKERS = ("omitted", "הושמט")
+
+# Sender id used for timestamped lines that carry no "sender: message" part
+NO_SENDER = -1
+
+
+def to_epoch(value):
+    """Convert a naive datetime to epoch seconds (the export's wall-clock time)"""
+    return calendar.timegm(value.timetuple())
+
+
+def parse_timestamp(date_part):
+    """Parse a WhatsApp timestamp into epoch seconds, or None if it is not one"""
+    match = TIMESTAMP_PATTERN.fullmatch(date_part)
+    if not match:
+        return None
+    day, month, year, hour, minute, second = (int(group) for group in match.groups())
+    try:
+        return to_epoch(datetime(year, month, day, hour, minute, second))
+    except ValueError:
+        return None
+
+
+def parse_chat_line(line):
+    """
+    Split a decoded export line into (epoch, sender, message_length, media_omitted).
+    Returns None for lines without a parsable timestamp (continuations, headers).
+    """
+    if not (line.startswith("[") and "]" in line):
+        return None
+
+    timestamp = parse_timestamp(line.split("] ")[0].strip("[]"))
+    if timestamp is None:
+        return None
+
+    media_omitted = any(marker in line for marker in MEDIA_OMITTED_MARKERS)
+
+    if ": " not in line or "] " not in line:
+        return timestamp, None, 0, media_omitted
+
+    _, message_part = line.split("] ", 1)
+    parts = message_part.split(":", 1)
+    sender = parts[0].strip("~").replace("\u202a", "").strip()
+    message_content = parts[1].strip() if len(parts) > 1 else ""
+
+    return timestamp, sender, len(message_content), media_omitted
+
+
+class ChatIndex:
+    """
+    Columnar view of a parsed WhatsApp export.
+
+    One row per timestamped line, in file order. Message text is not kept in
+    memory; `message_texts` seeks back into the source file via `offsets`.
+    """
+
+    def __init__(self, file_path, timestamps, sender_ids, lengths, media_omitted, offsets, senders):
+        self.file_path = file_path
+        self.timestamps = timestamps
+        self.sender_ids = sender_ids
+        self.lengths = lengths
+        self.media_omitted = media_omitted
+        self.offsets = offsets
+        self.senders = senders
+        self._sorted_view = None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def sorted_timestamps(self):
+        """
+        Return (order, sorted_timestamps) for binary searches over time.
+
+        `order` is None when the export is already chronological (the usual case);
+        otherwise it is the stable permutation sorting the rows by timestamp, as DST
+        changes and merged exports can put lines out of order. Computed once per
+        loaded index.
+        """
+        if self._sorted_view is None:
+            if np.all(self.timestamps[1:] >= self.timestamps[:-1]):
+                self._sorted_view = (None, self.timestamps)
+            else:
+                order = np.argsort(self.timestamps, kind="stable")
+                self._sorted_view = (order, self.timestamps[order])
+        return self._sorted_view
+
+    def message_texts(self, rows):
+        """Yield (row, message_content) for the given rows, read from the source file"""
+        with open(self.file_path, "rb") as f:
+            for row in rows:
+                f.seek(int(self.offsets[row]))
+                line = f.readline().decode("utf-8", errors="replace")
+                parts = line.split("] ", 1)[-1].split(":", 1)
+                yield row, parts[1].strip() if len(parts) > 1 else ""
+
+
+def file_identity(file_path):
+    """
+    (device, inode) of a file. Deduplicated uploads are hard links to one stored
+    copy, so every name for the same content shares one identity and one index.
+    """
+    stat = os.stat(file_path)
+    return stat.st_dev, stat.st_ino
+
+
+def get_index_path(file_path):
+    """Location of the sidecar index for an uploaded file"""
+    device, inode = file_identity(file_path)
+    folder = os.path.join(os.path.dirname(file_path), INDEX_FOLDER_NAME)
+    return os.path.join(folder, f"{device:x}-{inode:x}.npz")
+
+
+def iter_chat_records(file_path):
+    """
+    Stream (byte_offset, parsed_line) for every timestamped line of an export.
+    Only the current line is held in memory.
+    """
+    offset = 0
+    with open(file_path, "rb") as f:
+        for raw_line in f:
+            line_offset = offset
+            offset += len(raw_line)
+
+            parsed = parse_chat_line(raw_line.decode("utf-8", errors="replace"))
+            if parsed is not None:
+                yield line_offset, parsed
+
+
+def build_chat_index(file_path):
+    """Parse an export once into a ChatIndex"""
+    # Typed buffers keep a fixed few bytes per message instead of a Python object each
+    timestamps = array("q")
+    sender_ids = array("i")
+    lengths = array("i")
+    media_omitted = array("b")
+    offsets = array("q")
+    sender_lookup = {}
+
+    for line_offset, (timestamp, sender, length, omitted) in iter_chat_records(file_path):
+        if sender is None:
+            sender_id = NO_SENDER
+        else:
+            sender_id = sender_lookup.setdefault(sender, len(sender_lookup))
+
+        timestamps.append(timestamp)
+        sender_ids.append(sender_id)
+        lengths.append(length)
+        media_omitted.append(omitted)
+        offsets.append(line_offset)
+
+    return ChatIndex(
+        file_path=file_path,
+        timestamps=np.frombuffer(timestamps, dtype=np.int64),
+        sender_ids=np.frombuffer(sender_ids, dtype=np.int32),
+        lengths=np.frombuffer(lengths, dtype=np.int32),
+        media_omitted=np.frombuffer(media_omitted, dtype=np.int8).astype(bool),
+        offsets=np.frombuffer(offsets, dtype=np.int64),
+        senders=list(sender_lookup),
+    )
+
+
+def _source_signature(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def save_chat_index(index, index_path, signature):
+    """Write the sidecar atomically so concurrent readers never see a partial file"""
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            version=np.array(INDEX_VERSION),
+            source_size=np.array(signature[0], dtype=np.int64),
+            source_mtime_ns=np.array(signature[1], dtype=np.int64),
+            timestamps=index.timestamps,
+            sender_ids=index.sender_ids,
+            lengths=index.lengths,
+            media_omitted=index.media_omitted,
+            offsets=index.offsets,
+            senders=np.array(index.senders, dtype=str),
+        )
+    os.replace(tmp_path, index_path)
+
+
+def read_chat_index(file_path, index_path, signature):
+    """Load a sidecar if it exists and still matches the source file"""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with np.load(index_path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_VERSION or \
+                    (int(data["source_size"]), int(data["source_mtime_ns"])) != signature:
+                return None
+            return ChatIndex(
+                file_path=file_path,
+                timestamps=data["timestamps"],
+                sender_ids=data["sender_ids"],
+                lengths=data["lengths"],
+                media_omitted=data["media_omitted"],
+                offsets=data["offsets"],
+                senders=data["senders"].tolist(),
+            )
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Discarding unreadable chat index {index_path}: {e}")
+        return None
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def load_chat_index(file_path):
+    """
+    Return the ChatIndex for an uploaded file, building the sidecar on first use.
+    Recently used indexes are also kept in memory.
+    """
+    signature = _source_signature(file_path)
+    identity = file_identity(file_path)
+
+    with _index_lock:
+        cached = _index_cache.get(identity)
+        if cached and cached[0] == signature:
+            _index_cache.move_to_end(identity)
+            return cached[1]
+
+    index_path = get_index_path(file_path)
+    index = read_chat_index(file_path, index_path, signature)
+    if index is None:
+        index = build_chat_index(file_path)
+        save_chat_index(index, index_path, signature)
+
+    with _index_lock:
+        _index_cache[identity] = (signature, index)
+        _index_cache.move_to_end(identity)
+        while len(_index_cache) > MAX_CACHED_INDEXES:
+            _index_cache.popitem(last=False)
+
+    return index
+
+
+def invalidate_chat_index(file_path):
+    """Drop the in-memory and on-disk index for a file (call before deleting the file)"""
+    with _index_lock:
+        _index_cache.pop(file_identity(file_path), None)
+    index_path = get_index_path(file_path)
+    if os.path.exists(index_path):
+        os.remove(index_path)
@@ -0,0 +1,443 @@
+import heapq
+import time
+from collections import deque
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+# How often (in nodes visited) the local-moving loops look at the clock
+DEADLINE_CHECK_INTERVAL = 1024
+
+# Randomness of Leiden's refinement: merges are picked with probability proportional
+# to exp(gain / theta), gains in edge-weight units, so small values favour the best merge
+REFINEMENT_RANDOMNESS = 0.01
+
+
+def _past(deadline):
+    return deadline is not None and time.time() > deadline
+
+
+def adjacency_of(G):
+    """Symmetric weighted CSR adjacency of a networkx graph, rows in G's node order"""
+    if G.number_of_nodes() == 0:
+        return sparse.csr_matrix((0, 0))
+    return nx.to_scipy_sparse_array(G, weight="weight", format="csr").astype(np.float64)
+
+
+def modularity(adjacency, labels, resolution=1.0):
+    """Newman modularity of a partition given as one integer label per node"""
+    total = adjacency.sum()
+    if total == 0:
+        return 0.0
+    coo = adjacency.tocoo()
+    internal = coo.data[labels[coo.row] == labels[coo.col]].sum()
+    strength = np.asarray(adjacency.sum(axis=1)).ravel()
+    community_strength = np.bincount(labels, strength)
+    return float(internal / total - resolution * (community_strength ** 2).sum() / total ** 2)
+
+
+def split_disconnected(adjacency, labels):
+    """Refine a partition so every community is connected; returns compact labels"""
+    coo = adjacency.tocoo()
+    inside = labels[coo.row] == labels[coo.col]
+    internal = sparse.csr_matrix(
+        (coo.data[inside], (coo.row[inside], coo.col[inside])), shape=adjacency.shape
+    )
+    _, components = connected_components(internal, directed=False)
+    return components
+
+
+def label_propagation(adjacency, deadline=None, seed=None, max_rounds=100):
+    """
+    Weighted asynchronous label propagation: nodes repeatedly adopt the label with
+    the largest total edge weight among their neighbours, in random order, with
+    random tie-breaking. Returns (labels, budget_exhausted); the labels are those
+    of the round with the highest modularity.
+    """
+    size = adjacency.shape[0]
+    indptr, indices, data = adjacency.indptr.tolist(), adjacency.indices.tolist(), adjacency.data.tolist()
+    rng = np.random.default_rng(seed)
+
+    labels = list(range(size))
+    best_labels, best_quality = np.arange(size), modularity(adjacency, np.arange(size))
+    exhausted = False
+
+    for _ in range(max_rounds):
+        changed = 0
+        for visited, node in enumerate(rng.permutation(size).tolist()):
+            if visited % DEADLINE_CHECK_INTERVAL == 0 and _past(deadline):
+                exhausted = True
+                break
+            neighbour_weights = {}
+            for j in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[j]
+                if neighbour != node:
+                    label = labels[neighbour]
+                    neighbour_weights[label] = neighbour_weights.get(label, 0.0) + data[j]
+            if not neighbour_weights:
+                continue
+            heaviest = max(neighbour_weights.values())
+            candidates = [label for label, weight in neighbour_weights.items() if weight == heaviest]
+            if labels[node] in candidates:
+                continue
+            labels[node] = candidates[rng.integers(len(candidates))]
+            changed += 1
+
+        current = np.unique(np.array(labels), return_inverse=True)[1]
+        quality = modularity(adjacency, current)
+        if quality > best_quality:
+            best_labels, best_quality = current, quality
+        if exhausted or not changed:
+            break
+
+    return best_labels, exhausted
+
+
+def _best_community(node, indptr, indices, data, labels, strength, community_strength, total):
+    """
+    Community with the largest modularity gain for `node`, with the node taken
+    out of its current one. Updates `community_strength` for the chosen community.
+    """
+    neighbour_weights = {}
+    for j in range(indptr[node], indptr[node + 1]):
+        neighbour = indices[j]
+        if neighbour != node:
+            label = labels[neighbour]
+            neighbour_weights[label] = neighbour_weights.get(label, 0.0) + data[j]
+
+    current = labels[node]
+    degree = strength[node]
+    community_strength[current] -= degree
+    best = current
+    best_gain = neighbour_weights.get(current, 0.0) - community_strength[current] * degree / total
+    for label, weight in neighbour_weights.items():
+        gain = weight - community_strength[label] * degree / total
+        if gain > best_gain + 1e-12:
+            best, best_gain = label, gain
+    community_strength[best] += degree
+    return best
+
+
+def _move_nodes(adjacency, labels, deadline, rng):
+    """
+    Louvain local moving: move single nodes to the neighbouring community with the
+    largest modularity gain until no move improves it.
+    Returns (labels, moved_any, budget_exhausted).
+    """
+    size = adjacency.shape[0]
+    indptr, indices, data = adjacency.indptr.tolist(), adjacency.indices.tolist(), adjacency.data.tolist()
+    strength = np.asarray(adjacency.sum(axis=1)).ravel().tolist()
+    total = sum(strength)
+    labels = labels.tolist()
+    community_strength = np.bincount(labels, strength, minlength=size).tolist()
+
+    moved = False
+    visited = 0
+    improved = True
+    while improved:
+        improved = False
+        for node in rng.permutation(size).tolist():
+            visited += 1
+            if visited % DEADLINE_CHECK_INTERVAL == 0 and _past(deadline):
+                return np.array(labels), moved, True
+
+            current = labels[node]
+            best = _best_community(node, indptr, indices, data, labels, strength, community_strength, total)
+            if best != current:
+                labels[node] = best
+                moved = improved = True
+
+    return np.array(labels), moved, False
+
+
+def _refine(adjacency, labels, deadline, rng, theta=REFINEMENT_RANDOMNESS):
+    """
+    Leiden refinement of a partition: every community is rebuilt from singletons.
+    Nodes still on their own, visited in random order, join a refined cluster of
+    the same community when both are well connected to the rest of it, picked at
+    random among the merges that do not lower modularity (weighted towards the
+    larger gains). Refined clusters are therefore connected subsets of one
+    community. Returns (compact refined labels, budget_exhausted).
+    """
+    size = adjacency.shape[0]
+    indptr, indices, data = adjacency.indptr.tolist(), adjacency.indices.tolist(), adjacency.data.tolist()
+    strength = np.asarray(adjacency.sum(axis=1)).ravel().tolist()
+    total = sum(strength)
+    labels = labels.tolist()
+    community_strength = np.bincount(labels, strength, minlength=size).tolist()
+
+    # Weight from each node to the rest of its community
+    internal = [0.0] * size
+    for node in range(size):
+        for j in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[j]
+            if neighbour != node and labels[neighbour] == labels[node]:
+                internal[node] += data[j]
+
+    refined = list(range(size))
+    cluster_strength = list(strength)
+    cluster_size = [1] * size
+    cluster_external = list(internal)  # Weight from each cluster to the rest of its community
+
+    for visited, node in enumerate(rng.permutation(size).tolist()):
+        if visited % DEADLINE_CHECK_INTERVAL == 0 and _past(deadline):
+            return np.unique(refined, return_inverse=True)[1], True
+        if cluster_size[refined[node]] > 1:
+            continue
+        community = labels[node]
+        degree = strength[node]
+        if internal[node] < degree * (community_strength[community] - degree) / total:
+            continue  # Not well connected to its community
+
+        cluster_weights = {}
+        for j in range(indptr[node], indptr[node + 1]):
+            neighbour = indices[j]
+            if neighbour != node and labels[neighbour] == community:
+                cluster = refined[neighbour]
+                cluster_weights[cluster] = cluster_weights.get(cluster, 0.0) + data[j]
+
+        candidates, gains = [], []
+        for cluster, weight in cluster_weights.items():
+            size_weight = cluster_strength[cluster]
+            if cluster_external[cluster] < size_weight * (community_strength[community] - size_weight) / total:
+                continue  # The cluster is not well connected to its community
+            gain = weight - degree * size_weight / total
+            if gain >= 0:
+                candidates.append(cluster)
+                gains.append(gain)
+        if not candidates:
+            continue
+
+        odds = np.exp((np.array(gains) - max(gains)) / theta)
+        chosen = candidates[rng.choice(len(candidates), p=odds / odds.sum())]
+        cluster_external[chosen] += internal[node] - 2 * cluster_weights[chosen]
+        cluster_strength[chosen] += degree
+        cluster_size[chosen] += 1
+        cluster_size[node] = 0
+        refined[node] = chosen
+
+    return np.unique(refined, return_inverse=True)[1], False
+
+
+def leiden(adjacency, deadline=None, seed=None):
+    """
+    Leiden multilevel modularity optimization (Traag et al., 2019): Louvain local
+    moving, then a refinement (see _refine) of the partition, and aggregation of
+    the refined clusters. Aggregated nodes start in the community of their
+    unrefined parent. A final split of any community into its connected parts
+    guards against moves made on the last aggregate network.
+    Returns (labels, budget_exhausted); on timeout the current partition is used.
+    """
+    size = adjacency.shape[0]
+    if size == 0 or adjacency.sum() == 0:
+        return np.arange(size), False
+
+    rng = np.random.default_rng(seed)
+    membership = np.arange(size)  # Original node -> node of the current aggregate network
+    current = adjacency
+    labels = np.arange(size)
+
+    while True:
+        labels, moved, exhausted = _move_nodes(current, labels, deadline, rng)
+        if exhausted or not moved:
+            break
+
+        refined, exhausted = _refine(current, labels, deadline, rng)
+        clusters = refined.max() + 1
+        if exhausted or clusters == current.shape[0]:
+            break
+
+        # Each refined cluster becomes one node of the aggregate network
+        projection = sparse.csr_matrix(
+            (np.ones(current.shape[0]), (np.arange(current.shape[0]), refined)),
+            shape=(current.shape[0], clusters)
+        )
+        parent = np.empty(clusters, dtype=np.int64)
+        parent[refined] = labels
+        current = (projection.T @ current @ projection).tocsr()
+        membership = refined[membership]
+        labels = np.unique(parent, return_inverse=True)[1]
+
+    flat = np.unique(labels[membership], return_inverse=True)[1]
+    return split_disconnected(adjacency, flat), exhausted
+
+
+def fast_greedy(G, deadline=None):
+    """
+    Clauset-Newman-Moore greedy modularity merging that stops at the deadline.
+    Each step merges the pair of adjacent communities with the largest modularity
+    gain, taken from a heap with stale entries skipped, until no merge gains.
+    Merges only ever raise modularity, so the partition reached so far is the best
+    one found. Returns (communities as sets, budget_exhausted).
+    """
+    if G.number_of_edges() == 0:
+        return [{node} for node in G], False
+
+    nodes = list(G)
+    adjacency = adjacency_of(G).tocoo()
+    total = adjacency.sum()
+    share = (np.asarray(adjacency.sum(axis=1)).ravel() / total).tolist()
+
+    # gains[i][j]: modularity gain of merging communities i and j, for adjacent ones
+    gains = [{} for _ in nodes]
+    for row, col, weight in zip(adjacency.row.tolist(), adjacency.col.tolist(), adjacency.data.tolist()):
+        if row != col:
+            gains[row][col] = gains[row].get(col, 0.0) + weight / total
+    heap = []
+    for i, neighbours in enumerate(gains):
+        for j in neighbours:
+            neighbours[j] = 2 * (neighbours[j] - share[i] * share[j])
+            if i < j:
+                heap.append((-neighbours[j], i, j))
+    heapq.heapify(heap)
+
+    members = [[node] for node in nodes]
+    exhausted = False
+    while heap:
+        if _past(deadline):
+            exhausted = True
+            break
+        gain, i, j = heapq.heappop(heap)
+        gain = -gain
+        if members[i] is None or members[j] is None or gains[i].get(j) != gain:
+            continue  # Stale: one side was merged away, or the gain has changed
+        if gain < 0:
+            break
+
+        # Merge the smaller community into the larger
+        if len(members[i]) < len(members[j]):
+            i, j = j, i
+        merged = {}
+        for k in gains[i].keys() | gains[j].keys():
+            if k == i or k == j:
+                continue
+            if k in gains[i] and k in gains[j]:
+                merged[k] = gains[i][k] + gains[j][k]
+            elif k in gains[i]:
+                merged[k] = gains[i][k] - 2 * share[j] * share[k]
+            else:
+                merged[k] = gains[j][k] - 2 * share[i] * share[k]
+        for k in gains[j]:
+            gains[k].pop(j, None)
+        for k, value in merged.items():
+            gains[k][i] = value
+            heapq.heappush(heap, (-value, min(i, k), max(i, k)))
+        gains[i], gains[j] = merged, {}
+        share[i] += share[j]
+        members[i].extend(members[j])
+        members[j] = None
+
+    return [set(community) for community in members if community is not None], exhausted
+
+
+def _edge_weights(pairs, weights):
+    """Undirected edge weights keyed by the (smaller, larger) node id pair"""
+    edge_weights = {}
+    for (source, target), weight in zip(pairs, weights):
+        if source == target:
+            continue
+        pair = (source, target) if source <= target else (target, source)
+        edge_weights[pair] = edge_weights.get(pair, 0) + weight
+    return edge_weights
+
+
+def warm_start(adjacency, node_ids, previous_partition, previous_links, deadline=None, seed=None):
+    """
+    Incremental modularity optimization from a previous run's partition.
+
+    Known nodes start in their previous community and new nodes on their own.
+    Only the changed region is re-optimized: nodes that are new, or that touch an
+    added, removed or reweighted edge, are queued first. Neighbours are re-queued
+    only when a node moves, so the work follows the size of the change rather than
+    of the network. Communities keep their previous ids. When a community splits,
+    its largest connected part keeps the id; other parts and communities formed
+    by new nodes get ids above the previous maximum.
+    Returns (labels, details, budget_exhausted).
+    """
+    size = adjacency.shape[0]
+    indptr, indices, data = adjacency.indptr.tolist(), adjacency.indices.tolist(), adjacency.data.tolist()
+    strength = np.asarray(adjacency.sum(axis=1)).ravel().tolist()
+    total = sum(strength) or 1.0
+    position = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    first_new_id = max(previous_partition.values(), default=-1) + 1
+    labels = []
+    changed = set()
+    for i, node_id in enumerate(node_ids):
+        if node_id in previous_partition:
+            labels.append(previous_partition[node_id])
+        else:
+            labels.append(first_new_id + i)
+            changed.add(i)
+
+    # Endpoints (still present) of every edge whose weight differs from the previous network
+    upper = sparse.triu(adjacency, k=1).tocoo()
+    current_edges = _edge_weights(
+        ((node_ids[row], node_ids[col]) for row, col in zip(upper.row.tolist(), upper.col.tolist())),
+        upper.data.tolist()
+    )
+    previous_edges = _edge_weights(
+        ((link["source"]["id"] if isinstance(link["source"], dict) else link["source"],
+          link["target"]["id"] if isinstance(link["target"], dict) else link["target"])
+         for link in previous_links),
+        (link.get("weight", 1) for link in previous_links)
+    )
+    for pair in current_edges.keys() | previous_edges.keys():
+        if current_edges.get(pair) != previous_edges.get(pair):
+            changed.update(position[node_id] for node_id in pair if node_id in position)
+
+    community_strength = {}
+    for node, label in enumerate(labels):
+        community_strength[label] = community_strength.get(label, 0.0) + strength[node]
+
+    rng = np.random.default_rng(seed)
+    queue = deque(rng.permutation(sorted(changed)).tolist())
+    queued = set(queue)
+    reoptimized = 0
+    exhausted = False
+    while queue:
+        if reoptimized % DEADLINE_CHECK_INTERVAL == 0 and _past(deadline):
+            exhausted = True
+            break
+        node = queue.popleft()
+        queued.discard(node)
+        reoptimized += 1
+
+        current = labels[node]
+        best = _best_community(node, indptr, indices, data, labels, strength, community_strength, total)
+        if best != current:
+            labels[node] = best
+            for j in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[j]
+                if labels[neighbour] != best and neighbour not in queued:
+                    queue.append(neighbour)
+                    queued.add(neighbour)
+
+    # Stable ids: the largest connected part of each community keeps its id
+    labels = np.array(labels, dtype=np.int64)
+    components = split_disconnected(adjacency, labels) if size else np.zeros(0, dtype=np.int64)
+    component_sizes = np.bincount(components) if size else np.zeros(0, dtype=np.int64)
+    component_label = np.zeros(len(component_sizes), dtype=np.int64)
+    component_label[components] = labels
+
+    next_id = first_new_id
+    assigned = {}
+    kept = set()
+    for component in np.argsort(-component_sizes, kind="stable").tolist():
+        label = int(component_label[component])
+        if label < first_new_id and label not in kept:
+            kept.add(label)
+            assigned[component] = label
+        else:
+            assigned[component] = next_id
+            next_id += 1
+    stable = np.array([assigned[component] for component in components.tolist()], dtype=np.int64)
+
+    details = {
+        "previous_communities": len(set(previous_partition.values())),
+        "changed_nodes": len(changed),
+        "reoptimized_nodes": reoptimized
+    }
+    return stable, details, exhausted
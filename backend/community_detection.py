@@ -0,0 +1,264 @@
+import os
+import time
+
+import community as community_louvain
+import networkx as nx
+import networkx.algorithms.community as nx_community
+import numpy as np
+
+from backend.community_algorithms import (
+    adjacency_of, fast_greedy, label_propagation, leiden, modularity, warm_start
+)
+from backend.network_comparison import IndexedNetwork
+
+SUPPORTED_ALGORITHMS = (
+    "louvain", "girvan_newman", "greedy_modularity", "label_propagation", "leiden", "fast_greedy"
+)
+OVER_BUDGET_POLICIES = ("downgrade", "refuse")
+# Modularity algorithms that can continue from a previous partition
+WARM_START_ALGORITHMS = ("louvain", "leiden")
+TOP_MEMBERS = 5
+
+# Default time budget for the budgeted algorithms and for admitting Girvan-Newman
+COMMUNITY_MAX_SECONDS = float(os.getenv("COMMUNITY_MAX_SECONDS", 30))
+# Measured cost of one edge-betweenness pass per (node x edge)
+GIRVAN_NEWMAN_SECONDS_PER_UNIT = float(os.getenv("GIRVAN_NEWMAN_SECONDS_PER_UNIT", 1e-6))
+GIRVAN_NEWMAN_FALLBACK = "leiden"
+
+
+class CommunityBudgetError(ValueError):
+    """Raised when a requested algorithm is predicted to exceed its time budget"""
+
+
+def build_graph(nodes, links):
+    """Build an undirected weighted graph from node and link dicts"""
+    G = nx.Graph()
+
+    for node in nodes:
+        G.add_node(node["id"], **{k: v for k, v in node.items() if k != "id"})
+
+    for link in links:
+        source = link["source"]
+        target = link["target"]
+        weight = link.get("weight", 1)
+
+        if isinstance(source, dict) and "id" in source:
+            source = source["id"]
+        if isinstance(target, dict) and "id" in target:
+            target = target["id"]
+
+        G.add_edge(source, target, weight=weight)
+
+    return G
+
+
+def estimate_girvan_newman_seconds(G):
+    """
+    Predicted worst-case time for Girvan-Newman's first split. Every edge removal
+    recomputes edge betweenness, O(nodes x edges). A split can take up to
+    edges - nodes + 2 removals, which is how many it takes to cut a connected
+    graph down to a tree and then break it.
+    """
+    nodes, edges = G.number_of_nodes(), G.number_of_edges()
+    removals = max(edges - nodes + 2, 1)
+    return GIRVAN_NEWMAN_SECONDS_PER_UNIT * nodes * max(edges, 1) * removals
+
+
+def detect_communities(nodes, links, algorithm="louvain", max_seconds=None, over_budget="downgrade",
+                       previous=None):
+    """
+    Detect communities and summarize them.
+    Runs in the analysis worker pool, so it takes and returns plain data.
+
+    label_propagation, leiden and fast_greedy stop after `max_seconds` and use the
+    best partition found so far. Girvan-Newman cannot be interrupted, so when
+    its estimated cost exceeds the budget it is either replaced by
+    GIRVAN_NEWMAN_FALLBACK (over_budget="downgrade") or refused with
+    CommunityBudgetError (over_budget="refuse").
+
+    With `previous` ({"node_communities", "links"} of an earlier analysis of the
+    same chat), louvain and leiden continue from that partition instead of
+    starting over, and keep its community ids.
+    """
+    if algorithm not in SUPPORTED_ALGORITHMS:
+        raise ValueError(
+            f"Unknown algorithm: {algorithm}. Supported: {', '.join(SUPPORTED_ALGORITHMS)}"
+        )
+
+    G = build_graph(nodes, links)
+    max_seconds = max_seconds or COMMUNITY_MAX_SECONDS
+    deadline = time.time() + max_seconds
+    requested_algorithm = algorithm
+    budget_exhausted = False
+    quality = None
+    warm_start_details = None
+
+    estimated_seconds = None
+    if algorithm == "girvan_newman":
+        estimated_seconds = estimate_girvan_newman_seconds(G)
+        if estimated_seconds > max_seconds:
+            if over_budget == "refuse":
+                raise CommunityBudgetError(
+                    f"Girvan-Newman is estimated to take {estimated_seconds:.1f}s, "
+                    f"over the {max_seconds:g}s budget"
+                )
+            algorithm = GIRVAN_NEWMAN_FALLBACK
+
+    # Detect communities based on algorithm
+    communities = {}
+    node_communities = {}
+
+    if previous is not None and algorithm in WARM_START_ALGORITHMS:
+        adjacency = adjacency_of(G)
+        labels, warm_start_details, budget_exhausted = warm_start(
+            adjacency, list(G.nodes()), previous["node_communities"], previous["links"], deadline
+        )
+        quality = modularity(adjacency, labels)
+
+        for node, label in zip(G.nodes(), labels.tolist()):
+            node_communities[node] = label
+            communities.setdefault(label, []).append(node)
+
+    elif algorithm == "louvain":
+        partition = community_louvain.best_partition(G)
+        node_communities = partition
+
+        for node, community_id in partition.items():
+            if community_id not in communities:
+                communities[community_id] = []
+            communities[community_id].append(node)
+
+    elif algorithm == "girvan_newman":
+        communities_iter = nx_community.girvan_newman(G)
+        communities_list = list(next(communities_iter))
+
+        for i, community in enumerate(communities_list):
+            communities[i] = list(community)
+            for node in community:
+                node_communities[node] = i
+
+    elif algorithm == "greedy_modularity":
+        communities_list = list(nx_community.greedy_modularity_communities(G))
+
+        for i, community in enumerate(communities_list):
+            communities[i] = list(community)
+            for node in community:
+                node_communities[node] = i
+
+    elif algorithm == "fast_greedy":
+        communities_list, budget_exhausted = fast_greedy(G, deadline)
+
+        for i, community in enumerate(communities_list):
+            communities[i] = list(community)
+            for node in community:
+                node_communities[node] = i
+
+    else:
+        # Label-based algorithms work on the CSR adjacency, in G's node order
+        adjacency = adjacency_of(G)
+        if algorithm == "label_propagation":
+            labels, budget_exhausted = label_propagation(adjacency, deadline)
+        else:
+            labels, budget_exhausted = leiden(adjacency, deadline)
+        quality = modularity(adjacency, labels)
+
+        for node, label in zip(G.nodes(), labels.tolist()):
+            node_communities[node] = label
+            communities.setdefault(label, []).append(node)
+
+    # Format communities for response
+    communities_list = community_statistics(nodes, links, communities)
+
+    # Sort communities by size
+    communities_list.sort(key=lambda x: x["size"], reverse=True)
+
+    if quality is None and algorithm == "louvain":
+        quality = community_louvain.modularity(node_communities, G)
+
+    return {
+        "communities": communities_list,
+        "node_communities": node_communities,
+        "modularity": quality,
+        "algorithm": algorithm,
+        "requested_algorithm": requested_algorithm,
+        "budget_exhausted": budget_exhausted,
+        "estimated_seconds": estimated_seconds,
+        "warm_start": warm_start_details
+    }
+
+
+def community_statistics(nodes, links, communities, top_k=TOP_MEMBERS):
+    """
+    Summarize each community from integer membership arrays in one pass over the
+    nodes and links: size, internal and external edge weight, conductance,
+    density, average PageRank and betweenness, and the top_k members by PageRank.
+    `communities` maps community id -> member node ids.
+    """
+    network = IndexedNetwork({"nodes": nodes, "links": links})
+    community_ids = list(communities)
+    count = len(community_ids)
+
+    # Community of every node by position, -1 for nodes outside all communities
+    membership = np.full(len(nodes), -1, dtype=np.int64)
+    for index, community_id in enumerate(community_ids):
+        positions = [network.position[node_id] for node_id in communities[community_id] if node_id in network.position]
+        membership[positions] = index
+    member = membership >= 0
+    # Sizes count every member, including ids only seen in links
+    sizes = np.array([len(communities[community_id]) for community_id in community_ids], dtype=np.int64)
+    known_sizes = np.bincount(membership[member], minlength=count)
+
+    pagerank = np.array([node.get("pagerank", 0) for node in nodes], dtype=np.float64)
+    betweenness = np.array([node.get("betweenness", 0) for node in nodes], dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg_pagerank = np.bincount(membership[member], pagerank[member], minlength=count) / sizes
+        avg_betweenness = np.bincount(membership[member], betweenness[member], minlength=count) / sizes
+
+    # Links between known, distinct nodes, labelled with both endpoints' communities
+    known = (network.sources >= 0) & (network.targets >= 0) & (network.sources != network.targets)
+    source_community = membership[network.sources[known]]
+    target_community = membership[network.targets[known]]
+    weights = network.weights[known]
+    internal = (source_community == target_community) & (source_community >= 0)
+    internal_weight = np.bincount(source_community[internal], weights[internal], minlength=count)
+    internal_links = np.bincount(source_community[internal], minlength=count)
+    crossing = ~internal
+    external_weight = (
+        np.bincount(source_community[crossing & (source_community >= 0)],
+                    weights[crossing & (source_community >= 0)], minlength=count) +
+        np.bincount(target_community[crossing & (target_community >= 0)],
+                    weights[crossing & (target_community >= 0)], minlength=count)
+    )
+
+    # Conductance: cut weight over the smaller of the two sides' volumes
+    volume = 2 * internal_weight + external_weight
+    complement_volume = 2 * weights.sum() - volume
+    smaller_volume = np.minimum(volume, complement_volume)
+    pairs = sizes * (sizes - 1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        conductance = np.where(smaller_volume > 0, external_weight / smaller_volume, 0.0)
+        density = np.where(pairs > 0, internal_links / pairs, 0.0)
+
+    # Members ordered by community, then by descending PageRank
+    ranked = np.lexsort((-pagerank[member], membership[member]))
+    ranked_positions = np.flatnonzero(member)[ranked]
+    starts = np.concatenate(([0], np.cumsum(known_sizes)[:-1])) if count else np.zeros(0, dtype=np.int64)
+
+    return [
+        {
+            "id": community_id,
+            "size": int(sizes[index]),
+            "nodes": communities[community_id],
+            "avg_betweenness": float(avg_betweenness[index]) if sizes[index] else 0,
+            "avg_pagerank": float(avg_pagerank[index]) if sizes[index] else 0,
+            "internal_weight": float(internal_weight[index]),
+            "external_weight": float(external_weight[index]),
+            "conductance": float(conductance[index]),
+            "density": float(density[index]),
+            "top_members": [
+                network.node_ids[position]
+                for position in ranked_positions[starts[index]:starts[index] + min(top_k, known_sizes[index])]
+            ]
+        }
+        for index, community_id in enumerate(community_ids)
+    ]
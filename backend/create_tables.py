@@ -1,12 +1,10 @@
 import asyncio
-from database import engine
-from models import Base
+from backend.migrations import migrate
 
 async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)  # Drop all tables if they exist
-        await conn.run_sync(Base.metadata.create_all)  # Create all tables
-    print("Tables created successfully!")
+    # Versioned migrations bring an existing database up to date without dropping its data
+    applied = await migrate()
+    print(f"Tables up to date ({len(applied)} migrations applied)")
 
 if __name__ == "__main__":
-    asyncio.run(create_tables())
\ No newline at end of file
+    asyncio.run(create_tables())
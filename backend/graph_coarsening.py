@@ -0,0 +1,200 @@
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+
+from backend.centrality import adjacency_matrix
+from backend.community_algorithms import leiden
+
+# Most super-nodes and links returned by one level-of-detail view or expand call
+LOD_MAX_NODES = int(os.getenv("LOD_MAX_NODES", 200))
+LOD_MAX_LINKS = int(os.getenv("LOD_MAX_LINKS", 2000))
+# Time budget for the community detection of each coarsening level
+LOD_LEVEL_SECONDS = float(os.getenv("LOD_LEVEL_SECONDS", 10))
+TOP_MEMBERS = 5
+
+
+def super_node_id(level, index):
+    return f"c{level}-{index}"
+
+
+def parse_super_node_id(node_id):
+    """(level, index) of a super-node id; raises ValueError for anything else"""
+    if not node_id.startswith("c"):
+        raise ValueError(f"Not a community node: {node_id}")
+    level, index = node_id[1:].split("-", 1)
+    return int(level), int(index)
+
+
+def _aggregate(adjacency, labels, count):
+    """Adjacency of the graph whose nodes are the label groups of `adjacency`'s nodes"""
+    projection = sparse.csr_matrix(
+        (np.ones(len(labels)), (np.arange(len(labels)), labels)), shape=(len(labels), count)
+    )
+    return (projection.T @ adjacency @ projection).tocsr()
+
+
+def _level_links(adjacency, level):
+    """Links between distinct super-nodes, heaviest first"""
+    upper = sparse.triu(adjacency, k=1).tocoo()
+    order = np.argsort(-upper.data, kind="stable")
+    return [
+        {"source": super_node_id(level, row), "target": super_node_id(level, col), "weight": weight}
+        for row, col, weight in zip(
+            upper.row[order].tolist(), upper.col[order].tolist(), upper.data[order].tolist()
+        )
+    ]
+
+
+def heavy_edge_matching(adjacency):
+    """
+    Pair every node with its unpaired neighbor of heaviest link, heaviest links
+    first, as in multilevel graph partitioners; nodes without links are grouped
+    together. Used when community detection stops merging, so the hierarchy
+    still roughly halves per level. Returns labels numbered from 0.
+    """
+    size = adjacency.shape[0]
+    indptr, indices, data = adjacency.indptr, adjacency.indices, adjacency.data
+    labels = np.full(size, -1)
+    isolated = []
+    strongest = np.zeros(size)
+    off_diagonal = sparse.csr_matrix(adjacency - sparse.diags(adjacency.diagonal()))
+    if off_diagonal.nnz:
+        strongest = off_diagonal.max(axis=1).toarray().ravel()
+
+    for node in np.argsort(-strongest, kind="stable").tolist():
+        if labels[node] >= 0:
+            continue
+        labels[node] = node
+        if strongest[node] == 0:
+            isolated.append(node)
+            continue
+        best, best_weight = -1, 0
+        for neighbor, weight in zip(indices[indptr[node]:indptr[node + 1]], data[indptr[node]:indptr[node + 1]]):
+            if neighbor != node and labels[neighbor] < 0 and weight > best_weight:
+                best, best_weight = neighbor, weight
+        if best >= 0:
+            labels[best] = node
+
+    if isolated:
+        labels[isolated] = isolated[0]
+    return np.unique(labels, return_inverse=True)[1]
+
+
+def coarsen_network(nodes, links, max_nodes=LOD_MAX_NODES, seed=0):
+    """
+    Community hierarchy of a network for level-of-detail views. Level 1 groups the
+    network's nodes into communities, and every further level groups the
+    communities of the level below (by heavy-edge matching once community
+    detection finds nothing more to merge), until a level has at most
+    `max_nodes` super-nodes or nothing can be merged.
+
+    Super-nodes carry their size (original nodes), child count, internal link
+    weight, summed messages and PageRank, and their most central members. Links
+    between super-nodes carry the summed weight of the links they stand for.
+    Level-1 communities also list their members as node positions (the
+    node_index of the normalized node table), most central first.
+    Runs in the analysis worker pool, so it takes and returns plain data.
+    """
+    node_ids = [node["id"] for node in nodes]
+    pagerank = np.array([node.get("pagerank", 0) or 0 for node in nodes], dtype=np.float64)
+    messages = np.array([node.get("messages", 0) or 0 for node in nodes], dtype=np.float64)
+
+    adjacency = adjacency_matrix(nodes, links)
+    membership = np.arange(len(nodes))  # Original node -> super-node of the current level
+    levels = []
+
+    while True:
+        previous_count = adjacency.shape[0]
+        labels, _ = leiden(adjacency, deadline=time.time() + LOD_LEVEL_SECONDS, seed=seed)
+        count = int(labels.max()) + 1 if len(labels) else 0
+        if levels and count >= previous_count:
+            labels = heavy_edge_matching(adjacency)
+            count = int(labels.max()) + 1 if len(labels) else 0
+            if count >= previous_count:
+                break
+
+        adjacency = _aggregate(adjacency, labels, count)
+        membership = labels[membership]
+        level = len(levels) + 1
+
+        sizes = np.bincount(membership, minlength=count)
+        # Members ordered by super-node, then by descending PageRank
+        ranked = np.lexsort((-pagerank, membership))
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        level_messages = np.bincount(membership, messages, minlength=count)
+        level_pagerank = np.bincount(membership, pagerank, minlength=count)
+        children = np.bincount(labels, minlength=count)
+        internal_weight = adjacency.diagonal() / 2
+
+        super_nodes = []
+        for index in range(count):
+            top = ranked[starts[index]:starts[index] + min(TOP_MEMBERS, sizes[index])].tolist()
+            super_nodes.append({
+                "id": super_node_id(level, index),
+                "level": level,
+                "label": node_ids[top[0]] if top else None,
+                "size": int(sizes[index]),
+                "children": int(children[index]),
+                "internal_weight": float(internal_weight[index]),
+                "messages": float(level_messages[index]),
+                "pagerank": float(level_pagerank[index]),
+                "top_members": [node_ids[position] for position in top]
+            })
+
+        levels.append({
+            "level": level,
+            "parents": labels.tolist(),  # Super-node of every node of the level below
+            "nodes": super_nodes,
+            "links": _level_links(adjacency, level),
+            "members": [
+                ranked[starts[index]:starts[index] + sizes[index]].tolist() for index in range(count)
+            ] if level == 1 else None
+        })
+        if count <= max_nodes:
+            break
+
+    return {"node_count": len(nodes), "levels": levels}
+
+
+def _bounded_view(super_nodes, links, max_nodes, max_links):
+    """The largest `max_nodes` super-nodes and the heaviest `max_links` links among them"""
+    kept = sorted(super_nodes, key=lambda node: node["size"], reverse=True)[:max_nodes]
+    kept_ids = {node["id"] for node in kept}
+    kept_links = [link for link in links if link["source"] in kept_ids and link["target"] in kept_ids]
+    return {
+        "nodes": kept,
+        "links": kept_links[:max_links],
+        "truncated": len(kept) < len(super_nodes) or len(kept_links) > max_links
+    }
+
+
+def default_level(hierarchy, max_nodes=LOD_MAX_NODES):
+    """The most detailed level with at most `max_nodes` super-nodes (else the coarsest)"""
+    for level in hierarchy["levels"]:
+        if len(level["nodes"]) <= max_nodes:
+            return level["level"]
+    return len(hierarchy["levels"])
+
+
+def level_view(hierarchy, level, max_nodes=LOD_MAX_NODES, max_links=LOD_MAX_LINKS):
+    """Super-graph of one level, bounded to max_nodes super-nodes and max_links links"""
+    levels = hierarchy["levels"]
+    view = _bounded_view(levels[level - 1]["nodes"], levels[level - 1]["links"], max_nodes, max_links)
+    return {"level": level, "levels": len(levels), "node_count": hierarchy["node_count"], **view}
+
+
+def expand_super_node(hierarchy, level, index, max_nodes=LOD_MAX_NODES, max_links=LOD_MAX_LINKS):
+    """
+    Children of a super-node at level >= 2: the super-nodes of the level below that
+    it groups, and the links between them, bounded like level_view.
+    """
+    children_level = hierarchy["levels"][level - 2]
+    parents = hierarchy["levels"][level - 1]["parents"]
+    child_ids = {super_node_id(level - 1, child) for child, parent in enumerate(parents) if parent == index}
+    children = [node for node in children_level["nodes"] if node["id"] in child_ids]
+    links = [
+        link for link in children_level["links"] if link["source"] in child_ids and link["target"] in child_ids
+    ]
+    return {"level": level - 1, **_bounded_view(children, links, max_nodes, max_links)}
@@ -0,0 +1,211 @@
+import asyncio
+import gzip
+import json
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response, StreamingResponse
+
+# Optional encoders: each format is only offered when its package is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Records per NDJSON chunk; each chunk is written as soon as it is serialized
+STREAM_BATCH_RECORDS = int(os.getenv("STREAM_BATCH_RECORDS", 2000))
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = 6
+# Brotli's default quality (11) is meant for static assets; 5 compresses better than gzip at similar speed
+BROTLI_QUALITY = 5
+
+
+def dumps_json(content):
+    """Serialize to JSON bytes, with orjson when available (NaN becomes null)"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _is_graph(value):
+    return isinstance(value, dict) and isinstance(value.get("nodes"), list) and isinstance(value.get("links"), list)
+
+
+def _columnar(graph):
+    nodes, links = graph["nodes"], graph["links"]
+    node_ids = [node["id"] for node in nodes]
+    position = {node_id: i for i, node_id in enumerate(node_ids)}
+    attributes = list(dict.fromkeys(key for node in nodes for key in node if key != "id"))
+
+    def endpoint(value):
+        return position.get(value["id"] if isinstance(value, dict) else value, -1)
+
+    return {
+        **graph,
+        "format": "columnar",
+        "nodes": {"id": node_ids, **{key: [node.get(key) for node in nodes] for key in attributes}},
+        "links": {
+            "source": [endpoint(link["source"]) for link in links],
+            "target": [endpoint(link["target"]) for link in links],
+            "weight": [link.get("weight", 1) for link in links]
+        }
+    }
+
+
+def columnar_graph(content):
+    """
+    Compact form of a response holding graphs: nodes as one list per attribute,
+    links as source and target node positions plus a weight list, so node ids are
+    not repeated in every link. Links to ids missing from the nodes get position -1.
+    Converts the response itself or, as in comparisons, graphs one level down;
+    other fields are left as they are.
+    """
+    if _is_graph(content):
+        return _columnar(content)
+    if isinstance(content, dict):
+        return {key: _columnar(value) if _is_graph(value) else value for key, value in content.items()}
+    return content
+
+
+def _accepted(header):
+    """Media types or codings listed in an Accept/Accept-Encoding header, minus any with q=0"""
+    accepted = set()
+    for item in (header or "").split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, param_value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    pass
+        if value and quality > 0:
+            accepted.add(value.lower())
+    return accepted
+
+
+def wants_ndjson(accept):
+    """Whether the client asked for a streamed NDJSON response"""
+    return NDJSON_MEDIA_TYPE in _accepted(accept)
+
+
+def record_batches(kind, items):
+    """Lists of {"type": kind, "data": item} records, STREAM_BATCH_RECORDS at a time"""
+    for start in range(0, len(items), STREAM_BATCH_RECORDS):
+        yield [{"type": kind, "data": item} for item in items[start:start + STREAM_BATCH_RECORDS]]
+
+
+def graph_batches(content):
+    """
+    NDJSON record batches of a response: its nodes, then its links, then its
+    communities, then one "meta" record with every other field.
+    """
+    for kind, key in (("node", "nodes"), ("link", "links"), ("community", "communities")):
+        yield from record_batches(kind, content.get(key) or [])
+    yield [{"type": "meta", "data": {
+        key: value for key, value in content.items() if key not in ("nodes", "links", "communities")
+    }}]
+
+
+def _ndjson_chunk(batch):
+    return b"".join(dumps_json(record) + b"\n" for record in batch)
+
+
+class NDJSONResponse(StreamingResponse):
+    """
+    Chunked NDJSON response, one JSON record per line. `batches` is a sync or async
+    iterable of record lists; each list is serialized in a thread and sent when it
+    is produced, so only one batch is held as JSON at a time and the event loop
+    stays free while large graphs are written.
+    """
+
+    def __init__(self, batches, status_code=200):
+        super().__init__(self._chunks(batches), status_code=status_code, media_type=NDJSON_MEDIA_TYPE)
+
+    @staticmethod
+    async def _chunks(batches):
+        if hasattr(batches, "__aiter__"):
+            async for batch in batches:
+                yield await asyncio.to_thread(_ndjson_chunk, batch)
+        else:
+            for batch in batches:
+                yield await asyncio.to_thread(_ndjson_chunk, batch)
+
+
+def encode_content(content, accept=None, accept_encoding=None):
+    """
+    Body bytes, media type and content coding (or None) for `content`, negotiated
+    from the request's Accept and Accept-Encoding headers: MessagePack in columnar
+    form when the client accepts application/x-msgpack, JSON otherwise, then
+    brotli or gzip compression for bodies of at least COMPRESS_MIN_BYTES.
+    """
+    if msgpack is not None and MSGPACK_MEDIA_TYPE in _accepted(accept):
+        body, media_type = msgpack.packb(columnar_graph(content)), MSGPACK_MEDIA_TYPE
+    else:
+        body, media_type = dumps_json(content), "application/json"
+
+    content_encoding = None
+    if len(body) >= COMPRESS_MIN_BYTES:
+        codings = _accepted(accept_encoding)
+        if brotli is not None and "br" in codings:
+            body, content_encoding = brotli.compress(body, quality=BROTLI_QUALITY), "br"
+        elif "gzip" in codings:
+            body, content_encoding = gzip.compress(body, GZIP_LEVEL), "gzip"
+    return body, media_type, content_encoding
+
+
+class GraphResponse(Response):
+    """
+    Response whose encoding is chosen when it is sent, from the request headers
+    (see encode_content), or streamed as NDJSON records (see graph_batches) when
+    the client accepts application/x-ndjson. Encoding and compression run in a
+    thread; until then `body` is None and `content` holds the data itself.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content, status_code=200, headers=None, background=None):
+        super().__init__(
+            content=content, status_code=status_code, headers=headers,
+            media_type=self.media_type, background=background
+        )
+
+    def render(self, content):
+        # The body depends on the request's Accept headers, so it is encoded in __call__
+        self.content = content
+        return None
+
+    async def __call__(self, scope, receive, send):
+        request_headers = Headers(scope=scope)
+        if wants_ndjson(request_headers.get("accept")) and isinstance(self.content, dict):
+            response = NDJSONResponse(graph_batches(self.content), status_code=self.status_code)
+            response.background = self.background
+            await response(scope, receive, send)
+            return
+
+        body, media_type, content_encoding = await asyncio.to_thread(
+            encode_content, self.content, request_headers.get("accept"), request_headers.get("accept-encoding")
+        )
+
+        headers = MutableHeaders(raw=list(self.raw_headers))
+        headers["content-type"] = media_type
+        headers["content-length"] = str(len(body))
+        headers["vary"] = "Accept, Accept-Encoding"
+        if content_encoding:
+            headers["content-encoding"] = content_encoding
+
+        response = Response(body, status_code=self.status_code, background=self.background)
+        response.raw_headers = headers.raw
+        await response(scope, receive, send)
@@ -0,0 +1,93 @@
+from sqlalchemy import select
+
+from backend.bulk_writer import ensure_graph_rows
+from backend.models import AnalysisEdge, AnalysisNode
+
+
+def _weight(value):
+    """Stored weights are floats; give whole-number weights back as ints"""
+    return int(value) if float(value).is_integer() else value
+
+
+async def load_subgraph(db, analysis_id, min_weight=None, node_filter=None, top_k=None):
+    """
+    The part of a stored analysis that matches the filters, selected in SQL from
+    the normalized graph tables:
+    - node_filter keeps nodes whose id contains the text (case-insensitive) and
+      links between two such nodes,
+    - min_weight keeps links at or above the weight,
+    - top_k keeps only the heaviest top_k links, and only the nodes they connect.
+    Returns {"nodes", "links"} in the same shape as a NetworkAnalysis.
+    """
+    await ensure_graph_rows(db, analysis_id)
+    matching_nodes = select(AnalysisNode.node_index).where(AnalysisNode.analysis_id == analysis_id)
+    if node_filter:
+        matching_nodes = matching_nodes.where(AnalysisNode.node_id.icontains(node_filter, autoescape=True))
+
+    edge_query = (
+        select(AnalysisEdge.source_index, AnalysisEdge.target_index, AnalysisEdge.weight)
+        .where(AnalysisEdge.analysis_id == analysis_id)
+    )
+    if min_weight is not None:
+        edge_query = edge_query.where(AnalysisEdge.weight >= min_weight)
+    if node_filter:
+        edge_query = edge_query.where(
+            AnalysisEdge.source_index.in_(matching_nodes), AnalysisEdge.target_index.in_(matching_nodes)
+        )
+    if top_k is not None:
+        edge_query = edge_query.order_by(AnalysisEdge.weight.desc()).limit(top_k)
+    else:
+        edge_query = edge_query.order_by(AnalysisEdge.edge_index)
+    edges = (await db.execute(edge_query)).all()
+
+    node_query = select(AnalysisNode.node_index, AnalysisNode.data).where(AnalysisNode.analysis_id == analysis_id)
+    if top_k is not None:
+        endpoints = {index for source, target, _ in edges for index in (source, target)}
+        node_query = node_query.where(AnalysisNode.node_index.in_(endpoints))
+    elif node_filter:
+        node_query = node_query.where(AnalysisNode.node_id.icontains(node_filter, autoescape=True))
+    node_rows = (await db.execute(node_query.order_by(AnalysisNode.node_index))).all()
+
+    node_data = {index: data for index, data in node_rows}
+    return {
+        "nodes": list(node_data.values()),
+        "links": [
+            {"source": node_data[source]["id"], "target": node_data[target]["id"], "weight": _weight(weight)}
+            for source, target, weight in edges
+        ]
+    }
+
+
+async def load_members(db, analysis_id, node_indexes, max_links=None):
+    """
+    Nodes of a stored analysis at the given positions and the links among them,
+    heaviest first and at most max_links. Returns {"nodes", "links"}.
+    """
+    await ensure_graph_rows(db, analysis_id)
+    node_rows = (await db.execute(
+        select(AnalysisNode.node_index, AnalysisNode.data)
+        .where(AnalysisNode.analysis_id == analysis_id, AnalysisNode.node_index.in_(node_indexes))
+        .order_by(AnalysisNode.node_index)
+    )).all()
+
+    edge_query = (
+        select(AnalysisEdge.source_index, AnalysisEdge.target_index, AnalysisEdge.weight)
+        .where(
+            AnalysisEdge.analysis_id == analysis_id,
+            AnalysisEdge.source_index.in_(node_indexes),
+            AnalysisEdge.target_index.in_(node_indexes)
+        )
+        .order_by(AnalysisEdge.weight.desc(), AnalysisEdge.edge_index)
+    )
+    if max_links is not None:
+        edge_query = edge_query.limit(max_links)
+    edges = (await db.execute(edge_query)).all()
+
+    node_data = {index: data for index, data in node_rows}
+    return {
+        "nodes": list(node_data.values()),
+        "links": [
+            {"source": node_data[source]["id"], "target": node_data[target]["id"], "weight": _weight(weight)}
+            for source, target, weight in edges
+        ]
+    }
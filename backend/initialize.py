@@ -5,8 +5,7 @@ from dotenv import load_dotenv
 import spacy
 import asyncpg
 from datetime import datetime
-from database import engine
-from models import Base
+from backend.migrations import migrate
 
 
 async def download_spacy_models():
@@ -31,8 +30,7 @@ async def create_tables():
     """Create database tables"""
     try:
         print("Creating database tables...")
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        await migrate()
         print("✅ Database tables created successfully")
     except Exception as e:
         print(f"❌ Error creating tables: {e}")
@@ -1,8 +1,8 @@
+import asyncio
 import json
 import os
 import re
 import uuid
-from collections import defaultdict
 from datetime import datetime, timedelta
 from uuid import uuid4
 
@@ -10,7 +10,7 @@ import bcrypt
 import fastapi
 import networkx as nx
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, File, UploadFile, Query, Depends
+from fastapi import FastAPI, HTTPException, File, UploadFile, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordBearer
@@ -18,9 +18,29 @@ from jose import jwt, JWTError
 from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
-from backend.database import get_db
-from backend.models import User, Research, UploadedFile, NetworkAnalysis
+from backend.analysis_jobs import submit_job, get_job, cancel_job
+from backend.bulk_writer import bulk_insert, community_rows, schedule_graph_insert
+from backend.centrality import CENTRALITY_PARAMS, compute_centrality
+from backend.community_detection import (
+    OVER_BUDGET_POLICIES, SUPPORTED_ALGORITHMS, WARM_START_ALGORITHMS, CommunityBudgetError, detect_communities
+)
+from backend.database import get_db, async_session
+from backend.graph_coarsening import (
+    LOD_MAX_LINKS, LOD_MAX_NODES, coarsen_network, default_level, expand_super_node, level_view,
+    parse_super_node_id
+)
+from backend.graph_encoding import GraphResponse, NDJSONResponse, record_batches, wants_ndjson
+from backend.graph_queries import load_members, load_subgraph
+from backend.models import User, Research, UploadedFile, NetworkAnalysis, Community
+from backend.network_builder import analyze_chat_file, summarize_chat_file
+from backend.network_comparison import compare_networks, similarity_matrices, summarize_network
+from backend.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_page, page_response
+from backend.result_cache import ResultCache, file_content_hash, make_cache_key
+from backend.single_flight import SingleFlight
+from backend.upload_store import UploadTooLargeError, release_upload, store_upload
+from backend.worker_pool import AnalysisTimeoutError, run_in_pool, shutdown_pool
 
 # Load environment variables
 load_dotenv()
@@ -30,8 +50,24 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 UPLOAD_FOLDER = "./uploads/"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 2 * 1024 * 1024 * 1024))
+MAX_COMPARED_NETWORKS = int(os.getenv("MAX_COMPARED_NETWORKS", 50))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Analysis result cache (memory LRU + on-disk tier that survives restarts)
+analysis_cache = ResultCache(
+    folder=os.path.join(UPLOAD_FOLDER, ".cache"),
+    memory_budget=int(os.getenv("ANALYSIS_CACHE_MEMORY_BYTES", 256 * 1024 * 1024)),
+    disk_budget=int(os.getenv("ANALYSIS_CACHE_DISK_BYTES", 2 * 1024 * 1024 * 1024))
+)
+
+# Coalescing of identical concurrent analysis requests
+network_flights = SingleFlight("network")
+community_flights = SingleFlight("communities")
+lod_flights = SingleFlight("lod")
+summary_flights = SingleFlight("summary")
+
 # Initialize FastAPI
 app = FastAPI()
 
@@ -44,6 +80,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("shutdown")
+def stop_worker_pool():
+    """Stop the worker processes once in-flight analyses finish"""
+    shutdown_pool()
+
+
 # OAuth2 Configuration
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
@@ -72,6 +115,51 @@ class OAuthUser(BaseModel):
     avatar: str
 
 
+class AnalysisJobCreate(BaseModel):
+    filename: str
+    start_date: str = Field(None)
+    start_time: str = Field(None)
+    end_date: str = Field(None)
+    end_time: str = Field(None)
+    limit: int = Field(None)
+    limit_type: str = Field("first")
+    min_length: int = Field(None)
+    max_length: int = Field(None)
+    keywords: str = Field(None)
+    min_messages: int = Field(None)
+    max_messages: int = Field(None)
+    active_users: int = Field(None)
+    selected_users: str = Field(None)
+    username: str = Field(None)
+    anonymize: bool = Field(False)
+    betweenness_samples: int = Field(None, ge=1)
+    betweenness_seconds: float = Field(None, gt=0)
+    betweenness_seed: int = Field(None)
+    algorithm: str = Field(None)  # Also detect communities when set
+    max_seconds: float = Field(None, gt=0)  # Time budget for community detection
+    over_budget: str = Field("downgrade")
+
+
+class NetworkSetComparison(BaseModel):
+    filenames: list[str] = Field([])
+    analysis_ids: list[str] = Field([])  # Stored analyses are compared as they were saved
+    start_date: str = Field(None)
+    start_time: str = Field(None)
+    end_date: str = Field(None)
+    end_time: str = Field(None)
+    limit: int = Field(None)
+    limit_type: str = Field("first")
+    min_length: int = Field(None)
+    max_length: int = Field(None)
+    keywords: str = Field(None)
+    min_messages: int = Field(None)
+    max_messages: int = Field(None)
+    active_users: int = Field(None)
+    selected_users: str = Field(None)
+    username: str = Field(None)
+    anonymize: bool = Field(False)
+
+
 # Utility Functions
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     """
@@ -297,12 +385,11 @@ async def upload_file(
         # Generate a unique filename
         file_uuid = uuid4()
         filename = f"{file_uuid}_{file.filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
 
-        # Save the file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Stream the file to disk; identical content is stored once
+        file_path, content_hash, size, deduplicated = await store_upload(
+            file, UPLOAD_FOLDER, filename, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+        )
 
         # Store file record in database
         new_file = UploadedFile(
@@ -321,10 +408,15 @@ async def upload_file(
             content={
                 "message": "File uploaded successfully!",
                 "filename": filename,
-                "id": str(new_file.id)
+                "id": str(new_file.id),
+                "content_hash": content_hash,
+                "size": size,
+                "deduplicated": deduplicated
             },
             status_code=200
         )
+    except UploadTooLargeError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
@@ -353,8 +445,11 @@ async def delete_file(
                 status_code=404
             )
 
-        # Delete file from filesystem
-        os.remove(file_path)
+        # Delete the file; its stored content, parsed index and cached results go with
+        # the last upload that shares them
+        content_hash = await asyncio.to_thread(file_content_hash, file_path)
+        if await asyncio.to_thread(release_upload, UPLOAD_FOLDER, file_path, content_hash):
+            await asyncio.to_thread(analysis_cache.invalidate, content_hash)
 
         # Delete file record from database if it exists
         if file_record:
@@ -381,12 +476,11 @@ async def upload_file(
         # Generate a unique filename
         file_uuid = uuid4()
         filename = f"{file_uuid}_{file.filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
 
-        # Save the file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Stream the file to disk; identical content is stored once
+        file_path, content_hash, size, deduplicated = await store_upload(
+            file, UPLOAD_FOLDER, filename, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+        )
 
         # Store file record in database
         new_file = UploadedFile(
@@ -405,10 +499,15 @@ async def upload_file(
             content={
                 "message": "File uploaded successfully!",
                 "filename": filename,
-                "id": str(new_file.id)
+                "id": str(new_file.id),
+                "content_hash": content_hash,
+                "size": size,
+                "deduplicated": deduplicated
             },
             status_code=200
         )
+    except UploadTooLargeError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
@@ -437,8 +536,11 @@ async def delete_file(
                 status_code=404
             )
 
-        # Delete file from filesystem
-        os.remove(file_path)
+        # Delete the file; its stored content, parsed index and cached results go with
+        # the last upload that shares them
+        content_hash = await asyncio.to_thread(file_content_hash, file_path)
+        if await asyncio.to_thread(release_upload, UPLOAD_FOLDER, file_path, content_hash):
+            await asyncio.to_thread(analysis_cache.invalidate, content_hash)
 
         # Delete file record from database if it exists
         if file_record:
@@ -453,6 +555,227 @@ async def delete_file(
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+async def analysis_exists(analysis_id):
+    """Whether a stored NetworkAnalysis row still exists"""
+    if not analysis_id:
+        return False
+    async with async_session() as db:
+        result = await db.execute(
+            select(NetworkAnalysis.id).where(NetworkAnalysis.id == uuid.UUID(analysis_id))
+        )
+        return result.scalar() is not None
+
+
+def network_filters(analysis_params):
+    """The analysis parameters that select messages and shape the graph, for analyze_chat_file"""
+    return {
+        key: value for key, value in analysis_params.items()
+        if key != "filename" and key not in CENTRALITY_PARAMS
+    }
+
+
+async def load_or_build_network(file_path, file_id, analysis_params, cache_key, persist=True):
+    """
+    Return the nodes, links and stored analysis id for an analysis, from the result
+    cache when possible. With persist=False nothing is written and the analysis id
+    may be None. It opens its own session because coalesced requests share a single call.
+
+    The graph is cached per file content, but each upload gets its own stored analysis:
+    the entry maps file ids to the NetworkAnalysis rows written for them.
+    """
+    cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+    file_key = str(file_id)
+
+    if cached:
+        nodes_list, links_list, centrality_info = cached["nodes"], cached["links"], cached["centrality"]
+        analysis_ids = cached["analysis_ids"]
+        # Reuse this upload's stored analysis unless it has been deleted since
+        analysis_id = analysis_ids.get(file_key) if persist else None
+        if not persist or await analysis_exists(analysis_id):
+            return {
+                "nodes": nodes_list,
+                "links": links_list,
+                "analysis_id": analysis_id,
+                "centrality": centrality_info
+            }
+    else:
+        # Filter and build the graph from the file's columnar index (parsed once per upload)
+        # in the worker pool, so the event loop stays free for other requests
+        nodes_list, links_list = await run_in_pool(analyze_chat_file, file_path, **network_filters(analysis_params))
+        nodes_list, centrality_info = await compute_centrality(
+            nodes_list, links_list,
+            samples=analysis_params.get("betweenness_samples"),
+            seed=analysis_params.get("betweenness_seed"),
+            max_seconds=analysis_params.get("betweenness_seconds")
+        )
+        analysis_ids = {}
+
+    analysis_id = None
+    if persist:
+        # Store analysis results in database
+        async with async_session() as db:
+            [network_analysis] = await bulk_insert(db, NetworkAnalysis, [{
+                "file_id": file_id,
+                "nodes": nodes_list,
+                "links": links_list,
+                "parameters": analysis_params,
+                "node_count": len(nodes_list),
+                "edge_count": len(links_list)
+            }])
+            await db.commit()
+            analysis_id = str(network_analysis["id"])
+        # Normalized rows for filtered queries are written off the request path
+        schedule_graph_insert(network_analysis["id"], nodes_list, links_list)
+        analysis_ids = {**analysis_ids, file_key: analysis_id}
+
+    await asyncio.to_thread(analysis_cache.put, cache_key, {
+        "nodes": nodes_list,
+        "links": links_list,
+        "centrality": centrality_info,
+        "analysis_ids": analysis_ids
+    })
+    return {
+        "nodes": nodes_list,
+        "links": links_list,
+        "analysis_id": analysis_id,
+        "centrality": centrality_info
+    }
+
+
+async def get_network_result(filename, analysis_params, db, persist=True):
+    """
+    Nodes, links and analysis id for an uploaded file and analysis parameters.
+    Identical concurrent requests share one computation; repeated ones hit the
+    result cache. Raises FileNotFoundError if the upload does not exist.
+    """
+    # Check if the file exists in the file system
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File '{filename}' not found.")
+
+    file_id = None
+    if persist:
+        # Find file in database
+        result = await db.execute(
+            select(UploadedFile.id).where(UploadedFile.filename == filename)
+        )
+        file_id = result.scalar()
+
+    content_hash = await asyncio.to_thread(file_content_hash, file_path)
+    cache_key = make_cache_key(content_hash, analysis_params)
+    # Uploads sharing content share the graph, but not the stored analysis
+    return await network_flights.run(
+        (cache_key, file_id if persist else None, persist),
+        lambda: load_or_build_network(file_path, file_id, analysis_params, cache_key, persist)
+    )
+
+
+async def load_previous_partition(analysis_id):
+    """
+    Stored community assignment and links of an earlier analysis, used to warm-start
+    community detection on a newer export of the same chat.
+    """
+    analysis_uuid = uuid.UUID(analysis_id)
+    async with async_session() as db:
+        result = await db.execute(
+            select(NetworkAnalysis.links).where(NetworkAnalysis.id == analysis_uuid)
+        )
+        links = result.scalar()
+        if links is None:
+            raise LookupError(f"Analysis '{analysis_id}' not found.")
+
+        result = await db.execute(
+            select(Community.community_index, Community.nodes).where(Community.analysis_id == analysis_uuid)
+        )
+        rows = result.all()
+
+    if not rows:
+        raise LookupError(f"Analysis '{analysis_id}' has no stored communities.")
+    node_communities = {node: community_index for community_index, nodes in rows for node in nodes}
+    return {"node_communities": node_communities, "links": links}
+
+
+async def load_or_detect_communities(network_data, algorithm, cache_key, max_seconds=None,
+                                     over_budget="downgrade", previous=None):
+    """
+    Return community detection results for a stored analysis, from the result cache
+    when possible, persisting Community rows only when they are first computed.
+    """
+    cached = await asyncio.to_thread(analysis_cache.get, cache_key)
+    if cached:
+        return cached
+
+    # Detect communities in the worker pool
+    detection = await run_in_pool(
+        detect_communities, network_data["nodes"], network_data["links"], algorithm,
+        max_seconds, over_budget, previous
+    )
+
+    # Store all communities in database in one bulk write
+    async with async_session() as db:
+        await bulk_insert(
+            db, Community, community_rows(uuid.UUID(network_data["analysis_id"]), detection["communities"])
+        )
+        await db.commit()
+
+    await asyncio.to_thread(analysis_cache.put, cache_key, detection)
+    return detection
+
+
+async def get_community_result(filename, network_data, algorithm, max_seconds=None, over_budget="downgrade",
+                               previous=None, previous_analysis_id=None):
+    """
+    Community detection results for a stored analysis of an uploaded file.
+    Identical concurrent requests share one computation; repeated ones hit the
+    result cache.
+    """
+    # Results are tied to the stored analysis, so the analysis id identifies the input graph
+    content_hash = await asyncio.to_thread(file_content_hash, os.path.join(UPLOAD_FOLDER, filename))
+    cache_key = make_cache_key(
+        content_hash,
+        {
+            "analysis_id": network_data["analysis_id"],
+            "max_seconds": max_seconds,
+            "over_budget": over_budget,
+            "previous_analysis_id": previous_analysis_id
+        },
+        kind=f"communities:{algorithm}"
+    )
+    return await community_flights.run(
+        cache_key,
+        lambda: load_or_detect_communities(network_data, algorithm, cache_key, max_seconds, over_budget, previous)
+    )
+
+
+def analysis_parameters(filename, start_date=None, start_time=None, end_date=None, end_time=None,
+                        limit=None, limit_type="first", min_length=None, max_length=None, keywords=None,
+                        min_messages=None, max_messages=None, active_users=None, selected_users=None,
+                        username=None, anonymize=False, betweenness_samples=None, betweenness_seconds=None,
+                        betweenness_seed=None):
+    """Analysis parameters of a request, as stored with the analysis and used in its cache key"""
+    return {
+        "filename": filename,
+        "start_date": start_date,
+        "start_time": start_time,
+        "end_date": end_date,
+        "end_time": end_time,
+        "limit": limit,
+        "limit_type": limit_type,
+        "min_length": min_length,
+        "max_length": max_length,
+        "keywords": keywords,
+        "min_messages": min_messages,
+        "max_messages": max_messages,
+        "active_users": active_users,
+        "selected_users": selected_users,
+        "username": username,
+        "anonymize": anonymize,
+        "betweenness_samples": betweenness_samples,
+        "betweenness_seconds": betweenness_seconds,
+        "betweenness_seed": betweenness_seed
+    }
+
+
 @app.get("/analyze/network/{filename}")
 async def analyze_network(
         filename: str,
@@ -471,207 +794,116 @@ async def analyze_network(
         selected_users: str = Query(None),
         username: str = Query(None),
         anonymize: bool = Query(False),
+        betweenness_samples: int = Query(None, ge=1),
+        betweenness_seconds: float = Query(None, gt=0),
+        betweenness_seed: int = Query(None),
         db: AsyncSession = Depends(get_db)
 ):
+    """
+    Build the conversation network of an uploaded chat, with centrality metrics on
+    every node. Betweenness and closeness are exact for small networks; pass
+    betweenness_samples (source nodes) and/or betweenness_seconds (time budget) to
+    estimate them from a sample, reproducibly with betweenness_seed. The
+    "centrality" field reports how they were computed and the estimated error.
+    With Accept: application/x-ndjson the result is streamed as NDJSON records:
+    nodes, then links, then a "meta" record with the other fields.
+    """
     try:
-        # Find file in database
-        result = await db.execute(
-            select(UploadedFile).where(UploadedFile.filename == filename)
+        # Store analysis parameters
+        analysis_params = analysis_parameters(
+            filename, start_date, start_time, end_date, end_time, limit, limit_type,
+            min_length, max_length, keywords, min_messages, max_messages,
+            active_users, selected_users, username, anonymize,
+            betweenness_samples, betweenness_seconds, betweenness_seed
         )
-        file_record = result.scalars().first()
 
-        # Check if the file exists in the file system
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        if not os.path.exists(file_path):
-            return JSONResponse(
-                content={"error": f"File '{filename}' not found."},
-                status_code=404
-            )
+        network_result = await get_network_result(filename, analysis_params, db)
 
-        # Store analysis parameters
-        analysis_params = {
-            "filename": filename,
-            "start_date": start_date,
-            "start_time": start_time,
-            "end_date": end_date,
-            "end_time": end_time,
-            "limit": limit,
-            "limit_type": limit_type,
-            "min_length": min_length,
-            "max_length": max_length,
-            "keywords": keywords,
-            "min_messages": min_messages,
-            "max_messages": max_messages,
-            "active_users": active_users,
-            "selected_users": selected_users,
-            "username": username,
-            "anonymize": anonymize
-        }
+        return GraphResponse(network_result)
+    except FileNotFoundError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=404)
+    except AnalysisTimeoutError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=504)
+    except Exception as e:
+        print("Error:", e)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
 
-        # Initialize storage for nodes and edges
-        nodes = set()
-        user_message_count = defaultdict(int)
-        edges_counter = defaultdict(int)
-        previous_sender = None
-        anonymized_map = {}
-
-        # Parse dates if provided
-        start_datetime = None
-        end_datetime = None
-
-        if start_date and start_time:
-            start_datetime = datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M:%S")
-        elif start_date:
-            start_datetime = datetime.strptime(f"{start_date} 00:00:00", "%Y-%m-%d %H:%M:%S")
-
-        if end_date and end_time:
-            end_datetime = datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M:%S")
-        elif end_date:
-            end_datetime = datetime.strptime(f"{end_date} 23:59:59", "%Y-%m-%d %H:%M:%S")
-
-        # Function to anonymize names if needed
-        def anonymize_name(name, anonymized_map):
-            if name.startswith("\u202a+972") or name.startswith("+972"):
-                name = f"Phone_{len(anonymized_map) + 1}"
-            if name not in anonymized_map:
-                anonymized_map[name] = f"User_{len(anonymized_map) + 1}"
-            return anonymized_map[name]
-
-        # Read and filter the file contents
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        # Filter messages by date/time
-        filtered_lines = []
-        for line in lines:
-            if line.startswith("[") and "]" in line:
-                date_part = line.split("] ")[0].strip("[]")
-                try:
-                    current_datetime = datetime.strptime(date_part, "%d.%m.%Y, %H:%M:%S")
-                except ValueError:
-                    continue
-
-                if ((start_datetime and current_datetime >= start_datetime) or not start_datetime) and \
-                        ((end_datetime and current_datetime <= end_datetime) or not end_datetime):
-                    filtered_lines.append(line)
-
-        # Apply message limit and type
-        if limit and limit_type == "first":
-            selected_lines = filtered_lines[:limit]
-        elif limit and limit_type == "last":
-            selected_lines = filtered_lines[-limit:]
-        else:
-            selected_lines = filtered_lines
-
-        # Process selected lines
-        for line in selected_lines:
-            try:
-                if "omitted" in line or "הושמט" in line:
-                    continue
-
-                if line.startswith("[") and "]" in line and ": " in line:
-                    _, message_part = line.split("] ", 1)
-                    parts = message_part.split(":", 1)
-                    sender = parts[0].strip("~").replace("\u202a", "").strip()
-                    message_content = parts[1].strip() if len(parts) > 1 else ""
-
-                    # Apply content filters
-                    message_length = len(message_content)
-                    if (min_length and message_length < min_length) or \
-                            (max_length and message_length > max_length):
-                        continue
-
-                    if username and sender.lower() != username.lower():
-                        continue
-
-                    if keywords and not any(kw in message_content.lower()
-                                            for kw in keywords.split(",")):
-                        continue
-
-                    # Count messages per user
-                    user_message_count[sender] += 1
-
-                    # Process valid messages
-                    if sender:
-                        if anonymize:
-                            sender = anonymize_name(sender, anonymized_map)
-
-                        nodes.add(sender)
-                        if previous_sender and previous_sender != sender:
-                            edge = tuple(sorted([previous_sender, sender]))
-                            edges_counter[edge] += 1
-                        previous_sender = sender
-            except Exception as e:
-                print(f"Error processing line: {line.strip()} - {e}")
-                continue
 
-        # Apply user-based filters
-        filtered_users = {
-            user: count for user, count in user_message_count.items()
-            if (not min_messages or count >= min_messages) and
-               (not max_messages or count <= max_messages)
-        }
+@app.post("/analyze/jobs")
+async def create_analysis_job(job_request: AnalysisJobCreate):
+    """
+    Start a network (and optionally community) analysis in the background.
+    Poll GET /analyze/jobs/{job_id} for progress; results are stored as a NetworkAnalysis.
+    """
+    file_path = os.path.join(UPLOAD_FOLDER, job_request.filename)
+    if not os.path.exists(file_path):
+        return JSONResponse(
+            content={"error": f"File '{job_request.filename}' not found."},
+            status_code=404
+        )
 
-        if active_users:
-            sorted_users = sorted(
-                filtered_users.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:active_users]
-            filtered_users = dict(sorted_users)
-
-        if selected_users:
-            selected_list = [user.strip().lower() for user in selected_users.split(",")]
-            filtered_users = {
-                user: count for user, count in filtered_users.items()
-                if user.lower() in selected_list
-            }
+    if job_request.algorithm and job_request.algorithm not in SUPPORTED_ALGORITHMS:
+        return JSONResponse(
+            content={
+                "error": f"Unknown algorithm: {job_request.algorithm}. Supported: {', '.join(SUPPORTED_ALGORITHMS)}"},
+            status_code=400
+        )
 
-        # Create final node and link lists
-        filtered_nodes = set(filtered_users.keys())
-        if anonymize:
-            filtered_nodes = {anonymize_name(node, anonymized_map) for node in filtered_nodes}
+    if job_request.over_budget not in OVER_BUDGET_POLICIES:
+        return JSONResponse(
+            content={"error": f"over_budget must be one of: {', '.join(OVER_BUDGET_POLICIES)}"},
+            status_code=400
+        )
 
-        nodes_list = []
-        for node in filtered_nodes:
-            node_data = {
-                "id": node,
-                "messages": user_message_count.get(node, 0)
-            }
-            nodes_list.append(node_data)
+    # The same parameters, cache and coalescing as GET /analyze/network and /analyze/communities
+    parameters = job_request.dict(exclude={"algorithm", "max_seconds", "over_budget"})
 
-        links_list = []
-        for (source, target), weight in edges_counter.items():
-            if source in filtered_nodes and target in filtered_nodes:
-                links_list.append({
-                    "source": source,
-                    "target": target,
-                    "weight": weight
-                })
+    async def build_network():
+        async with async_session() as db:
+            return await get_network_result(job_request.filename, parameters, db)
 
-        # Store analysis results in database
-        network_analysis = NetworkAnalysis(
-            file_id=file_record.id if file_record else None,
-            nodes=nodes_list,
-            links=links_list,
-            parameters=analysis_params
+    def find_communities(network_data):
+        return get_community_result(
+            job_request.filename, network_data, job_request.algorithm,
+            job_request.max_seconds, job_request.over_budget
         )
 
-        db.add(network_analysis)
-        await db.commit()
-        await db.refresh(network_analysis)
+    job = submit_job(
+        file_path, parameters, build_network,
+        find_communities if job_request.algorithm else None, algorithm=job_request.algorithm
+    )
+    return JSONResponse(content={"job_id": str(job.id), "status": job.status}, status_code=202)
+
+
+@app.get("/analyze/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Report a job's status and per-stage progress"""
+    try:
+        job = get_job(uuid.UUID(job_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job.to_dict()
 
-        return JSONResponse(
-            content={
-                "nodes": nodes_list,
-                "links": links_list,
-                "analysis_id": str(network_analysis.id)
-            },
-            status_code=200
-        )
-    except Exception as e:
-        print("Error:", e)
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.delete("/analyze/jobs/{job_id}")
+async def cancel_analysis_job(job_id: str):
+    """Cancel a queued or running job"""
+    try:
+        job = get_job(uuid.UUID(job_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if not cancel_job(job.id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+
+    return {"message": "Job cancelled", "job_id": str(job.id)}
 
 
 @app.post("/upload-chats")
@@ -683,19 +915,14 @@ async def upload_chats(
     Process a WhatsApp chat file and store messages in the 
     """
     try:
-        # Read file contents
-        contents = await file.read()
-        text_data = contents.decode("utf-8", errors="replace")
-        lines = text_data.splitlines()
-
         # Create file record
         file_uuid = uuid4()
         filename = f"{file_uuid}_{file.filename}"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
 
-        # Save file to disk
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        # Stream the file to disk; identical content is stored once
+        file_path, content_hash, size, deduplicated = await store_upload(
+            file, UPLOAD_FOLDER, filename, MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+        )
 
         # Create file record in database
         file_record = UploadedFile(
@@ -709,30 +936,28 @@ async def upload_chats(
         db.add(file_record)
         await db.commit()
 
-        # Process the file lines
-        pattern = re.compile(r"\[([^\]]+)\]\s*([^:]+):\s*(.+)")
-        group_name = None
-        processed_messages = []
-
-        for line in lines:
-            line = line.strip()
-            match = pattern.match(line)
-            if match:
-                date_time = match.group(1)  # e.g. "7.10.2023, 19:43:25"
-                sender = match.group(2).strip()  # e.g. "~🦋"
-                message = match.group(3)  # e.g. "איזה יפים אתם❤️ יהיה טוב!!!!"
-
-                # If we haven't set group_name yet, use the first sender
-                if group_name is None:
-                    group_name = sender
-
-                # Add to processed messages
-                processed_messages.append({
-                    "date_time": date_time,
-                    "sender": sender,
-                    "message": message,
-                    "group_name": group_name
-                })
+        # Stream the saved file line by line; only the count and group name are kept
+        def count_messages():
+            pattern = re.compile(r"\[([^\]]+)\]\s*([^:]+):\s*(.+)")
+            group_name = None
+            processed_messages = 0
+
+            with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    line = line.strip()
+                    match = pattern.match(line)
+                    if match:
+                        sender = match.group(2).strip()  # e.g. "~🦋"
+
+                        # If we haven't set group_name yet, use the first sender
+                        if group_name is None:
+                            group_name = sender
+
+                        processed_messages += 1
+
+            return processed_messages, group_name
+
+        processed_messages, group_name = await asyncio.to_thread(count_messages)
 
         # Future implementation: store processed messages in a database table
         # For now, we'll just return the count
@@ -741,9 +966,13 @@ async def upload_chats(
             "status": "success",
             "file_id": str(file_record.id),
             "filename": filename,
-            "processed_messages": len(processed_messages),
-            "group_name": group_name
+            "processed_messages": processed_messages,
+            "group_name": group_name,
+            "content_hash": content_hash,
+            "deduplicated": deduplicated
         }
+    except UploadTooLargeError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
@@ -801,21 +1030,23 @@ async def analyze_comparison(
     """
     Analyze a file for comparison with other files.
     """
-    # Reuse the network analysis logic but add comparison-specific functionality
-    result = await analyze_network(
-        filename, start_date, start_time, end_date, end_time, limit, limit_type,
-        min_length, max_length, keywords, min_messages, max_messages,
-        active_users, selected_users, username, anonymize, db
-    )
-
-    # Convert result to dict if it's a JSONResponse
-    if hasattr(result, 'body'):
-        content = json.loads(result.body)
-    else:
-        content = result
-
-    # Add the filename to the result
-    return JSONResponse(content={**content, "filename": filename}, status_code=200)
+    try:
+        analysis_params = analysis_parameters(
+            filename, start_date, start_time, end_date, end_time, limit, limit_type,
+            min_length, max_length, keywords, min_messages, max_messages,
+            active_users, selected_users, username, anonymize
+        )
+        network_result = await get_network_result(filename, analysis_params, db)
+
+        # Add the filename to the result
+        return GraphResponse({**network_result, "filename": filename})
+    except FileNotFoundError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=404)
+    except AnalysisTimeoutError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=504)
+    except Exception as e:
+        print("Error:", e)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
 @app.get("/analyze/compare-networks")
@@ -841,127 +1072,57 @@ async def analyze_network_comparison(
         node_filter: str = Query(""),
         highlight_common: bool = Query(False),
         metrics: str = Query(None),
+        persist: bool = Query(False),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Compare two network analysis files.
+    Both networks are built concurrently; they are stored as analyses only with persist=true.
     """
     try:
-        # Get both network analyses
-        original_result = await analyze_network(
-            original_filename, start_date, start_time, end_date, end_time,
-            limit, limit_type, min_length, max_length, keywords,
-            min_messages, max_messages, active_users, selected_users,
-            username, anonymize, db
-        )
+        analysis_params = {
+            "start_date": start_date,
+            "start_time": start_time,
+            "end_date": end_date,
+            "end_time": end_time,
+            "limit": limit,
+            "limit_type": limit_type,
+            "min_length": min_length,
+            "max_length": max_length,
+            "keywords": keywords,
+            "min_messages": min_messages,
+            "max_messages": max_messages,
+            "active_users": active_users,
+            "selected_users": selected_users,
+            "username": username,
+            "anonymize": anonymize
+        }
 
-        comparison_result = await analyze_network(
-            comparison_filename, start_date, start_time, end_date, end_time,
-            limit, limit_type, min_length, max_length, keywords,
-            min_messages, max_messages, active_users, selected_users,
-            username, anonymize, db
+        # Get both network analyses concurrently, straight from the workers or the cache
+        original_data, comparison_data = await asyncio.gather(
+            get_network_result(original_filename, {"filename": original_filename, **analysis_params}, db, persist),
+            get_network_result(comparison_filename, {"filename": comparison_filename, **analysis_params}, db, persist)
         )
 
-        # Convert responses to dicts if needed
-        if hasattr(original_result, 'body'):
-            original_data = json.loads(original_result.body)
-        else:
-            original_data = original_result
-
-        if hasattr(comparison_result, 'body'):
-            comparison_data = json.loads(comparison_result.body)
-        else:
-            comparison_data = comparison_result
-
-        # Filter networks based on parameters
-        def apply_filters(network_data, filter_text, min_weight):
-            if not network_data or "nodes" not in network_data or "links" not in network_data:
-                return network_data
-
-            # Filter nodes
-            filtered_nodes = []
-            if filter_text:
-                filtered_nodes = [
-                    node for node in network_data["nodes"]
-                    if filter_text.lower() in str(node["id"]).lower()
-                ]
-            else:
-                filtered_nodes = network_data["nodes"]
-
-            # Get filtered node IDs
-            node_ids = {node["id"] for node in filtered_nodes}
-
-            # Filter links by weight and nodes
-            filtered_links = [
-                link for link in network_data["links"]
-                if (link["weight"] >= min_weight and
-                    get_node_id(link["source"]) in node_ids and
-                    get_node_id(link["target"]) in node_ids)
-            ]
-
-            return {"nodes": filtered_nodes, "links": filtered_links}
-
-        # Helper to get node ID
-        def get_node_id(node_ref):
-            if isinstance(node_ref, dict) and "id" in node_ref:
-                return node_ref["id"]
-            return node_ref
-
-        # Apply filters
-        filtered_original = apply_filters(original_data, node_filter, min_weight)
-        filtered_comparison = apply_filters(comparison_data, node_filter, min_weight)
-
-        # Find common nodes if needed
-        if highlight_common:
-            original_ids = {node["id"] for node in filtered_original["nodes"]}
-            comparison_ids = {node["id"] for node in filtered_comparison["nodes"]}
-            common_node_ids = original_ids.intersection(comparison_ids)
-
-            # Mark common nodes
-            for node in filtered_original["nodes"]:
-                node["isCommon"] = node["id"] in common_node_ids
-
-            for node in filtered_comparison["nodes"]:
-                node["isCommon"] = node["id"] in common_node_ids
-
-        # Calculate comparison metrics if requested
-        comparison_metrics = {}
-        if metrics:
-            metrics_list = [m.strip() for m in metrics.split(",")]
-
-            # Calculate basic network statistics
-            comparison_metrics["node_count"] = {
-                "original": len(filtered_original["nodes"]),
-                "comparison": len(filtered_comparison["nodes"]),
-                "difference": len(filtered_comparison["nodes"]) - len(filtered_original["nodes"]),
-                "percent_change": (
-                        ((len(filtered_comparison["nodes"]) - len(filtered_original["nodes"])) /
-                         max(len(filtered_original["nodes"]), 1)) * 100
-                )
-            }
-
-            comparison_metrics["link_count"] = {
-                "original": len(filtered_original["links"]),
-                "comparison": len(filtered_comparison["links"]),
-                "difference": len(filtered_comparison["links"]) - len(filtered_original["links"]),
-                "percent_change": (
-                        ((len(filtered_comparison["links"]) - len(filtered_original["links"])) /
-                         max(len(filtered_original["links"]), 1)) * 100
-                )
-            }
-
-            # Add more metrics as needed
+        # Filter both networks, mark common nodes and calculate metrics on indexed arrays
+        comparison = compare_networks(
+            original_data, comparison_data,
+            node_filter=node_filter,
+            min_weight=min_weight,
+            highlight_common=highlight_common,
+            metrics=metrics
+        )
 
         # Store comparison in database
         # This would be implemented with a new model for comparisons
 
         # Return the comparison results
-        return JSONResponse(content={
-            "original": filtered_original,
-            "comparison": filtered_comparison,
-            "metrics": comparison_metrics
-        }, status_code=200)
+        return GraphResponse(comparison)
 
+    except FileNotFoundError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=404)
+    except AnalysisTimeoutError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=504)
     except Exception as e:
         print(f"Error in network comparison: {e}")
         import traceback
@@ -969,8 +1130,103 @@ async def analyze_network_comparison(
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+async def load_file_summary(filename, analysis_params):
+    """Comparison summary of an uploaded file's network, cached per content and parameters"""
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File '{filename}' not found.")
+
+    content_hash = await asyncio.to_thread(file_content_hash, file_path)
+    cache_key = make_cache_key(content_hash, analysis_params, kind="summary")
+
+    async def build_summary():
+        summary = await asyncio.to_thread(analysis_cache.get, cache_key)
+        if summary is None:
+            # Comparison needs only the graph, so centrality is never computed
+            summary = await run_in_pool(summarize_chat_file, file_path, **network_filters(analysis_params))
+            await asyncio.to_thread(analysis_cache.put, cache_key, summary)
+        return summary
+
+    return await summary_flights.run(cache_key, build_summary)
+
+
+async def load_analysis_summary(analysis_id):
+    """Comparison summary of a stored analysis, cached per analysis id"""
+    analysis_uuid = uuid.UUID(analysis_id)
+    # Stored analyses never change, so the id alone identifies the network
+    cache_key = make_cache_key(f"analysis-{analysis_uuid}", {}, kind="summary")
+    summary = await asyncio.to_thread(analysis_cache.get, cache_key)
+    if summary is None:
+        async with async_session() as db:
+            result = await db.execute(
+                select(NetworkAnalysis.nodes, NetworkAnalysis.links)
+                .where(NetworkAnalysis.id == analysis_uuid)
+            )
+            row = result.first()
+        if row is None:
+            raise LookupError(f"Analysis '{analysis_id}' not found.")
+        summary = await run_in_pool(summarize_network, {"nodes": row.nodes, "links": row.links})
+        await asyncio.to_thread(analysis_cache.put, cache_key, summary)
+    return summary
+
+
+@app.post("/analyze/compare-many")
+async def analyze_network_set(comparison_request: NetworkSetComparison):
+    """
+    Compare any number of networks at once. Each network is built (or loaded) once,
+    then node overlap (Jaccard), edge overlap (Jaccard) and edge weight correlation
+    are returned as N x N matrices, rows and columns in the order of `networks`.
+    """
+    parameters = comparison_request.dict()
+    filenames = parameters.pop("filenames")
+    analysis_ids = parameters.pop("analysis_ids")
+
+    count = len(filenames) + len(analysis_ids)
+    if count < 2:
+        return JSONResponse(content={"error": "At least two networks are required"}, status_code=400)
+    if count > MAX_COMPARED_NETWORKS:
+        return JSONResponse(
+            content={"error": f"At most {MAX_COMPARED_NETWORKS} networks can be compared at once"},
+            status_code=400
+        )
+
+    try:
+        for analysis_id in analysis_ids:
+            uuid.UUID(analysis_id)
+    except ValueError:
+        return JSONResponse(content={"error": "Invalid analysis ID format"}, status_code=400)
+
+    try:
+        summaries = await asyncio.gather(
+            *(load_file_summary(filename, {"filename": filename, **parameters}) for filename in filenames),
+            *(load_analysis_summary(analysis_id) for analysis_id in analysis_ids)
+        )
+        matrices = await run_in_pool(similarity_matrices, summaries)
+
+        labels = [{"type": "file", "label": filename} for filename in filenames] + \
+                 [{"type": "analysis", "label": analysis_id} for analysis_id in analysis_ids]
+        networks = [
+            {
+                **label,
+                "node_count": summary["node_count"],
+                "edge_count": summary["edge_count"],
+                "total_weight": summary["total_weight"]
+            }
+            for label, summary in zip(labels, summaries)
+        ]
+        return GraphResponse({"networks": networks, **matrices})
+    except (FileNotFoundError, LookupError) as e:
+        return JSONResponse(content={"error": str(e)}, status_code=404)
+    except AnalysisTimeoutError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=504)
+    except Exception as e:
+        print(f"Error in multi-network comparison: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
 @app.get("/analyze/communities/{filename}")
 async def analyze_communities(
+        request: Request,
         filename: str,
         start_date: str = Query(None),
         start_time: str = Query(None),
@@ -988,135 +1244,131 @@ async def analyze_communities(
         username: str = Query(None),
         anonymize: bool = Query(False),
         algorithm: str = Query("louvain"),
+        max_seconds: float = Query(None, gt=0),
+        over_budget: str = Query("downgrade"),
+        previous_analysis_id: str = Query(None),
+        betweenness_samples: int = Query(None, ge=1),
+        betweenness_seconds: float = Query(None, gt=0),
+        betweenness_seed: int = Query(None),
         db: AsyncSession = Depends(get_db)
 ):
     """
     Analyze communities in a network.
+    label_propagation, leiden and fast_greedy stop after max_seconds with the best
+    partition found. girvan_newman runs only if its estimated cost fits the budget;
+    otherwise it is downgraded to a faster algorithm, or refused with
+    over_budget=refuse.
+    With previous_analysis_id (an earlier analysis of the same chat with stored
+    communities), louvain and leiden re-optimize only around what changed and
+    keep that analysis' community ids.
+    With Accept: application/x-ndjson the nodes and links are streamed as NDJSON
+    records before community detection runs, followed by community records, a
+    "node_communities" record and a "meta" record (or an "error" record).
     """
     try:
         # First get the network data
-        network_result = await analyze_network(
+        analysis_params = analysis_parameters(
             filename, start_date, start_time, end_date, end_time, limit, limit_type,
             min_length, max_length, keywords, min_messages, max_messages,
-            active_users, selected_users, username, anonymize, db
+            active_users, selected_users, username, anonymize,
+            betweenness_samples, betweenness_seconds, betweenness_seed
         )
+        try:
+            network_data = await get_network_result(filename, analysis_params, db)
+        except FileNotFoundError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=400)
 
-        if hasattr(network_result, 'body'):
-            network_data = json.loads(network_result.body)
-        else:
-            network_data = network_result
-
-        if "error" in network_data:
-            return JSONResponse(content=network_data, status_code=400)
-
-        # Build a network graph
-        import networkx as nx
-        import community as community_louvain
-        import networkx.algorithms.community as nx_community
-
-        G = nx.Graph()
-
-        for node in network_data["nodes"]:
-            G.add_node(node["id"], **{k: v for k, v in node.items() if k != "id"})
-
-        for link in network_data["links"]:
-            source = link["source"]
-            target = link["target"]
-            weight = link.get("weight", 1)
-
-            if isinstance(source, dict) and "id" in source:
-                source = source["id"]
-            if isinstance(target, dict) and "id" in target:
-                target = target["id"]
-
-            G.add_edge(source, target, weight=weight)
-
-        # Detect communities based on algorithm
-        communities = {}
-        node_communities = {}
-
-        if algorithm == "louvain":
-            partition = community_louvain.best_partition(G)
-            node_communities = partition
-
-            for node, community_id in partition.items():
-                if community_id not in communities:
-                    communities[community_id] = []
-                communities[community_id].append(node)
-
-        elif algorithm == "girvan_newman":
-            communities_iter = nx_community.girvan_newman(G)
-            communities_list = list(next(communities_iter))
-
-            for i, community in enumerate(communities_list):
-                communities[i] = list(community)
-                for node in community:
-                    node_communities[node] = i
-
-        elif algorithm == "greedy_modularity":
-            communities_list = list(nx_community.greedy_modularity_communities(G))
-
-            for i, community in enumerate(communities_list):
-                communities[i] = list(community)
-                for node in community:
-                    node_communities[node] = i
-        else:
+        if algorithm not in SUPPORTED_ALGORITHMS:
             return JSONResponse(
                 content={
-                    "error": f"Unknown algorithm: {algorithm}. Supported: louvain, girvan_newman, greedy_modularity"},
+                    "error": f"Unknown algorithm: {algorithm}. Supported: {', '.join(SUPPORTED_ALGORITHMS)}"},
+                status_code=400
+            )
+        if over_budget not in OVER_BUDGET_POLICIES:
+            return JSONResponse(
+                content={"error": f"over_budget must be one of: {', '.join(OVER_BUDGET_POLICIES)}"},
                 status_code=400
             )
 
-        # Format communities for response
-        communities_list = [
-            {
-                "id": community_id,
-                "size": len(nodes),
-                "nodes": nodes,
-                "avg_betweenness": sum(network_data["nodes"][i]["betweenness"]
-                                       for i, node in enumerate(network_data["nodes"])
-                                       if node["id"] in nodes) / max(len(nodes), 1) if nodes else 0,
-                "avg_pagerank": sum(network_data["nodes"][i]["pagerank"]
-                                    for i, node in enumerate(network_data["nodes"])
-                                    if node["id"] in nodes) / max(len(nodes), 1) if nodes else 0,
+        previous = None
+        if previous_analysis_id:
+            if algorithm not in WARM_START_ALGORITHMS:
+                return JSONResponse(
+                    content={"error": f"Warm start is supported for: {', '.join(WARM_START_ALGORITHMS)}"},
+                    status_code=400
+                )
+            try:
+                previous = await load_previous_partition(previous_analysis_id)
+            except ValueError:
+                return JSONResponse(content={"error": "Invalid analysis ID format"}, status_code=400)
+            except LookupError as e:
+                return JSONResponse(content={"error": str(e)}, status_code=404)
+
+        def detect():
+            return get_community_result(
+                filename, network_data, algorithm, max_seconds, over_budget, previous, previous_analysis_id
+            )
+
+        def summary(detection):
+            return {
+                "algorithm": detection["algorithm"],
+                "requested_algorithm": detection["requested_algorithm"],
+                "budget_exhausted": detection["budget_exhausted"],
+                "estimated_seconds": detection["estimated_seconds"],
+                "warm_start": detection["warm_start"],
+                "num_communities": len(detection["communities"]),
+                "modularity": detection["modularity"],
+                "centrality": network_data["centrality"]
             }
-            for community_id, nodes in communities.items()
-        ]
 
-        # Sort communities by size
-        communities_list.sort(key=lambda x: x["size"], reverse=True)
-
-        # Add community assignments to nodes
-        for i, node in enumerate(network_data["nodes"]):
-            node_id = node["id"]
-            if node_id in node_communities:
-                network_data["nodes"][i]["community"] = node_communities[node_id]
-
-        # Store communities in database
-        # For each community, store a record
-        for community in communities_list:
-            community_record = Community(
-                analysis_id=uuid.UUID(network_data.get("analysis_id", str(uuid4()))),
-                community_index=community["id"],
-                size=community["size"],
-                nodes=community["nodes"],
-                avg_betweenness=community["avg_betweenness"],
-                avg_pagerank=community["avg_pagerank"]
-            )
-            db.add(community_record)
+        if wants_ndjson(request.headers.get("accept")):
+            async def stream():
+                for batch in record_batches("node", network_data["nodes"]):
+                    yield batch
+                for batch in record_batches("link", network_data["links"]):
+                    yield batch
+                try:
+                    detection = await detect()
+                except CommunityBudgetError as e:
+                    yield [{"type": "error", "data": {"error": str(e), "status_code": 422}}]
+                    return
+                except AnalysisTimeoutError as e:
+                    yield [{"type": "error", "data": {"error": str(e), "status_code": 504}}]
+                    return
+                except Exception as e:
+                    print(f"Error in community detection: {e}")
+                    yield [{"type": "error", "data": {"error": str(e), "status_code": 500}}]
+                    return
+                for batch in record_batches("community", detection["communities"]):
+                    yield batch
+                yield [
+                    {"type": "node_communities", "data": detection["node_communities"]},
+                    {"type": "meta", "data": summary(detection)}
+                ]
 
-        await db.commit()
+            return NDJSONResponse(stream())
 
-        return JSONResponse(content={
-            "nodes": network_data["nodes"],
+        detection = await detect()
+        node_communities = detection["node_communities"]
+
+        # Add community assignments to copies of the nodes; the originals are shared with the cache
+        nodes = [
+            {**node, "community": node_communities[node["id"]]} if node["id"] in node_communities else node
+            for node in network_data["nodes"]
+        ]
+
+        return GraphResponse({
+            "nodes": nodes,
             "links": network_data["links"],
-            "communities": communities_list,
+            "communities": detection["communities"],
             "node_communities": node_communities,
-            "algorithm": algorithm,
-            "num_communities": len(communities),
-            "modularity": community_louvain.modularity(node_communities, G) if algorithm == "louvain" else None
-        }, status_code=200)
+            **summary(detection)
+        })
 
+    except CommunityBudgetError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=422)
+    except AnalysisTimeoutError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=504)
     except Exception as e:
         print(f"Error in community detection: {e}")
         import traceback
@@ -1124,6 +1376,17 @@ async def analyze_communities(
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 
+@app.get("/analyze/coalescing-stats")
+async def get_coalescing_stats():
+    """Hit/miss counters for request coalescing of the analysis endpoints"""
+    return {
+        "network": network_flights.stats(),
+        "communities": community_flights.stats(),
+        "lod": lod_flights.stats(),
+        "summary": summary_flights.stats()
+    }
+
+
 @app.post("/fetch-wikipedia-data")
 async def fetch_wikipedia_data(
         request: fastapi.Request,
@@ -1223,6 +1486,7 @@ async def fetch_wikipedia_data(
             {"source": source, "target": target, "weight": data["weight"]}
             for source, target, data in G.edges(data=True)
         ]
+        nodes_list, _ = await compute_centrality(nodes_list, links_list)
 
         # Store in database
         file_uuid = uuid4()
@@ -1254,19 +1518,22 @@ async def fetch_wikipedia_data(
             file_id=file_uuid,
             nodes=nodes_list,
             links=links_list,
-            parameters={"url": url, "source": "wikipedia"}
+            parameters={"url": url, "source": "wikipedia"},
+            node_count=len(nodes_list),
+            edge_count=len(links_list)
         )
 
         db.add(wiki_analysis)
         await db.commit()
+        schedule_graph_insert(wiki_analysis.id, nodes_list, links_list)
 
-        return {
+        return GraphResponse({
             "nodes": nodes_list,
             "links": links_list,
             "messages": messages,
             "file_id": str(file_uuid),
             "analysis_id": str(wiki_analysis.id)
-        }
+        })
 
     except requests.RequestException as e:
         logger.error(f"Error fetching Wikipedia page: {e}")
@@ -1278,12 +1545,21 @@ async def fetch_wikipedia_data(
 
 # API endpoint to get all research projects
 @app.get("/research")
-async def get_all_research(db: AsyncSession = Depends(get_db)):
-    """Get a list of all research projects"""
+async def get_all_research(
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str = Query(None),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Get a page of research projects, newest first.
+    Pass the returned next_cursor as `cursor` to get the following page.
+    """
     try:
-        result = await db.execute(select(Research))
+        result = await db.execute(keyset_page(select(Research), Research.created_at, Research.id, cursor, limit))
         research_projects = result.scalars().all()
-        return [project.to_dict() for project in research_projects]
+        return page_response(research_projects, limit, Research.to_dict)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching research projects: {str(e)}")
 
@@ -1310,25 +1586,69 @@ async def get_research(research_id: str, db: AsyncSession = Depends(get_db)):
 
 # API endpoint to get all analyses for a research project
 @app.get("/research/{research_id}/analyses")
-async def get_research_analyses(research_id: str, db: AsyncSession = Depends(get_db)):
-    """Get all network analyses associated with a research project"""
+async def get_research_analyses(
+        research_id: str,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str = Query(None),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Get a page of summaries (ids, parameters, node and edge counts, timestamps) of
+    the network analyses of a research project, newest first. The graphs are not
+    loaded; fetch one through GET /analyses/{analysis_id}.
+    """
+    try:
+        research_uuid = uuid.UUID(research_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid research ID format")
+
     try:
+        query = (
+            select(NetworkAnalysis)
+            .options(defer(NetworkAnalysis.nodes), defer(NetworkAnalysis.links))
+            .where(NetworkAnalysis.research_id == research_uuid)
+        )
         result = await db.execute(
-            select(NetworkAnalysis).where(NetworkAnalysis.research_id == uuid.UUID(research_id))
+            keyset_page(query, NetworkAnalysis.created_at, NetworkAnalysis.id, cursor, limit)
         )
         analyses = result.scalars().all()
-        return [analysis.to_dict() for analysis in analyses]
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid research ID format")
+        return page_response(analyses, limit, NetworkAnalysis.to_summary_dict)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching analyses: {str(e)}")
 
 
 # API endpoint to get a specific analysis
 @app.get("/analyses/{analysis_id}")
-async def get_analysis(analysis_id: str, db: AsyncSession = Depends(get_db)):
-    """Get a specific network analysis by ID"""
+async def get_analysis(
+        analysis_id: str,
+        min_weight: float = Query(None),
+        node_filter: str = Query(None),
+        top_k: int = Query(None, ge=1),
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Get a specific network analysis by ID.
+    With min_weight, node_filter or top_k only the matching subgraph is returned,
+    selected in SQL from the normalized node and edge tables.
+    """
     try:
+        if min_weight is not None or node_filter or top_k is not None:
+            # Leave the JSONB graph columns unread
+            result = await db.execute(
+                select(NetworkAnalysis)
+                .options(defer(NetworkAnalysis.nodes), defer(NetworkAnalysis.links))
+                .where(NetworkAnalysis.id == uuid.UUID(analysis_id))
+            )
+            analysis = result.scalars().first()
+
+            if not analysis:
+                raise HTTPException(status_code=404, detail="Analysis not found")
+
+            subgraph = await load_subgraph(db, analysis.id, min_weight, node_filter, top_k)
+            return GraphResponse({**analysis.to_summary_dict(), **subgraph})
+
         result = await db.execute(
             select(NetworkAnalysis).where(NetworkAnalysis.id == uuid.UUID(analysis_id))
         )
@@ -1337,7 +1657,7 @@ async def get_analysis(analysis_id: str, db: AsyncSession = Depends(get_db)):
         if not analysis:
             raise HTTPException(status_code=404, detail="Analysis not found")
 
-        return analysis.to_dict()
+        return GraphResponse(analysis.to_dict())
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid analysis ID format")
     except Exception as e:
@@ -1360,6 +1680,110 @@ async def get_analysis_communities(analysis_id: str, db: AsyncSession = Depends(
         raise HTTPException(status_code=500, detail=f"Error fetching communities: {str(e)}")
 
 
+async def build_lod_hierarchy(analysis_uuid, cache_key):
+    async with async_session() as db:
+        result = await db.execute(
+            select(NetworkAnalysis.nodes, NetworkAnalysis.links)
+            .where(NetworkAnalysis.id == analysis_uuid)
+        )
+        row = result.first()
+    if row is None:
+        raise LookupError(f"Analysis '{analysis_uuid}' not found.")
+    hierarchy = await run_in_pool(coarsen_network, row.nodes or [], row.links or [], LOD_MAX_NODES)
+    await asyncio.to_thread(analysis_cache.put, cache_key, hierarchy)
+    return hierarchy
+
+
+async def load_lod_hierarchy(analysis_id):
+    """Community coarsening levels of a stored analysis, cached per analysis id"""
+    analysis_uuid = uuid.UUID(analysis_id)
+    cache_key = make_cache_key(f"analysis-{analysis_uuid}", {"max_nodes": LOD_MAX_NODES}, kind="lod")
+    hierarchy = await asyncio.to_thread(analysis_cache.get, cache_key)
+    if hierarchy is None:
+        hierarchy = await lod_flights.run(cache_key, lambda: build_lod_hierarchy(analysis_uuid, cache_key))
+    return hierarchy
+
+
+# API endpoint for a level-of-detail view of an analysis
+@app.get("/analyses/{analysis_id}/lod")
+async def get_analysis_lod(analysis_id: str, level: int = Query(None, ge=1)):
+    """
+    Coarsened view of an analysis: communities as single nodes, linked by the
+    summed weight of the links between them. Level 1 groups the original nodes,
+    higher levels group the communities below. Without a level, the most detailed
+    level of at most LOD_MAX_NODES communities is returned. Views are capped at
+    LOD_MAX_NODES nodes and LOD_MAX_LINKS links ("truncated" tells if anything was cut).
+    """
+    try:
+        hierarchy = await load_lod_hierarchy(analysis_id)
+        if level is None:
+            level = default_level(hierarchy)
+        elif level > len(hierarchy["levels"]):
+            raise HTTPException(status_code=404, detail=f"Analysis has {len(hierarchy['levels'])} levels")
+
+        return GraphResponse({
+            "analysis_id": analysis_id,
+            "level_sizes": [len(lod_level["nodes"]) for lod_level in hierarchy["levels"]],
+            **level_view(hierarchy, level)
+        })
+    except HTTPException:
+        raise
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid analysis ID format")
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error coarsening analysis: {str(e)}")
+
+
+# API endpoint to expand one community of a level-of-detail view
+@app.get("/analyses/{analysis_id}/lod/{node_id}")
+async def expand_analysis_lod(analysis_id: str, node_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Contents of one community node of a level-of-detail view. A level-1 community
+    expands to its member nodes and the links among them, read from the
+    normalized graph tables; a higher-level one to the communities it groups.
+    Capped like the view itself: the most central LOD_MAX_NODES members and the
+    heaviest LOD_MAX_LINKS links.
+    """
+    try:
+        hierarchy = await load_lod_hierarchy(analysis_id)
+        try:
+            level, index = parse_super_node_id(node_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail=f"Community node '{node_id}' not found")
+        if not 1 <= level <= len(hierarchy["levels"]) or not 0 <= index < len(hierarchy["levels"][level - 1]["nodes"]):
+            raise HTTPException(status_code=404, detail=f"Community node '{node_id}' not found")
+
+        if level > 1:
+            return GraphResponse({
+                "analysis_id": analysis_id, "node_id": node_id, **expand_super_node(hierarchy, level, index)
+            })
+
+        members = hierarchy["levels"][0]["members"][index]
+        subgraph = await load_members(db, uuid.UUID(analysis_id), members[:LOD_MAX_NODES], LOD_MAX_LINKS + 1)
+        return GraphResponse({
+            "analysis_id": analysis_id,
+            "node_id": node_id,
+            "level": 0,
+            "nodes": subgraph["nodes"],
+            "links": subgraph["links"][:LOD_MAX_LINKS],
+            "truncated": len(members) > LOD_MAX_NODES or len(subgraph["links"]) > LOD_MAX_LINKS
+        })
+    except HTTPException:
+        raise
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid analysis ID format")
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error expanding community: {str(e)}")
+
+
 # API endpoint to delete a research project
 @app.delete("/research/{research_id}")
 async def delete_research(
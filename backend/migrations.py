@@ -0,0 +1,161 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select, text, update
+
+from backend.bulk_writer import graph_rows
+from backend.database import Base, engine
+from backend.models import AnalysisEdge, AnalysisNode, Community, NetworkAnalysis, Research, UploadedFile, User
+
+# Applied migrations, kept outside Base.metadata so model create_all/drop_all leave it alone
+version_metadata = MetaData()
+schema_versions = Table(
+    "schema_versions", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+# Analyses backfilled into the normalized graph tables per statement
+BACKFILL_BATCH = 100
+
+# created_at given to rows stored without one
+UNDATED_CREATED_AT = datetime(1970, 1, 1)
+
+
+def _add_missing_columns(connection, table, names):
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column_type = table.c[name].type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+
+
+def _create_missing_indexes(connection, table, names):
+    for index in table.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def initial_schema(connection):
+    """Tables of the original schema, for databases created before migrations"""
+    Base.metadata.create_all(
+        connection,
+        tables=[model.__table__ for model in (User, Research, UploadedFile, NetworkAnalysis, Community)]
+    )
+
+
+def community_statistics_columns(connection):
+    """Columns added for the per-community statistics"""
+    _add_missing_columns(
+        connection, Community.__table__,
+        ["internal_weight", "external_weight", "conductance", "density", "top_members"]
+    )
+
+
+def normalized_graph_tables(connection):
+    """analysis_nodes and analysis_edges, backfilled from the stored JSONB graphs"""
+    Base.metadata.create_all(connection, tables=[AnalysisNode.__table__, AnalysisEdge.__table__])
+
+    stored = select(AnalysisNode.analysis_id).distinct()
+    analysis_ids = connection.execute(
+        select(NetworkAnalysis.id).where(NetworkAnalysis.id.not_in(stored))
+    ).scalars().all()
+    for start in range(0, len(analysis_ids), BACKFILL_BATCH):
+        batch = connection.execute(
+            select(NetworkAnalysis.id, NetworkAnalysis.nodes, NetworkAnalysis.links)
+            .where(NetworkAnalysis.id.in_(analysis_ids[start:start + BACKFILL_BATCH]))
+        ).all()
+        node_rows, edge_rows = [], []
+        for analysis_id, nodes, links in batch:
+            analysis_nodes, analysis_edges = graph_rows(analysis_id, nodes or [], links or [])
+            node_rows.extend(analysis_nodes)
+            edge_rows.extend(analysis_edges)
+        if node_rows:
+            connection.execute(insert(AnalysisNode.__table__), node_rows)
+        if edge_rows:
+            connection.execute(insert(AnalysisEdge.__table__), edge_rows)
+
+
+def lookup_indexes(connection):
+    """Indexes for the columns every request filters on"""
+    _create_missing_indexes(connection, UploadedFile.__table__, {"ix_uploaded_files_filename"})
+    _create_missing_indexes(connection, NetworkAnalysis.__table__, {"ix_network_analysis_research_id"})
+    _create_missing_indexes(connection, Community.__table__, {"ix_communities_analysis_id"})
+
+
+def listing_summaries(connection):
+    """
+    Node and edge counts stored with each analysis, so listings can skip the graph,
+    and the indexes behind keyset-paginated listings
+    """
+    _add_missing_columns(connection, NetworkAnalysis.__table__, ["node_count", "edge_count"])
+    _create_missing_indexes(connection, Research.__table__, {"ix_research_created_at_id"})
+    _create_missing_indexes(
+        connection, NetworkAnalysis.__table__, {"ix_network_analysis_research_created_at_id"}
+    )
+    array_length = func.jsonb_array_length if connection.dialect.name == "postgresql" else func.json_array_length
+    connection.execute(
+        update(NetworkAnalysis.__table__)
+        .where(NetworkAnalysis.node_count.is_(None))
+        .values(node_count=array_length(NetworkAnalysis.nodes), edge_count=array_length(NetworkAnalysis.links))
+    )
+
+
+def listing_timestamps_not_null(connection):
+    """
+    NOT NULL created_at on research and analyses, the keyset listing order.
+    Rows created without one sort after all others, as the oldest.
+    """
+    for table in (Research.__table__, NetworkAnalysis.__table__):
+        connection.execute(
+            update(table).where(table.c.created_at.is_(None)).values(created_at=UNDATED_CREATED_AT)
+        )
+        if connection.dialect.name == "postgresql":
+            # SQLite cannot alter a column; its tables get the constraint from create_all
+            connection.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN created_at SET NOT NULL"))
+
+
+# (version, description, upgrade); append new migrations, never edit applied ones.
+# Each upgrade checks what already exists, so it also works on databases built by create_all.
+MIGRATIONS = [
+    (1, "Initial schema", initial_schema),
+    (2, "Community statistics columns", community_statistics_columns),
+    (3, "Normalized analysis node and edge tables", normalized_graph_tables),
+    (4, "Indexes on filename, research_id and analysis_id lookups", lookup_indexes),
+    (5, "Analysis counts and listing indexes", listing_summaries),
+    (6, "NOT NULL created_at on listed tables", listing_timestamps_not_null),
+]
+
+
+async def applied_versions(target_engine=engine):
+    """Versions already recorded in schema_versions"""
+    async with target_engine.begin() as connection:
+        await connection.run_sync(version_metadata.create_all)
+        result = await connection.execute(select(schema_versions.c.version))
+        return set(result.scalars().all())
+
+
+async def migrate(target_engine=engine, target_version=None):
+    """
+    Apply pending migrations in order, each in its own transaction together with
+    its schema_versions row, up to `target_version` (default: the latest).
+    Returns the versions applied.
+    """
+    applied = await applied_versions(target_engine)
+    newly_applied = []
+    for version, description, upgrade in MIGRATIONS:
+        if version in applied or (target_version is not None and version > target_version):
+            continue
+        async with target_engine.begin() as connection:
+            await connection.run_sync(upgrade)
+            await connection.execute(
+                insert(schema_versions).values(version=version, description=description, applied_at=datetime.now())
+            )
+        print(f"Applied migration {version}: {description}")
+        newly_applied.append(version)
+    return newly_applied
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
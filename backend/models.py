@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, String, DateTime, Integer, ForeignKey, Text, Float
+from sqlalchemy import DDL, Column, String, DateTime, Integer, ForeignKey, Text, Float, Index, event
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 from backend.database import Base
@@ -35,9 +35,12 @@ class Research(Base):
     start_date = Column(String, nullable=True)  # Store as string to match original format
     end_date = Column(String, nullable=True)  # Store as string to match original format
     message_limit = Column(Integer, nullable=True)
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=True)
 
+    # Keyset pagination order for listings
+    __table_args__ = (Index("ix_research_created_at_id", "created_at", "id"),)
+
     def to_dict(self):
         return {
             "id": str(self.id),
@@ -55,7 +58,7 @@ class UploadedFile(Base):
     __tablename__ = "uploaded_files"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    filename = Column(String, nullable=False)
+    filename = Column(String, nullable=False, index=True)
     original_filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
     file_type = Column(String, nullable=False)
@@ -80,12 +83,17 @@ class NetworkAnalysis(Base):
     __tablename__ = "network_analysis"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    research_id = Column(UUID(as_uuid=True), ForeignKey("research.id"), nullable=True)
+    research_id = Column(UUID(as_uuid=True), ForeignKey("research.id"), nullable=True, index=True)
     file_id = Column(UUID(as_uuid=True), ForeignKey("uploaded_files.id"), nullable=True)
     nodes = Column(JSONB, nullable=False)  # Store nodes as JSON
     links = Column(JSONB, nullable=False)  # Store links as JSON
-    created_at = Column(DateTime, default=datetime.now)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
     parameters = Column(JSONB, nullable=True)  # Store analysis parameters as JSON
+    node_count = Column(Integer, nullable=True)
+    edge_count = Column(Integer, nullable=True)
+
+    # Keyset pagination order for a research project's analyses
+    __table_args__ = (Index("ix_network_analysis_research_created_at_id", "research_id", "created_at", "id"),)
 
     def to_dict(self):
         return {
@@ -95,7 +103,21 @@ class NetworkAnalysis(Base):
             "nodes": self.nodes,
             "links": self.links,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "parameters": self.parameters
+            "parameters": self.parameters,
+            "node_count": self.node_count,
+            "edge_count": self.edge_count
+        }
+
+    def to_summary_dict(self):
+        """to_dict without the graph, for listings; reads no deferred graph columns"""
+        return {
+            "id": str(self.id),
+            "research_id": str(self.research_id) if self.research_id else None,
+            "file_id": str(self.file_id) if self.file_id else None,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "parameters": self.parameters,
+            "node_count": self.node_count,
+            "edge_count": self.edge_count
         }
 
 
@@ -103,12 +125,17 @@ class Community(Base):
     __tablename__ = "communities"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    analysis_id = Column(UUID(as_uuid=True), ForeignKey("network_analysis.id"), nullable=False)
+    analysis_id = Column(UUID(as_uuid=True), ForeignKey("network_analysis.id"), nullable=False, index=True)
     community_index = Column(Integer, nullable=False)
     size = Column(Integer, nullable=False)
     nodes = Column(JSONB, nullable=False)  # Store node IDs as JSON array
     avg_betweenness = Column(Float, nullable=True)
     avg_pagerank = Column(Float, nullable=True)
+    internal_weight = Column(Float, nullable=True)
+    external_weight = Column(Float, nullable=True)
+    conductance = Column(Float, nullable=True)
+    density = Column(Float, nullable=True)
+    top_members = Column(JSONB, nullable=True)  # Most central node IDs, by PageRank
 
     def to_dict(self):
         return {
@@ -118,5 +145,49 @@ class Community(Base):
             "size": self.size,
             "nodes": self.nodes,
             "avg_betweenness": self.avg_betweenness,
-            "avg_pagerank": self.avg_pagerank
-        }
\ No newline at end of file
+            "avg_pagerank": self.avg_pagerank,
+            "internal_weight": self.internal_weight,
+            "external_weight": self.external_weight,
+            "conductance": self.conductance,
+            "density": self.density,
+            "top_members": self.top_members
+        }
+
+
+class AnalysisNode(Base):
+    __tablename__ = "analysis_nodes"
+
+    analysis_id = Column(UUID(as_uuid=True), ForeignKey("network_analysis.id", ondelete="CASCADE"), primary_key=True)
+    node_index = Column(Integer, primary_key=True)  # Position in NetworkAnalysis.nodes
+    node_id = Column(String, nullable=False)
+    data = Column(JSONB, nullable=False)  # The full node dict, metrics included
+
+    __table_args__ = (
+        Index("ix_analysis_nodes_analysis_node_id", "analysis_id", "node_id"),
+        # Trigram index for case-insensitive substring search on node ids
+        Index(
+            "ix_analysis_nodes_node_id_trgm", "node_id",
+            postgresql_using="gin", postgresql_ops={"node_id": "gin_trgm_ops"}
+        ),
+    )
+
+
+class AnalysisEdge(Base):
+    __tablename__ = "analysis_edges"
+
+    analysis_id = Column(UUID(as_uuid=True), ForeignKey("network_analysis.id", ondelete="CASCADE"), primary_key=True)
+    edge_index = Column(Integer, primary_key=True)  # Position in NetworkAnalysis.links
+    source_index = Column(Integer, nullable=False)
+    target_index = Column(Integer, nullable=False)
+    weight = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_analysis_edges_analysis_weight", "analysis_id", "weight"),
+    )
+
+
+# gin_trgm_ops comes from the pg_trgm extension
+event.listen(
+    AnalysisNode.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
@@ -0,0 +1,252 @@
+from datetime import datetime
+
+import numpy as np
+
+from backend.chat_index import NO_SENDER, load_chat_index, to_epoch
+from backend.network_comparison import summarize_network
+
+
+def parse_date_bounds(start_date=None, start_time=None, end_date=None, end_time=None):
+    """Turn the query's date/time strings into inclusive epoch-second bounds"""
+    start_epoch = None
+    end_epoch = None
+
+    if start_date and start_time:
+        start_epoch = to_epoch(datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M:%S"))
+    elif start_date:
+        start_epoch = to_epoch(datetime.strptime(f"{start_date} 00:00:00", "%Y-%m-%d %H:%M:%S"))
+
+    if end_date and end_time:
+        end_epoch = to_epoch(datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M:%S"))
+    elif end_date:
+        end_epoch = to_epoch(datetime.strptime(f"{end_date} 23:59:59", "%Y-%m-%d %H:%M:%S"))
+
+    return start_epoch, end_epoch
+
+
+def select_rows(index, start_epoch=None, end_epoch=None, limit=None, limit_type="first"):
+    """
+    Rows inside the date range, then trimmed to the first/last `limit` of them.
+    The range is found by binary search, so the cost follows the result size.
+    """
+    order, sorted_timestamps = index.sorted_timestamps()
+
+    low = 0
+    high = len(sorted_timestamps)
+    if start_epoch is not None:
+        low = int(np.searchsorted(sorted_timestamps, start_epoch, side="left"))
+    if end_epoch is not None:
+        high = int(np.searchsorted(sorted_timestamps, end_epoch, side="right"))
+    high = max(high, low)
+
+    if order is None:
+        # Chronological export: the range is one contiguous block, so the limit is a narrower slice
+        if limit and limit_type == "first":
+            high = min(high, low + limit)
+        elif limit and limit_type == "last":
+            low = max(low, high - limit)
+        return np.arange(low, high, dtype=np.int64)
+
+    # Out-of-order export: back to file order before applying the limit
+    rows = np.sort(order[low:high])
+    if limit and limit_type == "first":
+        rows = rows[:limit]
+    elif limit and limit_type == "last":
+        rows = rows[-limit:]
+
+    return rows
+
+
+def anonymize_name(name, anonymized_map):
+    """Map a sender to a stable User_N label (phone numbers are relabelled first)"""
+    if name.startswith("\u202a+972") or name.startswith("+972"):
+        name = f"Phone_{len(anonymized_map) + 1}"
+    if name not in anonymized_map:
+        anonymized_map[name] = f"User_{len(anonymized_map) + 1}"
+    return anonymized_map[name]
+
+
+def _first_seen_counts(ids):
+    """(unique ids, counts) ordered by first appearance in `ids`"""
+    unique_ids, first_index, counts = np.unique(ids, return_index=True, return_counts=True)
+    order = np.argsort(first_index, kind="stable")
+    return unique_ids[order], counts[order]
+
+
+def _count_transitions(label_ids, label_names):
+    """
+    Count undirected edges between consecutive, different speakers.
+    Returns [((source, target), weight)] in order of first occurrence, with each
+    pair sorted by name as the original line-by-line loop did.
+    """
+    if len(label_ids) < 2:
+        return []
+
+    previous, current = label_ids[:-1], label_ids[1:]
+    changed = previous != current
+    previous, current = previous[changed], current[changed]
+
+    name_rank = np.empty(len(label_names), dtype=np.int64)
+    name_rank[np.argsort(np.array(label_names, dtype=object), kind="stable")] = np.arange(len(label_names))
+    swap = name_rank[previous] > name_rank[current]
+    sources = np.where(swap, current, previous).astype(np.int64)
+    targets = np.where(swap, previous, current).astype(np.int64)
+
+    pair_keys = sources * len(label_names) + targets
+    unique_keys, weights = _first_seen_counts(pair_keys)
+
+    return [
+        ((label_names[key // len(label_names)], label_names[key % len(label_names)]), int(weight))
+        for key, weight in zip(unique_keys.tolist(), weights.tolist())
+    ]
+
+
+def build_network(
+        index,
+        rows,
+        min_length=None,
+        max_length=None,
+        keywords=None,
+        min_messages=None,
+        max_messages=None,
+        active_users=None,
+        selected_users=None,
+        username=None,
+        anonymize=False
+):
+    """Build the node and link lists for the selected rows of a ChatIndex"""
+    sender_ids = index.sender_ids[rows]
+
+    # Content filters run over the columns, not the raw lines
+    mask = ~index.media_omitted[rows] & (sender_ids != NO_SENDER)
+
+    lengths = index.lengths[rows]
+    if min_length:
+        mask &= lengths >= min_length
+    if max_length:
+        mask &= lengths <= max_length
+
+    if username:
+        matching_ids = [i for i, sender in enumerate(index.senders) if sender.lower() == username.lower()]
+        mask &= np.isin(sender_ids, matching_ids)
+
+    rows = rows[mask]
+
+    if keywords:
+        keyword_list = keywords.split(",")
+        rows = np.array([
+            row for row, message_content in index.message_texts(rows)
+            if any(kw in message_content.lower() for kw in keyword_list)
+        ], dtype=np.int64)
+
+    sender_ids = index.sender_ids[rows]
+
+    # Count messages per user
+    counted_ids, counts = _first_seen_counts(sender_ids)
+    user_message_count = {
+        index.senders[sender_id]: int(count)
+        for sender_id, count in zip(counted_ids.tolist(), counts.tolist())
+    }
+
+    # Senders with an empty name are counted but never become part of the conversation chain
+    empty_ids = [i for i, sender in enumerate(index.senders) if not sender]
+    speaker_ids = sender_ids[~np.isin(sender_ids, empty_ids)]
+
+    anonymized_map = {}
+    if anonymize:
+        label_names = []
+        label_lookup = {}
+        label_ids = []
+        for sender_id in speaker_ids.tolist():
+            label = anonymize_name(index.senders[sender_id], anonymized_map)
+            if label not in label_lookup:
+                label_lookup[label] = len(label_names)
+                label_names.append(label)
+            label_ids.append(label_lookup[label])
+        edges = _count_transitions(np.array(label_ids, dtype=np.int64), label_names)
+    else:
+        edges = _count_transitions(speaker_ids, index.senders)
+
+    # Apply user-based filters
+    filtered_users = {
+        user: count for user, count in user_message_count.items()
+        if (not min_messages or count >= min_messages) and
+           (not max_messages or count <= max_messages)
+    }
+
+    if active_users:
+        sorted_users = sorted(
+            filtered_users.items(),
+            key=lambda x: x[1],
+            reverse=True
+        )[:active_users]
+        filtered_users = dict(sorted_users)
+
+    if selected_users:
+        selected_list = [user.strip().lower() for user in selected_users.split(",")]
+        filtered_users = {
+            user: count for user, count in filtered_users.items()
+            if user.lower() in selected_list
+        }
+
+    # Create final node and link lists
+    filtered_nodes = list(filtered_users.keys())
+    if anonymize:
+        filtered_nodes = list(dict.fromkeys(anonymize_name(node, anonymized_map) for node in filtered_nodes))
+    filtered_node_set = set(filtered_nodes)
+
+    nodes_list = [
+        {"id": node, "messages": user_message_count.get(node, 0)}
+        for node in filtered_nodes
+    ]
+
+    links_list = [
+        {"source": source, "target": target, "weight": weight}
+        for (source, target), weight in edges
+        if source in filtered_node_set and target in filtered_node_set
+    ]
+
+    return nodes_list, links_list
+
+
+def analyze_chat_file(
+        file_path,
+        start_date=None,
+        start_time=None,
+        end_date=None,
+        end_time=None,
+        limit=None,
+        limit_type="first",
+        **filters
+):
+    """Select and build the network for an uploaded chat using its columnar index"""
+    index = load_chat_index(file_path)
+    start_epoch, end_epoch = parse_date_bounds(start_date, start_time, end_date, end_time)
+    rows = select_rows(index, start_epoch, end_epoch, limit, limit_type)
+    return build_network(index, rows, **filters)
+
+
+def summarize_chat_file(file_path, **filters):
+    """Comparison summary (see summarize_network) of a chat's network, built without metrics"""
+    nodes, links = analyze_chat_file(file_path, **filters)
+    return summarize_network({"nodes": nodes, "links": links})
+
+
+def index_chat_file(file_path):
+    """Build (or load) the columnar index for a chat and return its message count"""
+    return len(load_chat_index(file_path))
+
+
+def count_selected_messages(
+        file_path,
+        start_date=None,
+        start_time=None,
+        end_date=None,
+        end_time=None,
+        limit=None,
+        limit_type="first"
+):
+    """Number of messages the date range and limit select, without building the graph"""
+    index = load_chat_index(file_path)
+    start_epoch, end_epoch = parse_date_bounds(start_date, start_time, end_date, end_time)
+    return len(select_rows(index, start_epoch, end_epoch, limit, limit_type))
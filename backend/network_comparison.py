@@ -0,0 +1,211 @@
+import numpy as np
+
+
+def get_node_id(node_ref):
+    """Links may reference nodes by id or by the node object itself"""
+    if isinstance(node_ref, dict) and "id" in node_ref:
+        return node_ref["id"]
+    return node_ref
+
+
+class IndexedNetwork:
+    """
+    A network's nodes and links as arrays: node ids by position, and links as
+    (source position, target position, weight) columns. Filters become boolean
+    masks instead of repeated list scans and membership tests.
+    """
+
+    def __init__(self, network_data):
+        self.nodes = network_data.get("nodes", [])
+        self.links = network_data.get("links", [])
+        self.node_ids = [node["id"] for node in self.nodes]
+        self.position = {node_id: i for i, node_id in enumerate(self.node_ids)}
+
+        sources = np.full(len(self.links), -1, dtype=np.int64)
+        targets = np.full(len(self.links), -1, dtype=np.int64)
+        for i, link in enumerate(self.links):
+            sources[i] = self.position.get(get_node_id(link["source"]), -1)
+            targets[i] = self.position.get(get_node_id(link["target"]), -1)
+        self.sources = sources
+        self.targets = targets
+        self.weights = np.array([link["weight"] for link in self.links], dtype=np.float64)
+
+    def node_mask(self, filter_text):
+        """Nodes whose id contains `filter_text` (case-insensitive)"""
+        if not filter_text:
+            return np.ones(len(self.nodes), dtype=bool)
+        lowered = np.array([str(node_id).lower() for node_id in self.node_ids], dtype=str)
+        if not len(lowered):
+            return np.zeros(0, dtype=bool)
+        return np.char.find(lowered, filter_text.lower()) >= 0
+
+    def link_mask(self, node_mask, min_weight):
+        """Links at or above `min_weight` whose endpoints both survive `node_mask`"""
+        known = (self.sources >= 0) & (self.targets >= 0)
+        mask = known & (self.weights >= min_weight)
+        mask[known] &= node_mask[self.sources[known]] & node_mask[self.targets[known]]
+        return mask
+
+
+def _count_change(original, comparison):
+    return {
+        "original": original,
+        "comparison": comparison,
+        "difference": comparison - original,
+        "percent_change": ((comparison - original) / max(original, 1)) * 100
+    }
+
+
+def compare_networks(original_data, comparison_data, node_filter="", min_weight=1,
+                     highlight_common=False, metrics=None):
+    """
+    Filter two networks the same way, optionally mark the nodes they share and
+    compute comparison metrics. Input node dicts are never modified, so results
+    shared between coalesced requests stay intact.
+    """
+    indexed = [IndexedNetwork(original_data), IndexedNetwork(comparison_data)]
+
+    filtered = []
+    for network in indexed:
+        node_mask = network.node_mask(node_filter)
+        link_mask = network.link_mask(node_mask, min_weight)
+        filtered.append((network, np.flatnonzero(node_mask), np.flatnonzero(link_mask)))
+
+    common_node_ids = set()
+    if highlight_common:
+        (first, first_nodes, _), (second, second_nodes, _) = filtered
+        common_node_ids = {first.node_ids[i] for i in first_nodes} & \
+                          {second.node_ids[i] for i in second_nodes}
+
+    results = []
+    for network, node_positions, link_positions in filtered:
+        nodes = [network.nodes[i] for i in node_positions]
+        if highlight_common:
+            nodes = [{**node, "isCommon": node["id"] in common_node_ids} for node in nodes]
+        results.append({
+            "nodes": nodes,
+            "links": [network.links[i] for i in link_positions]
+        })
+    filtered_original, filtered_comparison = results
+
+    # Calculate comparison metrics if requested
+    comparison_metrics = {}
+    if metrics:
+        comparison_metrics["node_count"] = _count_change(
+            len(filtered_original["nodes"]), len(filtered_comparison["nodes"])
+        )
+        comparison_metrics["link_count"] = _count_change(
+            len(filtered_original["links"]), len(filtered_comparison["links"])
+        )
+
+    return {
+        "original": filtered_original,
+        "comparison": filtered_comparison,
+        "metrics": comparison_metrics
+    }
+
+
+def summarize_network(network_data):
+    """
+    Compact, order-independent description of a network used for N-way comparison:
+    sorted node ids and undirected edges as parallel (source, target, weight) lists.
+    """
+    node_ids = sorted({str(node["id"]) for node in network_data.get("nodes", [])})
+
+    edge_weights = {}
+    for link in network_data.get("links", []):
+        source = str(get_node_id(link["source"]))
+        target = str(get_node_id(link["target"]))
+        pair = (source, target) if source <= target else (target, source)
+        edge_weights[pair] = edge_weights.get(pair, 0) + link.get("weight", 1)
+
+    pairs = sorted(edge_weights)
+    return {
+        "nodes": node_ids,
+        "edge_sources": [source for source, _ in pairs],
+        "edge_targets": [target for _, target in pairs],
+        "edge_weights": [edge_weights[pair] for pair in pairs],
+        "node_count": len(node_ids),
+        "edge_count": len(pairs),
+        "total_weight": float(sum(edge_weights.values()))
+    }
+
+
+def _jaccard(intersections, sizes):
+    unions = sizes[:, None] + sizes[None, :] - intersections
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(unions > 0, intersections / unions, np.nan)
+
+
+def _as_json_matrix(matrix):
+    return [[None if np.isnan(value) else round(float(value), 6) for value in row] for row in matrix]
+
+
+def similarity_matrices(summaries):
+    """
+    Pairwise similarity of N network summaries in one pass.
+
+    Node and edge ids are interned across all networks into one vocabulary, so
+    every statistic is a sparse matrix product over the N x vocabulary incidence
+    matrices. Weight correlation is Pearson's r over the union of both networks'
+    edges, with missing edges counted as weight 0.
+    """
+    from scipy import sparse
+
+    count = len(summaries)
+
+    # Intern node ids across every network
+    all_nodes = np.concatenate([np.array(s["nodes"], dtype=object) for s in summaries]) \
+        if count else np.array([], dtype=object)
+    node_vocab, node_codes = np.unique(all_nodes.astype(str), return_inverse=True) \
+        if len(all_nodes) else (np.array([], dtype=str), np.array([], dtype=np.int64))
+    node_rows = np.repeat(np.arange(count), [s["node_count"] for s in summaries])
+    nodes = sparse.csr_matrix(
+        (np.ones(len(node_codes)), (node_rows, node_codes)), shape=(count, len(node_vocab))
+    )
+
+    # Intern edges as pairs of interned node ids; links to ids no network lists as a node are left out
+    lookup = {node_id: code for code, node_id in enumerate(node_vocab.tolist())}
+    edge_keys, edge_rows, weights = [], [], []
+    for row, s in enumerate(summaries):
+        for source, target, weight in zip(s["edge_sources"], s["edge_targets"], s["edge_weights"]):
+            source_code, target_code = lookup.get(source), lookup.get(target)
+            if source_code is None or target_code is None:
+                continue
+            edge_keys.append(source_code * len(node_vocab) + target_code)
+            edge_rows.append(row)
+            weights.append(weight)
+    edge_vocab, edge_codes = np.unique(np.array(edge_keys, dtype=np.int64), return_inverse=True)
+    edge_rows = np.array(edge_rows, dtype=np.int64)
+    weights = np.array(weights, dtype=np.float64)
+    edge_presence = sparse.csr_matrix(
+        (np.ones(len(edge_codes)), (edge_rows, edge_codes)), shape=(count, len(edge_vocab))
+    )
+    edge_weights = sparse.csr_matrix((weights, (edge_rows, edge_codes)), shape=(count, len(edge_vocab)))
+
+    node_sizes = np.asarray(nodes.sum(axis=1)).ravel()
+    edge_sizes = np.asarray(edge_presence.sum(axis=1)).ravel()
+    node_intersections = (nodes @ nodes.T).toarray()
+    edge_intersections = (edge_presence @ edge_presence.T).toarray()
+
+    # Pearson's r over each pair's edge union, from per-network sums and the cross product
+    union_sizes = edge_sizes[:, None] + edge_sizes[None, :] - edge_intersections
+    weight_sums = np.asarray(edge_weights.sum(axis=1)).ravel()
+    square_sums = np.asarray(edge_weights.multiply(edge_weights).sum(axis=1)).ravel()
+    cross_sums = (edge_weights @ edge_weights.T).toarray()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means_i = weight_sums[:, None] / union_sizes
+        means_j = weight_sums[None, :] / union_sizes
+        covariance = cross_sums / union_sizes - means_i * means_j
+        variance_i = square_sums[:, None] / union_sizes - means_i ** 2
+        variance_j = square_sums[None, :] / union_sizes - means_j ** 2
+        denominator = np.sqrt(variance_i * variance_j)
+        correlation = np.where(denominator > 1e-12, covariance / denominator, np.nan)
+
+    return {
+        "node_jaccard": _as_json_matrix(_jaccard(node_intersections, node_sizes)),
+        "edge_jaccard": _as_json_matrix(_jaccard(edge_intersections, edge_sizes)),
+        "weight_correlation": _as_json_matrix(np.clip(correlation, -1, 1)),
+        "common_nodes": node_intersections.astype(int).tolist(),
+        "common_edges": edge_intersections.astype(int).tolist()
+    }
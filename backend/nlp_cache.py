@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Per-message NLP results, shared by every process on the machine. An empty path disables the cache.
+NLP_CACHE_PATH = os.getenv("NLP_CACHE_PATH", os.path.join("./uploads/", ".nlp_cache", "enrichment.sqlite3"))
+NLP_CACHE_MAX_BYTES = int(os.getenv("NLP_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Eviction trims the cache to this fraction of its budget, so it does not run on every write
+EVICTION_TARGET = 0.9
+# Keys per SQL statement, below SQLite's host parameter limit
+SQL_BATCH = 500
+
+
+def enrichment_key(text, language, model):
+    """Cache key of a message's enrichment: its text, its language and the model name and version"""
+    canonical = json.dumps([text, language, model], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).digest()
+
+
+class EnrichmentCache:
+    """
+    SQLite store of per-message entities and topics, bounded to `max_bytes` of
+    stored results. Entries are evicted least recently used first. Several
+    processes can use the same file (write-ahead logging, busy timeout).
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS enrichments (
+                    key BLOB PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, used_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_enrichments_used_at ON enrichments (used_at);
+                CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);
+                INSERT OR IGNORE INTO cache_size VALUES (0, 0);
+            """)
+            self._connection = connection
+        return self._connection
+
+    def get_many(self, keys):
+        """{key: value} for the keys that are cached; marks them as recently used"""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            for start in range(0, len(keys), SQL_BATCH):
+                batch = keys[start:start + SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = connection.execute(
+                    f"SELECT key, value FROM enrichments WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+                if rows:
+                    connection.execute(
+                        f"UPDATE enrichments SET used_at = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now, *(key for key, _ in rows)]
+                    )
+        return found
+
+    def put_many(self, items):
+        """Store {key: value} entries, then evict the oldest ones if over budget"""
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            added = 0
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for key, value in items.items():
+                    data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+                    size = len(key) + len(data.encode("utf-8"))
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO enrichments VALUES (?, ?, ?, ?)", (key, data, size, now)
+                    )
+                    added += size if cursor.rowcount == 1 else 0
+                connection.execute("UPDATE cache_size SET bytes = bytes + ?", (added,))
+                self._evict(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT bytes FROM cache_size").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - self.max_bytes * EVICTION_TARGET
+        freed, evicted = 0, []
+        oldest = connection.execute("SELECT key, size FROM enrichments ORDER BY used_at")
+        for key, size in oldest:
+            evicted.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        oldest.close()
+        connection.executemany("DELETE FROM enrichments WHERE key = ?", evicted)
+        connection.execute("UPDATE cache_size SET bytes = bytes - ?", (freed,))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+enrichment_cache = EnrichmentCache(NLP_CACHE_PATH, NLP_CACHE_MAX_BYTES) if NLP_CACHE_PATH else None
@@ -0,0 +1,77 @@
+import importlib.metadata
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# spaCy model per detected language
+MODEL_NAMES = {
+    "en": os.getenv("NLP_MODEL_EN", "en_core_web_sm"),
+    "he": os.getenv("NLP_MODEL_HE", "he_core_news_sm")
+}
+
+
+class ModelUnavailableError(LookupError):
+    """A spaCy model is not installed (or failed to load)"""
+
+
+class ModelRegistry:
+    """
+    spaCy pipelines loaded on first use, once per process, whichever thread asks
+    first. Models are never downloaded here: install them ahead of time with
+    `python -m backend.initialize` or `python -m spacy download <model>`.
+    """
+
+    def __init__(self, model_names):
+        self.model_names = dict(model_names)
+        self._models = {}
+        self._versions = {}
+        self._locks = {language: threading.Lock() for language in self.model_names}
+
+    def get(self, language):
+        """Pipeline for a language, loading it if needed; raises ModelUnavailableError"""
+        model = self._models.get(language)
+        if model is not None:
+            return model
+        if language not in self.model_names:
+            raise ModelUnavailableError(f"No spaCy model configured for language '{language}'")
+
+        with self._locks[language]:
+            model = self._models.get(language)
+            if model is None:
+                model = self._load(language)
+        return model
+
+    def _load(self, language):
+        name = self.model_names[language]
+        started = time.perf_counter()
+        try:
+            import spacy  # Imported on first load; it is slow to import and most workers never need it
+            model = spacy.load(name)
+        except OSError as e:
+            raise ModelUnavailableError(
+                f"spaCy model '{name}' is not installed; run `python -m spacy download {name}`"
+            ) from e
+
+        self._models[language] = model
+        logger.info(f"Loaded spaCy model {name} in {time.perf_counter() - started:.2f}s")
+        return model
+
+    def model_tag(self, language):
+        """
+        "name-version" of a language's model. Read from the installed package when
+        possible, so the model does not have to be loaded just to name it.
+        """
+        if language not in self._versions:
+            name = self.model_names[language]
+            try:
+                version = importlib.metadata.version(name)
+            except importlib.metadata.PackageNotFoundError:
+                version = self.get(language).meta.get("version")
+            self._versions[language] = f"{name}-{version}"
+        return self._versions[language]
+
+
+models = ModelRegistry(MODEL_NAMES)
@@ -1,29 +1,23 @@
 import re
 import os
-import spacy
 from collections import defaultdict
+from itertools import chain, islice
 import logging
 
+from backend.nlp_cache import enrichment_cache, enrichment_key
+from backend.nlp_models import ModelUnavailableError, models
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load spaCy models
-try:
-    nlp_en = spacy.load("en_core_web_sm")
-    logger.info("Loaded English spaCy model")
-except:
-    logger.warning("English model not found, will try to download...")
-    os.system("python -m spacy download en_core_web_sm")
-    nlp_en = spacy.load("en_core_web_sm")
-
-try:
-    nlp_he = spacy.load("he_core_news_sm")
-    logger.info("Loaded Hebrew spaCy model")
-except:
-    logger.warning("Hebrew model not found, will try to download...")
-    os.system("python -m spacy download he_core_news_sm")
-    nlp_he = spacy.load("he_core_news_sm")
+# Batched NLP enrichment: messages are buffered up to NLP_BUFFER_MESSAGES, grouped by
+# language and run through nlp.pipe in batches of NLP_BATCH_SIZE on NLP_N_PROCESS processes
+NLP_BATCH_SIZE = int(os.getenv("NLP_BATCH_SIZE", 256))
+NLP_N_PROCESS = int(os.getenv("NLP_N_PROCESS", 1))
+NLP_BUFFER_MESSAGES = int(os.getenv("NLP_BUFFER_MESSAGES", 5000))
+# Components whose output is not used; entities need "ner", topics need "parser" and the tags
+NLP_DISABLED_COMPONENTS = ["lemmatizer"]
 
 
 def detect_language(text):
@@ -35,6 +29,41 @@ def detect_language(text):
         return "en"
 
 
+class LanguageTally:
+    """Running version of detect_language for text that is streamed line by line"""
+
+    def __init__(self):
+        self.hebrew_chars = 0
+        self.total_chars = 0
+
+    def track(self, lines):
+        """Pass lines through unchanged while counting their characters"""
+        for line in lines:
+            self.hebrew_chars += len(re.findall(r'[\u0590-\u05FF]', line))
+            self.total_chars += len(line) + 1  # Count the newline like the joined content did
+            yield line
+
+    def language(self):
+        if self.hebrew_chars > self.total_chars * 0.15:  # If more than 15% is Hebrew
+            return "he"
+        else:
+            return "en"
+
+
+def iter_file_lines(file_path):
+    """
+    Stream decoded lines from a file without reading it whole.
+    Lines that are not valid UTF-8 fall back to iso-8859-1.
+    """
+    with open(file_path, "rb") as f:
+        for raw_line in f:
+            try:
+                line = raw_line.decode("utf-8")
+            except UnicodeDecodeError:
+                line = raw_line.decode("iso-8859-1")
+            yield line.rstrip("\r\n")
+
+
 def detect_file_type(content):
     """Detect if file is a WhatsApp chat or Wikipedia talk page"""
     whatsapp_pattern = r'^\[\d{1,2}[\.\/]\d{1,2}[\.\/]\d{2,4},?\s\d{1,2}:\d{2}(:\d{2})?\]'
@@ -53,13 +82,18 @@ def detect_file_type(content):
     return "whatsapp"
 
 
-def extract_entities(text, language):
-    """Extract named entities from text"""
-    if language == "he":
-        doc = nlp_he(text)
-    else:
-        doc = nlp_en(text)
+def model_language(language):
+    """Language whose model processes text detected as `language`"""
+    return "he" if language == "he" else "en"
 
+
+def get_model(language):
+    """spaCy pipeline for a detected language, loaded on first use"""
+    return models.get(model_language(language))
+
+
+def doc_entities(doc):
+    """Named entities of a processed Doc, as {text: label}"""
     entities = {}
     for ent in doc.ents:
         entities[ent.text] = ent.label_
@@ -67,13 +101,8 @@ def extract_entities(text, language):
     return entities
 
 
-def extract_topics(text, language):
-    """Extract main topics from text using NLP"""
-    if language == "he":
-        doc = nlp_he(text)
-    else:
-        doc = nlp_en(text)
-
+def doc_topics(doc):
+    """Five most frequent noun chunks of a processed Doc, as (topic, count) pairs"""
     # Simple implementation - extract noun chunks
     topics = [chunk.text.lower() for chunk in doc.noun_chunks
               if len(chunk.text) > 3 and not chunk.text.isdigit()]
@@ -87,6 +116,72 @@ def extract_topics(text, language):
     return sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)[:5]
 
 
+def extract_entities(text, language):
+    """Extract named entities from text"""
+    return doc_entities(get_model(language)(text))
+
+
+def extract_topics(text, language):
+    """Extract main topics from text using NLP"""
+    return doc_topics(get_model(language)(text))
+
+
+def enrich_batch(messages):
+    """
+    Add entities and topics to messages that already have a language. Results
+    cached for the same text, language and model version are reused; the rest
+    of each language's messages go through its pipeline once, with nlp.pipe.
+    Entities and topics come from the same Doc.
+    """
+    by_language = defaultdict(list)
+    for message in messages:
+        by_language[model_language(message["language"])].append(message)
+
+    for language, language_messages in by_language.items():
+        pending, pending_keys = language_messages, []
+        if enrichment_cache is not None:
+            model = models.model_tag(language)
+            keys = [enrichment_key(message["message"], language, model) for message in language_messages]
+            cached = enrichment_cache.get_many(keys)
+            pending = []
+            for key, message in zip(keys, language_messages):
+                if key in cached:
+                    message["entities"] = cached[key]["entities"]
+                    message["topics"] = [tuple(topic) for topic in cached[key]["topics"]]
+                else:
+                    pending.append(message)
+                    pending_keys.append(key)
+        if not pending:
+            continue
+
+        docs = get_model(language).pipe(
+            (message["message"] for message in pending),
+            batch_size=NLP_BATCH_SIZE,
+            n_process=NLP_N_PROCESS,
+            disable=NLP_DISABLED_COMPONENTS
+        )
+        for message, doc in zip(pending, docs):
+            message["entities"] = doc_entities(doc)
+            message["topics"] = doc_topics(doc)
+
+        if enrichment_cache is not None:
+            enrichment_cache.put_many({
+                key: {"entities": message["entities"], "topics": message["topics"]}
+                for key, message in zip(pending_keys, pending)
+            })
+
+
+def enrich_messages(messages):
+    """Enrich a stream of messages NLP_BUFFER_MESSAGES at a time, keeping their order"""
+    messages = iter(messages)
+    while True:
+        buffer = list(islice(messages, NLP_BUFFER_MESSAGES))
+        if not buffer:
+            return
+        enrich_batch(buffer)
+        yield from buffer
+
+
 def parse_whatsapp_message(line):
     """Enhanced WhatsApp message parsing with better pattern matching"""
     # Format: [date, time] Sender: Message
@@ -113,26 +208,25 @@ def parse_whatsapp_message(line):
     return None
 
 
-def parse_whatsapp_file(content):
-    """Parse entire WhatsApp chat file"""
-    messages = []
-    language = detect_language(content)
-
-    for line in content.split('\n'):
-        parsed = parse_whatsapp_message(line)
-        if parsed:
-            # Add language detection for each message
-            parsed["language"] = detect_language(parsed["message"])
-
-            # Add entity extraction
-            parsed["entities"] = extract_entities(parsed["message"], parsed["language"])
+def iter_whatsapp_messages(lines):
+    """Yield enriched messages from WhatsApp chat lines, enriched in batches"""
+    def parsed_messages():
+        for line in lines:
+            parsed = parse_whatsapp_message(line)
+            if parsed:
+                # Add language detection for each message
+                parsed["language"] = detect_language(parsed["message"])
+                yield parsed
 
-            # Add topic extraction
-            parsed["topics"] = extract_topics(parsed["message"], parsed["language"])
+    return enrich_messages(parsed_messages())
 
-            messages.append(parsed)
 
-    return messages, language
+def parse_whatsapp_file(content):
+    """Parse entire WhatsApp chat file (its content, or an iterable of its lines)"""
+    lines = content.split('\n') if isinstance(content, str) else content
+    tally = LanguageTally()
+    messages = list(iter_whatsapp_messages(tally.track(lines)))
+    return messages, tally.language()
 
 
 def parse_wikipedia_message(line):
@@ -156,95 +250,79 @@ def parse_wikipedia_message(line):
     return None
 
 
-def parse_wikipedia_file(content):
-    """Parse entire Wikipedia talk page file"""
-    messages = []
-    language = detect_language(content)
+def iter_wikipedia_messages(lines):
+    """Yield enriched messages from Wikipedia talk page lines, enriched in batches"""
+    return enrich_messages(_iter_wikipedia_records(lines))
+
 
-    lines = content.split('\n')
+def _iter_wikipedia_records(lines):
+    """Messages of Wikipedia talk page lines, with sender and language but no NLP fields"""
     current_sender = None
     previous_indentation = 0
+    # Most recent sender seen at each indentation level, used to attribute replies
+    last_sender_by_indentation = {}
 
-    for i, line in enumerate(lines):
+    for line in lines:
         line = line.strip()
         if not line:
             continue
 
         parsed = parse_wikipedia_message(line)
+        if not parsed:
+            continue
 
-        if parsed and "sender" in parsed:
+        if "sender" in parsed:
             current_sender = parsed["sender"]
             previous_indentation = parsed["indentation"]
-            messages.append({
-                "sender": current_sender,
-                "message": parsed["message"],
-                "indentation": parsed["indentation"],
-                "language": detect_language(parsed["message"])
-            })
-        elif parsed and current_sender and parsed["indentation"] >= previous_indentation:
+            sender = current_sender
+        elif current_sender and parsed["indentation"] >= previous_indentation:
             # Same or deeper indentation, assume same sender
-            messages.append({
-                "sender": current_sender,
-                "message": parsed["message"],
-                "indentation": parsed["indentation"],
-                "language": detect_language(parsed["message"])
-            })
-        elif parsed and current_sender and parsed["indentation"] < previous_indentation:
+            sender = current_sender
+        elif current_sender and parsed["indentation"] < previous_indentation:
             # Less indentation, this could be a reply to a different user
             # We'll use indentation to build a conversation tree and assign likely respondents
-            # For simplicity, we'll just find the last message with this indentation level
-            potential_sender = current_sender
-            for j in range(len(messages) - 1, -1, -1):
-                if messages[j]["indentation"] == parsed["indentation"]:
-                    potential_sender = messages[j]["sender"]
-                    break
-
-            messages.append({
-                "sender": potential_sender,
-                "message": parsed["message"],
-                "indentation": parsed["indentation"],
-                "language": detect_language(parsed["message"])
-            })
-
+            # For simplicity, we'll just take the last message with this indentation level
+            sender = last_sender_by_indentation.get(parsed["indentation"], current_sender)
             previous_indentation = parsed["indentation"]
+        else:
+            continue
 
-    # Add entity and topic extraction to messages
-    for msg in messages:
-        if "message" in msg:
-            msg["entities"] = extract_entities(msg["message"], msg["language"])
-            msg["topics"] = extract_topics(msg["message"], msg["language"])
+        last_sender_by_indentation[parsed["indentation"]] = sender
+        message = {
+            "sender": sender,
+            "message": parsed["message"],
+            "indentation": parsed["indentation"],
+            "language": detect_language(parsed["message"])
+        }
+
+        yield message
 
-    return messages, language
+
+def parse_wikipedia_file(content):
+    """Parse entire Wikipedia talk page file (its content, or an iterable of its lines)"""
+    lines = content.split('\n') if isinstance(content, str) else content
+    tally = LanguageTally()
+    messages = list(iter_wikipedia_messages(tally.track(lines)))
+    return messages, tally.language()
 
 
 def parse_file(file_path):
     """Parse file and detect type, language, and extract messages"""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
+        lines = iter_file_lines(file_path)
 
-        file_type = detect_file_type(content)
+        # Only the first lines are needed to tell the formats apart
+        first_lines = list(islice(lines, 10))
+        file_type = detect_file_type('\n'.join(first_lines))
+        lines = chain(first_lines, lines)
 
         if file_type == "whatsapp":
-            return parse_whatsapp_file(content)
+            return parse_whatsapp_file(lines)
         else:
-            return parse_wikipedia_file(content)
-
-    except UnicodeDecodeError:
-        # Try with different encoding if utf-8 fails
-        try:
-            with open(file_path, "r", encoding="iso-8859-1") as f:
-                content = f.read()
-
-            file_type = detect_file_type(content)
-
-            if file_type == "whatsapp":
-                return parse_whatsapp_file(content)
-            else:
-                return parse_wikipedia_file(content)
-        except Exception as e:
-            logger.error(f"Error parsing file with iso-8859-1 encoding: {e}")
-            return [], "unknown"
+            return parse_wikipedia_file(lines)
+
+    except ModelUnavailableError:
+        raise  # A deployment problem, not an unparseable file
     except Exception as e:
         logger.error(f"Error parsing file: {e}")
-        return [], "unknown"
\ No newline at end of file
+        return [], "unknown"
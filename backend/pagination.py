@@ -0,0 +1,46 @@
+import base64
+import json
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 500))
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor for the position just after a row"""
+    position = json.dumps([created_at.isoformat(), str(row_id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) of a cursor; raises ValueError for a malformed one"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(query, created_column, id_column, cursor, limit):
+    """
+    Newest-first page of `query` that starts after `cursor`. The position is
+    compared on (created_at, id), so each page is an index range scan, however
+    deep it is. Fetches one row past `limit` to tell whether another page follows.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(created_column, id_column) < (created_at, row_id))
+    return query.order_by(created_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def page_response(rows, limit, to_dict):
+    """{"items", "next_cursor"} for rows fetched by keyset_page"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return {"items": [to_dict(row) for row in rows], "next_cursor": next_cursor}
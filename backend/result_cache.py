@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+# Bump when the shape of cached results changes so old entries are ignored
+CACHE_VERSION = 6
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def file_content_hash(file_path):
+    """
+    SHA-256 of a file's content, memoized per inode on its size and modification
+    time, so hard-linked (deduplicated) uploads are hashed once.
+    """
+    stat = os.stat(file_path)
+    identity = (stat.st_dev, stat.st_ino)
+    signature = (stat.st_size, stat.st_mtime_ns)
+
+    with _hash_lock:
+        memo = _hash_memo.get(identity)
+        if memo and memo[0] == signature:
+            return memo[1]
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    remember_file_hash(file_path, content_hash)
+    return content_hash
+
+
+def remember_file_hash(file_path, content_hash):
+    """Record a hash computed elsewhere (e.g. while the upload was streamed in)"""
+    stat = os.stat(file_path)
+    with _hash_lock:
+        _hash_memo[(stat.st_dev, stat.st_ino)] = ((stat.st_size, stat.st_mtime_ns), content_hash)
+
+
+def forget_file_hash(file_path):
+    """Drop the memoized hash for a file (call before deleting the file)"""
+    stat = os.stat(file_path)
+    with _hash_lock:
+        _hash_memo.pop((stat.st_dev, stat.st_ino), None)
+
+
+def canonicalize_params(params):
+    """
+    Normalize analysis parameters so equivalent requests share a cache key.
+    Unset values and the filename (replaced by the content hash) are dropped.
+    """
+    canonical = {}
+    for key, value in params.items():
+        if key == "filename" or value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        canonical[key] = value
+
+    if not canonical.get("limit"):
+        canonical.pop("limit", None)
+        canonical.pop("limit_type", None)
+    if not canonical.get("anonymize"):
+        canonical.pop("anonymize", None)
+    if "selected_users" in canonical:
+        # Matching is case-insensitive and order-independent
+        users = {user.strip().lower() for user in canonical["selected_users"].split(",")}
+        canonical["selected_users"] = ",".join(sorted(users))
+
+    return canonical
+
+
+def make_cache_key(content_hash, params, kind="network"):
+    """Cache key for an analysis of a given file content with given parameters"""
+    canonical = json.dumps(
+        {"version": CACHE_VERSION, "kind": kind, "params": canonicalize_params(params)},
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return f"{content_hash}/{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+class ResultCache:
+    """
+    Two-tier cache of JSON-serializable analysis results.
+
+    The memory tier is an LRU bounded by the size of the encoded entries; the
+    disk tier stores one file per entry, grouped by content hash so all results
+    for a file can be dropped together, and is trimmed oldest-first to its budget.
+    The disk tier's size is kept as a running total; the folder is only walked on
+    first use and when the total goes over budget.
+    Entries are kept encoded, so callers always get their own copy.
+    """
+
+    def __init__(self, folder, memory_budget, disk_budget):
+        self.folder = folder
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None  # Measured on first write
+        self._lock = threading.Lock()
+
+    def _disk_path(self, key):
+        content_hash, params_hash = key.split("/", 1)
+        return os.path.join(self.folder, content_hash, f"{params_hash}.json")
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= len(self._memory.pop(key))
+            if len(data) > self.memory_budget:
+                return
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_budget:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def get(self, key):
+        """Return the cached value for `key`, or None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+
+        if data is None:
+            path = self._disk_path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)  # Mark as recently used for disk eviction
+            except FileNotFoundError:
+                return None
+            self._remember(key, data)
+
+        return json.loads(data)
+
+    def put(self, key, value):
+        """Store a JSON-serializable value in both tiers"""
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._remember(key, data)
+
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += len(data) - replaced
+            over_budget = self._disk_size is None or self._disk_size > self.disk_budget
+        if over_budget:
+            self._trim_disk()
+
+    def invalidate(self, content_hash):
+        """Drop every cached result computed from the given file content"""
+        prefix = f"{content_hash}/"
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(prefix)]:
+                self._memory_size -= len(self._memory.pop(key))
+
+        folder = os.path.join(self.folder, content_hash)
+        removed = sum(size for _, size, _ in self._disk_entries(folder))
+        shutil.rmtree(folder, ignore_errors=True)
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size = max(self._disk_size - removed, 0)
+
+    @staticmethod
+    def _disk_entries(folder):
+        """(mtime, size, path) of every file under `folder`"""
+        entries = []
+        for root, _, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _trim_disk(self):
+        # Re-measure the folder, which also corrects for other processes sharing it
+        entries = self._disk_entries(self.folder)
+        total = sum(size for _, size, _ in entries)
+
+        if total > self.disk_budget:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.disk_budget:
+                    break
+
+        with self._lock:
+            self._disk_size = total
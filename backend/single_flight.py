@@ -0,0 +1,44 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: the first caller for a key starts the
+    computation, later callers with the same key await the same result.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._inflight = {}
+
+    async def run(self, key, coroutine_factory):
+        """Await the in-flight call for `key`, or start `coroutine_factory()` as one"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            future = asyncio.ensure_future(coroutine_factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+
+        # A caller that disconnects must not cancel the work the others are waiting on
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            future.exception()  # Mark as retrieved so abandoned failures are not logged as unhandled
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "in_flight": len(self._inflight),
+            "hit_rate": self.hits / total if total else 0.0
+        }
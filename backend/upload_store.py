@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import os
+import shutil
+from uuid import uuid4
+
+from backend.chat_index import invalidate_chat_index
+from backend.result_cache import forget_file_hash, remember_file_hash
+
+BLOB_FOLDER_NAME = ".blobs"
+ATTACH_ATTEMPTS = 5
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size cap"""
+
+
+def get_blob_path(upload_folder, content_hash):
+    """Location of the single stored copy of some content"""
+    return os.path.join(upload_folder, BLOB_FOLDER_NAME, content_hash)
+
+
+def get_refs_folder(upload_folder, content_hash):
+    """Folder holding one empty marker file per upload name that uses some content"""
+    return os.path.join(upload_folder, BLOB_FOLDER_NAME, f"{content_hash}.refs")
+
+
+def _write_chunk(f, digest, chunk):
+    f.write(chunk)
+    digest.update(chunk)
+
+
+def _publish_blob(tmp_path, blob_path):
+    """Store `tmp_path` as the blob unless it already exists; returns whether it was new"""
+    try:
+        # Linking never replaces an existing file, so concurrent identical uploads agree
+        os.link(tmp_path, blob_path)
+        return True
+    except FileExistsError:
+        return False
+    except OSError:
+        # No hard links: replacing a blob with identical bytes is harmless here,
+        # since every upload name is then a private copy
+        if os.path.exists(blob_path):
+            return False
+        copy_path = f"{tmp_path}.copy"
+        shutil.copyfile(tmp_path, copy_path)
+        os.replace(copy_path, blob_path)
+        return True
+
+
+def _link_upload(blob_path, file_path):
+    try:
+        os.link(blob_path, file_path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # Filesystems without hard links get a private copy instead
+        shutil.copyfile(blob_path, file_path)
+
+
+def _attach_upload(upload_folder, content_hash, tmp_path, file_path):
+    """
+    Reference the content under the upload's name, storing it first if needed.
+    Returns whether the content was already stored.
+    """
+    blob_path = get_blob_path(upload_folder, content_hash)
+    refs_folder = get_refs_folder(upload_folder, content_hash)
+    for _ in range(ATTACH_ATTEMPTS):
+        try:
+            # The reference comes first, so a concurrent release keeps the blob
+            os.makedirs(refs_folder, exist_ok=True)
+            open(os.path.join(refs_folder, os.path.basename(file_path)), "ab").close()
+            deduplicated = not _publish_blob(tmp_path, blob_path)
+            _link_upload(blob_path, file_path)
+            return deduplicated
+        except FileNotFoundError:
+            # A release of the last other reference removed the blob meanwhile
+            continue
+    raise RuntimeError(f"Could not store content {content_hash}")
+
+
+async def store_upload(file, upload_folder, filename, max_bytes, chunk_size):
+    """
+    Stream an upload to disk, hashing it on the way, and expose it as `filename`.
+
+    The content is kept once under .blobs/<sha256>; every upload of the same
+    bytes is a hard link to it, so it also shares the parsed index and cached
+    results. Each name is recorded under .blobs/<sha256>.refs, which is what
+    keeps the content alive. Returns (file_path, content_hash, size, deduplicated).
+    """
+    blob_folder = os.path.join(upload_folder, BLOB_FOLDER_NAME)
+    os.makedirs(blob_folder, exist_ok=True)
+    tmp_path = os.path.join(blob_folder, f"{uuid4()}.part")
+    file_path = os.path.join(upload_folder, filename)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+                # Disk writes and hashing happen off the event loop
+                await asyncio.to_thread(_write_chunk, f, digest, chunk)
+
+        content_hash = digest.hexdigest()
+        deduplicated = await asyncio.to_thread(_attach_upload, upload_folder, content_hash, tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    remember_file_hash(file_path, content_hash)
+    return file_path, content_hash, size, deduplicated
+
+
+def release_upload(upload_folder, file_path, content_hash):
+    """
+    Delete an upload's name. The stored content is removed too once no other
+    upload refers to it. Returns True in that case, meaning results cached for
+    this content can be dropped.
+    """
+    blob_path = get_blob_path(upload_folder, content_hash)
+    refs_folder = get_refs_folder(upload_folder, content_hash)
+    shares_blob = os.path.exists(blob_path) and os.path.samefile(blob_path, file_path)
+
+    try:
+        os.remove(os.path.join(refs_folder, os.path.basename(file_path)))
+    except FileNotFoundError:
+        pass
+    try:
+        last_reference = not os.listdir(refs_folder)
+    except FileNotFoundError:
+        last_reference = True
+
+    # The parsed index and hash memo belong to the file itself: a private copy
+    # has its own, a hard link shares the blob's
+    if last_reference or not shares_blob:
+        invalidate_chat_index(file_path)
+        forget_file_hash(file_path)
+    os.remove(file_path)
+
+    if last_reference:
+        try:
+            os.remove(blob_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rmdir(refs_folder)
+        except OSError:
+            # Already gone, or a new upload of the same content has just referenced it
+            pass
+
+    return last_reference
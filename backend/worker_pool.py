@@ -0,0 +1,219 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Worker pool configuration
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", max((os.cpu_count() or 2) - 1, 1)))
+ANALYSIS_MAX_TASKS_PER_CHILD = int(os.getenv("ANALYSIS_MAX_TASKS_PER_CHILD", 50))
+ANALYSIS_TASK_TIMEOUT = float(os.getenv("ANALYSIS_TASK_TIMEOUT", 300))
+WORKER_STOP_GRACE = 1.0
+
+
+class AnalysisTimeoutError(Exception):
+    """Raised when a pooled analysis task runs past its time budget"""
+
+
+def _worker_main(conn):
+    """Run tasks sent over `conn` one at a time until told to stop"""
+    conn.send(None)  # Ready: imports are done, so task timers exclude start-up
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        func, args, kwargs = task
+        try:
+            outcome = (True, func(*args, **kwargs))
+        except BaseException as e:
+            outcome = (False, e)
+        try:
+            conn.send(outcome)
+        except Exception as e:
+            # The result or exception could not be pickled
+            conn.send((False, RuntimeError(f"Analysis result could not be returned: {e!r}")))
+
+
+class _Worker:
+    """One worker process and the parent's end of its pipe"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def stop(self):
+        """Ask an idle worker to exit"""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(WORKER_STOP_GRACE)
+        self.kill()
+
+    def kill(self):
+        """Terminate the worker, whatever it is doing"""
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(WORKER_STOP_GRACE)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class AnalysisPool:
+    """
+    A pool of worker processes that run one task at a time each.
+
+    Unlike a ProcessPoolExecutor, a task that runs past its timeout has its worker
+    terminated and replaced, so runaway analyses cannot hold pool slots. The timeout
+    covers running only: tasks wait for a free worker first. Workers are recycled
+    after `max_tasks_per_child` tasks.
+    """
+
+    def __init__(self, workers, max_tasks_per_child=None):
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        # Spawned workers import only what the tasks need, and never inherit locks
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = []
+        self._busy = set()
+        self._slots = None
+        self._closed = False
+        # Threads that wait on worker pipes, kept apart from the loop's default executor
+        self._waiters = ThreadPoolExecutor(max_workers=2 * workers, thread_name_prefix="analysis-pool")
+
+    async def _acquire_worker(self, loop):
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.process.is_alive():
+                return worker
+            # Died while idle (e.g. OOM-killed)
+            self._retire(worker, loop)
+
+        worker = await loop.run_in_executor(self._waiters, _Worker, self._context)
+        try:
+            await loop.run_in_executor(self._waiters, worker.conn.recv)
+        except BaseException:
+            self._retire(worker, loop)
+            raise
+        return worker
+
+    def _retire(self, worker, loop, graceful=False):
+        """Stop a worker off the event loop, without waiting for it"""
+        self._busy.discard(worker)
+        loop.run_in_executor(None, worker.stop if graceful else worker.kill)
+
+    def _release(self, worker, loop):
+        self._busy.discard(worker)
+        worker.tasks += 1
+        if self._closed or (self.max_tasks_per_child and worker.tasks >= self.max_tasks_per_child):
+            self._retire(worker, loop, graceful=True)
+        else:
+            self._idle.append(worker)
+
+    async def run(self, func, args, kwargs, timeout=None):
+        """Run func(*args, **kwargs) in a worker and return its result"""
+        if self._closed:
+            raise RuntimeError("The analysis pool has been shut down")
+        if self._slots is None:
+            # Created lazily so the semaphore binds to the running event loop
+            self._slots = asyncio.Semaphore(self.workers)
+
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            try:
+                worker = await self._acquire_worker(loop)
+            except (EOFError, OSError):
+                raise BrokenProcessPool("An analysis worker failed to start")
+            self._busy.add(worker)
+
+            try:
+                worker.conn.send((func, args, kwargs))
+            except (EOFError, OSError):
+                self._retire(worker, loop)
+                raise BrokenProcessPool("An analysis worker exited unexpectedly")
+            except BaseException:
+                # Nothing was sent (e.g. unpicklable arguments), so the worker is still usable
+                self._release(worker, loop)
+                raise
+
+            # The task is running from here on, so its time budget starts now
+            reply = loop.run_in_executor(self._waiters, worker.conn.recv)
+            try:
+                succeeded, value = await asyncio.wait_for(reply, timeout=timeout or None)
+            except asyncio.TimeoutError:
+                self._retire(worker, loop)
+                raise AnalysisTimeoutError(f"Analysis exceeded the {timeout:g}s time limit")
+            except (EOFError, OSError):
+                # The worker died mid-task (e.g. OOM-killed); a fresh one replaces it
+                self._retire(worker, loop)
+                raise BrokenProcessPool("An analysis worker exited unexpectedly")
+            except BaseException:
+                # Cancelled: stop the work instead of letting it run to completion
+                self._retire(worker, loop)
+                raise
+
+            self._release(worker, loop)
+
+        if succeeded:
+            return value
+        raise value
+
+    def shutdown(self, wait=True):
+        """
+        Stop the idle workers. Busy ones stop once their current task is done, or
+        right away when `wait` is False.
+        """
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+        if not wait:
+            for worker in list(self._busy):
+                worker.kill()
+        self._waiters.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared analysis pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AnalysisPool(ANALYSIS_WORKERS, ANALYSIS_MAX_TASKS_PER_CHILD or None)
+        return _pool
+
+
+def shutdown_pool(wait=True):
+    """Stop the pool's workers; see AnalysisPool.shutdown"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait)
+            _pool = None
+
+
+async def run_in_pool(func, *args, timeout=None, **kwargs):
+    """
+    Run a CPU-bound function in the process pool and await its result.
+    `func` and its arguments must be picklable (module-level functions, plain data).
+    The timeout counts from when a worker starts the task; on expiry the worker is
+    terminated and AnalysisTimeoutError is raised.
+    """
+    timeout = ANALYSIS_TASK_TIMEOUT if timeout is None else timeout
+    return await get_pool().run(func, args, kwargs, timeout=timeout)
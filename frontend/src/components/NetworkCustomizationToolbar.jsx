@@ -358,7 +358,9 @@ const NetworkCustomizationToolbar = ({
                   <option value="default">Default Size</option>
                   <option value="messages">Message Count</option>
                   <option value="degree">Degree Centrality</option>
+                  <option value="strength">Weighted Degree</option>
                   <option value="betweenness">Betweenness Centrality</option>
+                  <option value="closeness">Closeness Centrality</option>
                   <option value="pagerank">PageRank Centrality</option>
                 </Form.Select>
               </Form.Group>
@@ -23,6 +23,7 @@ import "./Home.css";
 import { AlertBox, GraphContainer } from "./Form.style.js";
 import AnonymizationToggle from "../components/AnonymizationToggle.jsx";
 import NetworkCustomizationToolbar from "../components/NetworkCustomizationToolbar.jsx";
+import { GRAPH_STREAM_ACCEPT_HEADER, readGraphStream } from "../utils/networkUtils.js";
 
 const Home = () => {
   const [name, setName] = useState("");
@@ -286,8 +287,9 @@ const Home = () => {
     const url = `http://localhost:8001/analyze/network/${uploadedFile}?${params.toString()}`;
 
     console.log("Request URL:", url);
-    fetch(url)
-      .then((response) => response.json())
+    // Stream the graph so it starts rendering before the whole response has arrived
+    fetch(url, { headers: { Accept: GRAPH_STREAM_ACCEPT_HEADER } })
+      .then((response) => readGraphStream(response, (partial) => setNetworkData(partial)))
       .then((data) => {
         console.log("Data returned from server:", data);
         if (data.nodes && data.links) {
@@ -104,15 +104,24 @@ export const ResearchProvider = ({ children }) => {
 
     try {
       // Use a direct query rather than RTK Query hook for dynamic IDs
-      const response = await fetch(`http://localhost:8000/research/${researchId}/analyses`);
-      if (!response.ok) {
-        throw new Error('Failed to load analyses');
-      }
-
-      const data = await response.json();
-      dispatch(setResearchAnalyses(data));
-
-      return data;
+      // Analysis summaries without graphs, newest first, a page at a time: { items, next_cursor }
+      const analyses = [];
+      let cursor = null;
+      do {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const response = await fetch(`http://localhost:8000/research/${researchId}/analyses${query}`);
+        if (!response.ok) {
+          throw new Error('Failed to load analyses');
+        }
+
+        const data = await response.json();
+        analyses.push(...data.items);
+        cursor = data.next_cursor;
+      } while (cursor);
+
+      dispatch(setResearchAnalyses(analyses));
+
+      return analyses;
     } catch (error) {
       dispatch(setResearchError(error.message || 'Failed to load research analyses'));
       return [];
@@ -1,5 +1,6 @@
 // src/redux/api/apiSlice.js
 import { createApi, fetchBaseQuery } from '@reduxjs/toolkit/query/react';
+import { GRAPH_ACCEPT_HEADER, parseGraphResponse } from '../../utils/networkUtils';
 
 // Base configuration for API requests
 export const apiSlice = createApi({
@@ -15,8 +16,15 @@ export const apiSlice = createApi({
         headers.set('authorization', `Bearer ${token}`);
       }
 
+      // Graph endpoints answer in compact MessagePack when asked; streaming
+      // endpoints set their own Accept header
+      if (!headers.has('accept')) {
+        headers.set('accept', GRAPH_ACCEPT_HEADER);
+      }
+
       return headers;
     },
+    responseHandler: parseGraphResponse,
   }),
   tagTypes: ['User', 'Research', 'File', 'Analysis', 'Network'],
   endpoints: (builder) => ({}),
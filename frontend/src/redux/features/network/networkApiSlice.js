@@ -1,5 +1,6 @@
 // src/redux/features/network/networkApiSlice.js
 import { apiSlice } from '../../api/apiSlice';
+import { GRAPH_STREAM_ACCEPT_HEADER, readGraphStream } from '../../../utils/networkUtils';
 import {
   setNetworkData,
   setOriginalNetworkData,
@@ -40,12 +41,34 @@ const buildNetworkFilterParams = (filters) => {
   return params.toString();
 };
 
+// Graph with node and link ids as strings, as the force graph expects
+const withStringIds = (data) => ({
+  nodes: data.nodes.map(node => ({
+    ...node,
+    id: String(node.id),
+  })),
+  links: data.links.map(link => ({
+    ...link,
+    source: typeof link.source === 'object' ? String(link.source.id) : String(link.source),
+    target: typeof link.target === 'object' ? String(link.target.id) : String(link.target),
+  })),
+});
+
+// Request a graph as a stream, rendering the nodes and links received so far
+const streamGraph = (url, baseQuery, dispatch) => baseQuery({
+  url,
+  headers: { accept: GRAPH_STREAM_ACCEPT_HEADER },
+  responseHandler: (response) => readGraphStream(response, (partial) => {
+    dispatch(setNetworkData(withStringIds(partial)));
+  }),
+});
+
 export const networkApiSlice = apiSlice.injectEndpoints({
   endpoints: (builder) => ({
     analyzeNetwork: builder.query({
-      query: ({ filename, filters }) => {
+      queryFn: ({ filename, filters }, { dispatch }, extraOptions, baseQuery) => {
         const params = buildNetworkFilterParams(filters);
-        return `/analyze/network/${filename}?${params}`;
+        return streamGraph(`/analyze/network/${filename}?${params}`, baseQuery, dispatch);
       },
       async onQueryStarted({ filename, filters }, { dispatch, queryFulfilled }) {
         dispatch(setNetworkStatus('loading'));
@@ -55,15 +78,7 @@ export const networkApiSlice = apiSlice.injectEndpoints({
           if (data.nodes && data.links) {
             // Process nodes to ensure all IDs are strings
             const processedData = {
-              nodes: data.nodes.map(node => ({
-                ...node,
-                id: String(node.id),
-              })),
-              links: data.links.map(link => ({
-                ...link,
-                source: typeof link.source === 'object' ? String(link.source.id) : String(link.source),
-                target: typeof link.target === 'object' ? String(link.target.id) : String(link.target),
-              })),
+              ...withStringIds(data),
               analysis_id: data.analysis_id,
             };
 
@@ -84,9 +99,10 @@ export const networkApiSlice = apiSlice.injectEndpoints({
     }),
 
     analyzeCommunities: builder.query({
-      query: ({ filename, filters }) => {
+      // Nodes and links arrive before community detection finishes, so they render first
+      queryFn: ({ filename, filters }, { dispatch }, extraOptions, baseQuery) => {
         const params = buildNetworkFilterParams(filters);
-        return `/analyze/communities/${filename}?${params}`;
+        return streamGraph(`/analyze/communities/${filename}?${params}`, baseQuery, dispatch);
       },
       async onQueryStarted({ filename, filters }, { dispatch, queryFulfilled }) {
         try {
@@ -97,17 +113,7 @@ export const networkApiSlice = apiSlice.injectEndpoints({
 
             // If there are nodes with community assignments, update network data
             if (data.nodes && data.nodes.length > 0 && data.nodes[0].community !== undefined) {
-              dispatch(setNetworkData({
-                nodes: data.nodes.map(node => ({
-                  ...node,
-                  id: String(node.id),
-                })),
-                links: data.links.map(link => ({
-                  ...link,
-                  source: typeof link.source === 'object' ? String(link.source.id) : String(link.source),
-                  target: typeof link.target === 'object' ? String(link.target.id) : String(link.target),
-                })),
-              }));
+              dispatch(setNetworkData(withStringIds(data)));
             }
           }
         } catch (error) {
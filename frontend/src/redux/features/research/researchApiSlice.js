@@ -9,10 +9,23 @@ import {
   removeResearchProject,
 } from './researchSlice';
 
+// Listings are keyset-paginated ({ items, next_cursor }): follow next_cursor to the last page
+const fetchAllPages = async (url, baseQuery) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const result = await baseQuery({ url, params: cursor ? { cursor } : undefined });
+    if (result.error) return result;
+    items.push(...result.data.items);
+    cursor = result.data.next_cursor;
+  } while (cursor);
+  return { data: items };
+};
+
 export const researchApiSlice = apiSlice.injectEndpoints({
   endpoints: (builder) => ({
     getAllResearch: builder.query({
-      query: () => '/research',
+      queryFn: (arg, api, extraOptions, baseQuery) => fetchAllPages('/research', baseQuery),
       providesTags: ['Research'],
       async onQueryStarted(arg, { dispatch, queryFulfilled }) {
         try {
@@ -38,7 +51,9 @@ export const researchApiSlice = apiSlice.injectEndpoints({
     }),
 
     getResearchAnalyses: builder.query({
-      query: (researchId) => `/research/${researchId}/analyses`,
+      queryFn: (researchId, api, extraOptions, baseQuery) => (
+        fetchAllPages(`/research/${researchId}/analyses`, baseQuery)
+      ),
       providesTags: (result, error, id) => [
         { type: 'Analysis', id: `Research-${id}` },
       ],
@@ -1,5 +1,7 @@
 // src/utils/api.js
 
+import { GRAPH_ACCEPT_HEADER, parseGraphResponse } from './networkUtils';
+
 // Base URL for API requests
 const API_BASE_URL = 'http://localhost:8000';
 
@@ -21,6 +23,7 @@ export const apiRequest = async (endpoint, options = {}) => {
   const token = getToken();
   const headers = {
     'Content-Type': 'application/json',
+    Accept: GRAPH_ACCEPT_HEADER,
     ...options.headers,
   };
 
@@ -40,7 +43,7 @@ export const apiRequest = async (endpoint, options = {}) => {
     throw new Error(errorData.detail || 'API request failed');
   }
 
-  return response.json();
+  return parseGraphResponse(response);
 };
 
 /**
@@ -1,11 +1,149 @@
 // src/utils/networkUtils.js
 
+export const MSGPACK_MEDIA_TYPE = 'application/x-msgpack';
+export const NDJSON_MEDIA_TYPE = 'application/x-ndjson';
+
+// Accept header asking for the compact MessagePack encoding, with JSON as fallback
+export const GRAPH_ACCEPT_HEADER = `${MSGPACK_MEDIA_TYPE}, application/json;q=0.9`;
+
+// Accept header asking for a streamed NDJSON graph, with the encodings above as fallback
+export const GRAPH_STREAM_ACCEPT_HEADER =
+  `${NDJSON_MEDIA_TYPE}, ${MSGPACK_MEDIA_TYPE};q=0.9, application/json;q=0.8`;
+
+// Minimum time between progress callbacks while a graph streams in
+const STREAM_PROGRESS_INTERVAL_MS = 250;
+
+/**
+ * Expand one columnar graph (nodes as attribute columns, links as node positions)
+ * back into node and link objects
+ * @param {object} graphData - Columnar graph data
+ * @returns {object} Graph data with node and link arrays
+ */
+const expandColumnar = (graphData) => {
+  const { format, nodes: nodeColumns, links: linkColumns, ...rest } = graphData;
+  const ids = nodeColumns.id;
+  const attributes = Object.keys(nodeColumns);
+
+  const nodes = ids.map((_, index) => {
+    const node = {};
+    attributes.forEach((attribute) => {
+      const value = nodeColumns[attribute][index];
+      if (value !== null && value !== undefined) {
+        node[attribute] = value;
+      }
+    });
+    return node;
+  });
+
+  const links = linkColumns.source.map((source, index) => ({
+    source: ids[source],
+    target: ids[linkColumns.target[index]],
+    weight: linkColumns.weight[index],
+  }));
+
+  return { ...rest, nodes, links };
+};
+
+/**
+ * Expand columnar graphs in a response, at the top level or one level down
+ * (e.g. the original and comparison graphs of a comparison)
+ * @param {object} data - Response data
+ * @returns {object} Response data with node and link arrays
+ */
+export const expandColumnarGraph = (data) => {
+  if (!data || typeof data !== 'object') {
+    return data;
+  }
+  if (data.format === 'columnar') {
+    return expandColumnar(data);
+  }
+
+  let expanded = data;
+  Object.entries(data).forEach(([key, value]) => {
+    if (value && value.format === 'columnar') {
+      expanded = { ...expanded, [key]: expandColumnar(value) };
+    }
+  });
+  return expanded;
+};
+
+/**
+ * Parse an API response in whichever format the server chose (MessagePack or JSON;
+ * brotli/gzip compression is undone by the browser)
+ * @param {Response} response - Fetch response
+ * @returns {Promise<object>} Response data with node and link arrays
+ */
+export const parseGraphResponse = async (response) => {
+  const contentType = response.headers.get('Content-Type') || '';
+  if (contentType.includes(MSGPACK_MEDIA_TYPE)) {
+    const { decode } = await import('@msgpack/msgpack');
+    return expandColumnarGraph(decode(await response.arrayBuffer()));
+  }
+
+  const text = await response.text();
+  return text ? JSON.parse(text) : null;
+};
+
+/**
+ * Read a streamed NDJSON graph response (requested with Accept: application/x-ndjson)
+ * as it arrives, so rendering can start before the whole graph is received.
+ * Responses the server did not stream (e.g. errors) are parsed as usual.
+ * @param {Response} response - Fetch response
+ * @param {function} onProgress - Optional callback, called with the graph received so far
+ *   (its node and link arrays keep growing until the stream ends)
+ * @returns {Promise<object>} The complete response data
+ */
+export const readGraphStream = async (response, onProgress = null) => {
+  const contentType = response.headers.get('Content-Type') || '';
+  if (!contentType.includes(NDJSON_MEDIA_TYPE)) {
+    return parseGraphResponse(response);
+  }
+
+  const graph = { nodes: [], links: [], communities: [] };
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+  let lastProgress = 0;
+
+  const addRecord = ({ type, data }) => {
+    if (type === 'node') graph.nodes.push(data);
+    else if (type === 'link') graph.links.push(data);
+    else if (type === 'community') graph.communities.push(data);
+    else if (type === 'node_communities') {
+      graph.node_communities = data;
+      graph.nodes = graph.nodes.map((node) =>
+        node.id in data ? { ...node, community: data[node.id] } : node
+      );
+    } else if (type === 'meta') Object.assign(graph, data);
+    else if (type === 'error') throw new Error(data.error);
+  };
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+    const lines = buffered.split('\n');
+    buffered = lines.pop();
+    lines.filter(Boolean).forEach((line) => addRecord(JSON.parse(line)));
+
+    if (done) break;
+    const now = Date.now();
+    if (onProgress && lines.length && now - lastProgress >= STREAM_PROGRESS_INTERVAL_MS) {
+      lastProgress = now;
+      onProgress({ ...graph, nodes: [...graph.nodes], links: [...graph.links] });
+    }
+  }
+
+  return graph;
+};
+
 /**
  * Standardize graph data to ensure consistent format
- * @param {object} graphData - Network graph data
+ * @param {object} graphData - Network graph data, as node and link arrays or columnar
  * @returns {object} Standardized graph data
  */
 export const standardizeGraphData = (graphData) => {
+  graphData = expandColumnarGraph(graphData);
   if (!graphData || !graphData.nodes || !graphData.links) {
     return graphData;
   }
@@ -281,22 +419,31 @@ export const applyVisualizationSettings = (networkData, settings) => {
   const customizedNodes = JSON.parse(JSON.stringify(networkData.nodes));
   const customizedLinks = JSON.parse(JSON.stringify(networkData.links));
 
+  // Centrality metrics (degree, strength, betweenness, closeness, pagerank) come from
+  // the server; maxima are computed once rather than once per node
+  const maxValues = {};
+  const maxOf = (metric) => {
+    if (maxValues[metric] === undefined) {
+      maxValues[metric] = customizedNodes.reduce((max, n) => Math.max(max, n[metric] || 0), 0);
+    }
+    return maxValues[metric];
+  };
+  const ratioOf = (node, metric) => {
+    const maxVal = maxOf(metric);
+    return maxVal > 0 ? (node[metric] || 0) / maxVal : 0;
+  };
+  const sizeMetrics = ['messages', 'degree', 'strength', 'betweenness', 'closeness', 'pagerank'];
+
   // Apply node size and color settings
   for (const node of customizedNodes) {
     let nodeSize = settings.nodeSizes.min;
     let nodeColor = settings.customColors.defaultNodeColor;
 
     // Size nodes based on selected metric
-    const sizeByValue = (metric) => {
-      const maxVal = Math.max(...customizedNodes.map((n) => n[metric] || 0));
-      const ratio = maxVal > 0 ? (node[metric] || 0) / maxVal : 0;
-      return settings.nodeSizes.min + ratio * (settings.nodeSizes.max - settings.nodeSizes.min);
-    };
-
-    if (settings.sizeBy === 'messages') nodeSize = sizeByValue('messages');
-    else if (settings.sizeBy === 'degree') nodeSize = sizeByValue('degree');
-    else if (settings.sizeBy === 'betweenness') nodeSize = sizeByValue('betweenness');
-    else if (settings.sizeBy === 'pagerank') nodeSize = sizeByValue('pagerank');
+    if (sizeMetrics.includes(settings.sizeBy)) {
+      const ratio = ratioOf(node, settings.sizeBy);
+      nodeSize = settings.nodeSizes.min + ratio * (settings.nodeSizes.max - settings.nodeSizes.min);
+    }
 
     // Color nodes based on selected metric or community
     if (settings.colorBy === 'community' && node.community !== undefined) {
@@ -304,17 +451,11 @@ export const applyVisualizationSettings = (networkData, settings) => {
       nodeColor = settings.communityColors?.[communityId] ??
         settings.customColors.communityColors[communityId % settings.customColors.communityColors.length];
     } else if (settings.colorBy === 'degree') {
-      const maxDegree = Math.max(...customizedNodes.map((n) => n.degree || 0));
-      const ratio = maxDegree > 0 ? (node.degree || 0) / maxDegree : 0;
-      nodeColor = interpolateColor('#ffefca', settings.customColors.defaultNodeColor, ratio);
+      nodeColor = interpolateColor('#ffefca', settings.customColors.defaultNodeColor, ratioOf(node, 'degree'));
     } else if (settings.colorBy === 'betweenness') {
-      const maxBtw = Math.max(...customizedNodes.map((n) => n.betweenness || 0));
-      const ratio = maxBtw > 0 ? (node.betweenness || 0) / maxBtw : 0;
-      nodeColor = interpolateColor('#ffefca', '#FF5733', ratio);
+      nodeColor = interpolateColor('#ffefca', '#FF5733', ratioOf(node, 'betweenness'));
     } else if (settings.colorBy === 'pagerank') {
-      const maxPR = Math.max(...customizedNodes.map((n) => n.pagerank || 0));
-      const ratio = maxPR > 0 ? (node.pagerank || 0) / maxPR : 0;
-      nodeColor = interpolateColor('#ffefca', '#3366CC', ratio);
+      nodeColor = interpolateColor('#ffefca', '#3366CC', ratioOf(node, 'pagerank'));
     } else if (settings.colorBy === 'custom' && settings.highlightUsers.includes(node.id)) {
       nodeColor = settings.customColors.highlightNodeColor;
     }
@@ -329,11 +470,8 @@ export const applyVisualizationSettings = (networkData, settings) => {
     // Highlight important nodes based on centrality metrics
     if (settings.showImportantNodes) {
       const threshold = settings.importantNodesThreshold || 0.5;
-      const maxBetweenness = Math.max(...customizedNodes.map((n) => n.betweenness || 0));
-      const maxPageRank = Math.max(...customizedNodes.map((n) => n.pagerank || 0));
-
-      const isImportant = (node.betweenness / maxBetweenness > threshold) ||
-                          (node.pagerank / maxPageRank > threshold);
+      const isImportant = ratioOf(node, 'betweenness') > threshold ||
+                          ratioOf(node, 'pagerank') > threshold;
 
       if (isImportant) {
         nodeColor = settings.customColors.highlightNodeColor;